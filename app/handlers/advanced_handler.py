@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 import uuid
 import asyncio
 
+from src.managers.queue_manager import QueuePriority
+
 logger = logging.getLogger(__name__)
 
 # Conversation states
@@ -58,10 +60,11 @@ async def receive_urls(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Get download manager from context
     download_manager = context.bot_data.get('download_manager')
+    queue_manager = context.bot_data.get('queue_manager')
     db_manager = context.bot_data.get('db_manager')
     download_dir = context.bot_data.get('download_dir', './downloads')
     
-    if not download_manager or not db_manager:
+    if not download_manager or not queue_manager or not db_manager:
         await update.message.reply_text("❌ System error. Please try again later.")
         return ConversationHandler.END
     
@@ -76,35 +79,34 @@ async def receive_urls(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📦 <b>Batch Download Created</b>\n\n"
         f"<b>Batch ID:</b> <code>{batch_id}</code>\n"
         f"<b>Total URLs:</b> {len(valid_urls)}\n\n"
-        f"Starting downloads...",
+        f"Downloads queued...",
         parse_mode='HTML'
     )
     
-    # Start downloads
-    download_ids = []
+    # Masukkan ke queue (priority LOW agar link tunggal tidak tertahan di belakang batch).
+    # QueueManager meng-update item batch (download_id = queue_id) saat item selesai/gagal.
+    batch_items = []
     for i, url in enumerate(valid_urls, 1):
         try:
-            # Progress callback untuk update message
-            async def progress_callback(dl_id, progress, downloaded, total, speed, completed=False):
-                pass  # No individual progress for batch
-            
-            download_id = await download_manager.start_download(
-                url=url,
+            queue_id = await queue_manager.add_to_queue(
+                user_id, url, url.split('?')[0].rstrip('/').split('/')[-1] or url,
+                priority=QueuePriority.LOW,
                 download_dir=download_path,
-                user_id=user_id,
-                progress_callback=progress_callback
+                batch_id=batch_id
             )
-            
-            # Add to batch
-            db_manager.add_batch_item(batch_id, url, download_id)
-            download_ids.append(download_id)
+            batch_items.append({'url': url, 'download_id': queue_id})
             
         except Exception as e:
-            logger.error(f"Failed to start download {i}/{len(valid_urls)}: {e}")
-            db_manager.add_batch_item(batch_id, url, f"error_{i}")
-            db_manager.update_batch_item_status(
-                batch_id, f"error_{i}", 'failed', error_message=str(e)
-            )
+            logger.error(f"Failed to queue download {i}/{len(valid_urls)}: {e}")
+            batch_items.append({
+                'url': url,
+                'download_id': f"error_{i}",
+                'status': 'failed',
+                'error_message': str(e)
+            })
+    
+    # Simpan semua item batch dalam satu transaction
+    db_manager.add_batch_items(batch_id, batch_items)
     
     # Start monitoring task
     asyncio.create_task(monitor_batch(
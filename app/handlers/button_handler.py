@@ -131,6 +131,10 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == "status_history":
         return await download_history_handler(update, context)
     
+    elif data.startswith("history_page:"):
+        _, page, cursor = data.split(":", 2)
+        return await download_history_handler(update, context, page=int(page), cursor=cursor)
+    
     elif data == "status_schedules":
         return await view_schedules_handler(update, context)
     
@@ -176,6 +180,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == "security_scan_history":
         return await scan_history_menu(update, context)
     
+    elif data.startswith("scan_history_page:"):
+        return await scan_history_menu(update, context, cursor=data.split(":", 1)[1])
+    
     elif data == "security_encrypted_files":
         return await encrypted_files_menu(update, context)
     
@@ -90,6 +90,8 @@ async def handle_direct_download_link(update: Update, context: ContextTypes.DEFA
     
     # Validasi apakah link bisa didownload (hapus pesan validasi setelah selesai)
     validation_msg = None
+    filename = url.split('?')[0].rstrip('/').split('/')[-1] or url
+    validated = {}  # file_info dari LinkValidator, diteruskan ke queue (skip probe ulang)
     try:
         validation_msg = await update.message.reply_text(
             "🔍 <b>Memvalidasi link...</b>\n⏳ Mohon tunggu.",
@@ -119,6 +121,8 @@ async def handle_direct_download_link(update: Update, context: ContextTypes.DEFA
         else:
             # Link valid dan bisa didownload
             file_size_str = validator.format_size(file_info['size']) if file_info['size'] > 0 else 'Unknown'
+            filename = file_info['filename'] or filename
+            validated = file_info
             
             await update.message.reply_text(
                 f"✅ <b>Link Valid - Memulai Download</b>\n\n"
@@ -143,7 +147,7 @@ async def handle_direct_download_link(update: Update, context: ContextTypes.DEFA
         )
     
     # Dapatkan download path untuk user
-    download_manager = context.bot_data['download_manager']
+    queue_manager = context.bot_data['queue_manager']
     db_manager = context.bot_data.get('db_manager')
     download_path = get_download_path(context, user_id, db_manager)
     
@@ -151,19 +155,28 @@ async def handle_direct_download_link(update: Update, context: ContextTypes.DEFA
     last_update_progress = [0]  # Mutable untuk track last update
     progress_message_id = [None]
     
-    async def progress_callback(download_id, progress, downloaded, total, speed, completed=False):
+    async def progress_callback(download_id, progress, downloaded, total, speed,
+                                completed=False, failed=False, error=None):
         """Callback untuk update progress di Telegram"""
         nonlocal last_update_progress, progress_message_id
         
-        # Update setiap 20% atau completed
-        if completed or int(progress) - last_update_progress[0] >= 20:
+        # Update setiap 20% atau completed/failed
+        if completed or failed or int(progress) - last_update_progress[0] >= 20:
             last_update_progress[0] = int(progress)
             
-            if completed:
+            if failed:
+                text = (
+                    f"❌ <b>Download Gagal</b>\n\n"
+                    f"File: <code>{filename}</code>\n"
+                    f"Error: <code>{error or 'Unknown error'}</code>\n"
+                    f"ID: <code>{download_id}</code>"
+                )
+                logger.warning(f"❌ Download {user_name} gagal: {download_id} - {error}")
+            elif completed:
                 # Download selesai
                 text = (
                     f"✅ <b>Download Selesai!</b>\n\n"
-                    f"File: <code>{url.split('/')[-1]}</code>\n"
+                    f"File: <code>{filename}</code>\n"
                     f"Ukuran: <code>{format_size(downloaded)}</code>\n"
                     f"Lokasi: <code>{download_path}</code>\n"
                     f"ID: <code>{download_id}</code>"
@@ -198,10 +211,14 @@ async def handle_direct_download_link(update: Update, context: ContextTypes.DEFA
             except Exception as e:
                 logger.error(f"Progress update error: {e}")
     
-    # URL valid, mulai download dengan progress callback
+    # Masukkan ke queue; dispatcher yang memulai download (fair-share, size-aware, preemption)
     try:
-        download_id = await download_manager.start_download(
-            url, download_path, user_id, progress_callback=progress_callback
+        queue_id = await queue_manager.add_to_queue(
+            user_id, url, filename,
+            download_dir=download_path,
+            progress_callback=progress_callback,
+            expected_size=validated.get('size') or None,
+            accepts_ranges=validated.get('accepts_ranges')
         )
         
         reply_markup = back_to_main_keyboard()
@@ -210,16 +227,16 @@ async def handle_direct_download_link(update: Update, context: ContextTypes.DEFA
             await context.bot.edit_message_text(
                 chat_id=update.effective_chat.id,
                 message_id=context.user_data['main_message_id'],
-                text=f"✅ <b>Unduhan Dimulai!</b>\n\n"
+                text=f"✅ <b>Unduhan Masuk Antrian!</b>\n\n"
                      f"Link: {url[:60]}...\n"
-                     f"ID: <code>{download_id}</code>\n\n"
-                     f"Progress akan ditampilkan di bawah.",
+                     f"Queue ID: <code>{queue_id}</code>\n\n"
+                     f"Progress akan ditampilkan di bawah saat unduhan dimulai.",
                 reply_markup=reply_markup,
                 parse_mode='HTML'
             )
         
         await delete_user_message(update)
-        logger.info(f"✅ {user_name} memulai download (ID: {download_id})")
+        logger.info(f"✅ {user_name} menambah download ke queue (ID: {queue_id})")
         return MAIN_MENU
         
     except Exception as e:
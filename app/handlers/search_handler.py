@@ -0,0 +1,136 @@
+"""
+Search Handler
+Full-text search di riwayat unduhan (/search <kata kunci>)
+"""
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+from app.handlers.common import is_admin
+from datetime import datetime
+import html
+import logging
+
+logger = logging.getLogger(__name__)
+
+RESULTS_PER_PAGE = 10
+
+
+def _format_size(size_bytes: int) -> str:
+    """Format ukuran file ke human readable"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} PB"
+
+
+def _build_search_page(db_manager, user_id: int, query: str, page: int):
+    """Build text dan keyboard untuk satu halaman hasil search"""
+    # Ambil satu hasil ekstra untuk tahu apakah ada halaman berikutnya
+    results = db_manager.search_history(
+        user_id, query, limit=RESULTS_PER_PAGE + 1, offset=page * RESULTS_PER_PAGE
+    )
+    has_more = len(results) > RESULTS_PER_PAGE
+    results = results[:RESULTS_PER_PAGE]
+
+    text = f"🔎 <b>Hasil Pencarian:</b> <code>{html.escape(query)}</code>\n\n"
+
+    if not results:
+        text += "Tidak ada unduhan yang cocok." if page == 0 else "Tidak ada hasil lagi."
+
+    for i, item in enumerate(results, page * RESULTS_PER_PAGE + 1):
+        status_emoji = {
+            'completed': '✅',
+            'failed': '❌',
+            'cancelled': '⚠️',
+            'downloading': '⏳'
+        }.get(item['status'], '❓')
+
+        try:
+            time_str = datetime.fromisoformat(item['start_time']).strftime("%d/%m/%Y %H:%M")
+        except (TypeError, ValueError):
+            time_str = "N/A"
+
+        size_str = _format_size(item['file_size']) if item['file_size'] else "N/A"
+
+        filename = item['filename'] or ''
+        if len(filename) > 40:
+            filename = filename[:37] + "..."
+
+        text += f"{i}. {status_emoji} <code>{html.escape(filename)}</code>\n"
+        text += f"   🌐 {html.escape(item['host'] or '-')} | 📅 {time_str} | 📦 {size_str}\n"
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ Sebelumnya", callback_data=f"search_page:{page - 1}"))
+    if has_more:
+        nav.append(InlineKeyboardButton("Berikutnya ➡️", callback_data=f"search_page:{page + 1}"))
+
+    reply_markup = InlineKeyboardMarkup([nav]) if nav else None
+    return text, reply_markup
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /search <kata kunci>"""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        return
+
+    db_manager = context.bot_data.get('db_manager')
+    if not db_manager:
+        await update.message.reply_text("❌ Database tidak tersedia")
+        return
+
+    query = ' '.join(context.args).strip() if context.args else ''
+    if not query:
+        await update.message.reply_text(
+            "🔎 <b>Cari Riwayat Unduhan</b>\n\n"
+            "Format: <code>/search kata kunci</code>\n\n"
+            "<b>Contoh:</b>\n"
+            "<code>/search laporan pdf</code>\n"
+            "<code>/search github</code>",
+            parse_mode='HTML'
+        )
+        return
+
+    context.user_data['search_query'] = query
+
+    try:
+        text, reply_markup = _build_search_page(db_manager, user_id, query, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
+    except Exception as e:
+        logger.error(f"Error in search_command: {e}")
+        await update.message.reply_text(f"❌ Error: {e}")
+
+
+async def search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle navigasi halaman hasil search"""
+    query = update.callback_query
+    await query.answer()
+
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        return
+
+    db_manager = context.bot_data.get('db_manager')
+    search_query = context.user_data.get('search_query')
+
+    if not db_manager or not search_query:
+        await query.edit_message_text("❌ Pencarian kadaluarsa, kirim /search lagi.")
+        return
+
+    page = max(0, int(query.data.split(':')[1]))
+
+    try:
+        text, reply_markup = _build_search_page(db_manager, user_id, search_query, page)
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
+    except Exception as e:
+        logger.error(f"Error in search_page_callback: {e}")
+        await query.edit_message_text(f"❌ Error: {e}")
+
+
+def get_search_handlers():
+    """Get all handlers untuk search"""
+    return [
+        CommandHandler('search', search_command),
+        CallbackQueryHandler(search_page_callback, pattern="^search_page:")
+    ]
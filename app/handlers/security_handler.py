@@ -5,6 +5,7 @@ Handler untuk virus scanning, encryption, dan resume downloads
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 import os
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -118,6 +119,73 @@ async def encrypt_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Error: {e}")
 
 
+def _batch_encrypt_files(folder: str) -> list:
+    """File di folder (tidak rekursif) yang belum diencrypt"""
+    try:
+        with os.scandir(folder) as it:
+            return sorted(
+                entry.path for entry in it
+                if entry.is_file(follow_symlinks=False)
+                and not entry.name.startswith('.') and not entry.name.endswith('.enc')
+            )
+    except OSError:
+        return []
+
+
+async def encrypt_batch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Encrypt semua file di folder download (/encryptall [subfolder]) dengan satu password"""
+    user_id = update.effective_user.id
+    
+    try:
+        from app.handlers.common import get_download_path
+        from src.managers.download_manager import DownloadManager
+        
+        db_manager = context.bot_data.get('db_manager')
+        file_encryption = context.bot_data.get('file_encryption')
+        
+        if not db_manager or not file_encryption:
+            await update.message.reply_text("❌ Encryption service tidak tersedia")
+            return
+        
+        download_path = os.path.abspath(get_download_path(context, user_id, db_manager))
+        folder = os.path.abspath(os.path.join(download_path, ' '.join(context.args))) if context.args else download_path
+        
+        # Hanya folder di dalam folder download user
+        if (folder != download_path and not folder.startswith(download_path + os.sep)) or not os.path.isdir(folder):
+            await update.message.reply_text("❌ Folder tidak ditemukan")
+            return
+        
+        files = _batch_encrypt_files(folder)
+        if not files:
+            await update.message.reply_text("📁 Tidak ada file untuk encrypt di folder ini")
+            return
+        
+        total_size = sum(os.path.getsize(path) for path in files)
+        context.user_data['encrypt_batch_folder'] = folder
+        
+        keyboard = [
+            [
+                InlineKeyboardButton("✅ Encrypt All", callback_data="encrypt_batch_confirm"),
+                InlineKeyboardButton("❌ Cancel", callback_data="encrypt_batch_cancel"),
+            ]
+        ]
+        
+        await update.message.reply_text(
+            "🔒 **Batch Encryption**\n\n"
+            f"📁 Folder: `{os.path.relpath(folder, download_path)}`\n"
+            f"📄 Files: {len(files)} ({DownloadManager.format_size(total_size)})\n\n"
+            "• Satu password untuk semua file\n"
+            "• Setiap file punya key sendiri\n"
+            "• Original files will be kept",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+    
+    except Exception as e:
+        logger.error(f"Error in encrypt_batch_command: {e}")
+        await update.message.reply_text(f"❌ Error: {e}")
+
+
 async def decrypt_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Decrypt file"""
     await update.message.reply_text(
@@ -198,7 +266,7 @@ async def security_button_callback(update: Update, context: ContextTypes.DEFAULT
                 text = "🛡️ **Virus Scanning Info**\n\n"
                 text += "**ClamAV:**\n"
                 text += "• Local scanner\n"
-                text += "• Fast scanning\n"
+                text += "• Fast scanning via clamd daemon (fallback: clamscan)\n"
                 text += "• Requires ClamAV installation\n\n"
                 text += "**VirusTotal:**\n"
                 text += "• Online scanner\n"
@@ -236,11 +304,18 @@ async def security_button_callback(update: Update, context: ContextTypes.DEFAULT
                 result_text = virus_scanner.format_scan_result(scan_result)
                 
                 # Quarantine if infected
+                quarantine_success = False
                 if scan_result['infected']:
                     quarantine_success = virus_scanner.quarantine_file(filepath)
                     if quarantine_success:
                         result_text += "\n\n🔒 File moved to quarantine folder."
                 
+                db_manager.add_scan_result(
+                    user_id, filepath, scan_result['filename'], scan_result['status'],
+                    scan_result['infected'], scan_result['threats'], scan_result['scanners'],
+                    quarantined=quarantine_success, sha256_hash=scan_result.get('sha256')
+                )
+                
                 await query.edit_message_text(result_text, parse_mode='Markdown')
         
         # Encrypt callbacks
@@ -248,7 +323,7 @@ async def security_button_callback(update: Update, context: ContextTypes.DEFAULT
             if data == "encrypt_info":
                 text = "🔒 **Encryption Info**\n\n"
                 text += "**Algorithm:** AES-256-GCM\n"
-                text += "**Key Derivation:** PBKDF2-SHA256 (100,000 iterations)\n"
+                text += "**Key Derivation:** PBKDF2-SHA256 (100,000 iterations) + HKDF per file\n"
                 text += "**Password:** Auto-generated (16 characters)\n"
                 text += "**Output:** filename.ext.enc\n\n"
                 text += "**Features:**\n"
@@ -257,6 +332,38 @@ async def security_button_callback(update: Update, context: ContextTypes.DEFAULT
                 text += "• Secure password generation\n\n"
                 text += "**Keep your password safe!**"
                 
+                await query.edit_message_text(text, parse_mode='Markdown')
+            
+            elif data == "encrypt_batch_cancel":
+                context.user_data.pop('encrypt_batch_folder', None)
+                await query.edit_message_text("❌ Batch encryption dibatalkan")
+            
+            elif data == "encrypt_batch_confirm":
+                file_encryption = context.bot_data.get('file_encryption')
+                folder = context.user_data.pop('encrypt_batch_folder', None)
+                
+                if not file_encryption or not folder:
+                    await query.edit_message_text("❌ Batch encryption tidak tersedia, jalankan /encryptall lagi")
+                    return
+                
+                files = _batch_encrypt_files(folder)
+                await query.edit_message_text(f"🔒 Encrypting {len(files)} files...\n\nPlease wait...")
+                
+                # PBKDF2 sekali untuk seluruh batch, dijalankan di luar event loop
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(None, file_encryption.encrypt_files, files)
+                
+                text = "✅ **Batch Encryption Complete!**\n\n"
+                text += f"📄 **Encrypted:** {len(result['encrypted'])} files\n"
+                if result['failed']:
+                    text += f"⚠️ **Failed:** {len(result['failed'])} files\n"
+                    for path, error in result['failed'][:5]:
+                        text += f"• {os.path.basename(path)}: {error}\n"
+                text += f"\n🔑 **Password:** `{result['password']}`\n\n"
+                text += "⚠️ **IMPORTANT:**\n"
+                text += "• Password ini berlaku untuk semua file di batch!\n"
+                text += "• Password is shown only once!"
+                
                 await query.edit_message_text(text, parse_mode='Markdown')
             else:
                 download_id = data.split("_")[1]
@@ -387,7 +494,10 @@ def get_security_handlers():
     return [
         CommandHandler('scan', scan_command),
         CommandHandler('encrypt', encrypt_command),
+        CommandHandler('encryptall', encrypt_batch_command),
         CommandHandler('decrypt', decrypt_command),
         CommandHandler('resume', resume_command),
-        CallbackQueryHandler(security_button_callback, pattern="^(scan_|encrypt_|resume_)")
+        # scan_history_page: milik button_handler (security menu)
+        CallbackQueryHandler(security_button_callback,
+                             pattern="^(scan_(?!history_page:)|encrypt_|resume_)")
     ]
@@ -6,6 +6,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from app.handlers.states import MAIN_MENU
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -106,14 +107,15 @@ async def decrypt_file_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return MAIN_MENU
 
 
-async def scan_history_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Scan history menu"""
+async def scan_history_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor: str = None):
+    """Scan history menu (paginated dengan keyset cursor)"""
     try:
         db_manager = context.bot_data.get('db_manager')
         user_id = update.effective_user.id
         
-        # Get scan history
-        history = db_manager.get_scan_history(user_id, limit=10)
+        # Get satu halaman scan history
+        result = db_manager.get_scan_history_page(user_id, limit=10, cursor=cursor)
+        history = result['items']
         
         if not history:
             text = "📜 <b>Scan History</b>\n\n❌ Tidak ada riwayat scan."
@@ -122,11 +124,21 @@ async def scan_history_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             for scan in history:
                 status_emoji = "✅" if scan['status'] == 'clean' else "⚠️" if scan['status'] == 'suspicious' else "🦠"
                 text += f"{status_emoji} <b>{scan['filename']}</b>\n"
-                text += f"   Scanner: {scan['scanner']}\n"
+                text += f"   Scanner: {', '.join(scan['scanners']) or '-'}\n"
                 text += f"   Status: {scan['status']}\n"
-                text += f"   Date: {scan['scan_date']}\n\n"
+                text += f"   Date: {scan['scan_time']}\n\n"
         
-        keyboard = [[InlineKeyboardButton("◀️ Back", callback_data="menu_security")]]
+        keyboard = []
+        nav = []
+        if cursor:
+            nav.append(InlineKeyboardButton("⏮️ Terbaru", callback_data="security_scan_history"))
+        if result['next_cursor']:
+            nav.append(InlineKeyboardButton(
+                "Next ➡️", callback_data=f"scan_history_page:{result['next_cursor']}"
+            ))
+        if nav:
+            keyboard.append(nav)
+        keyboard.append([InlineKeyboardButton("◀️ Back", callback_data="menu_security")])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.callback_query.edit_message_text(
@@ -188,11 +200,9 @@ async def encrypted_files_menu(update: Update, context: ContextTypes.DEFAULT_TYP
 async def resume_download_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Resume download menu"""
     try:
-        # Get incomplete downloads from download state
-        from src.managers.resume_downloader import DownloadState
-        download_state = DownloadState()
-        
-        incomplete = download_state.get_all_incomplete_downloads()
+        # Get incomplete downloads from resume journal
+        download_state = context.bot_data.get('download_state')
+        incomplete = download_state.get_all_incomplete_downloads() if download_state else []
         
         if not incomplete:
             text = "🔄 <b>Resume Downloads</b>\n\n✅ Tidak ada download yang terputus."
@@ -202,13 +212,13 @@ async def resume_download_menu(update: Update, context: ContextTypes.DEFAULT_TYP
             text += f"Found {len(incomplete)} incomplete download(s):\n\n"
             
             keyboard = []
-            for i, (state_file, state_data) in enumerate(incomplete[:10], 1):  # Max 10
+            for i, state_data in enumerate(incomplete[:10], 1):  # Max 10
                 url = state_data.get('url', 'Unknown')[:40]
-                downloaded = state_data.get('downloaded', 0)
-                total = state_data.get('total_size', 0)
+                downloaded = state_data.get('downloaded_bytes', 0)
+                total = state_data.get('total_bytes', 0)
                 percent = (downloaded / total * 100) if total > 0 else 0
                 
-                text += f"{i}. <b>{state_data.get('filename', 'Unknown')}</b>\n"
+                text += f"{i}. <b>{os.path.basename(state_data.get('filepath', 'Unknown'))}</b>\n"
                 text += f"   Progress: {percent:.1f}% ({downloaded:,} / {total:,} bytes)\n"
                 text += f"   URL: {url}...\n\n"
                 
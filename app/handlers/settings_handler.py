@@ -186,8 +186,18 @@ async def handle_custom_path(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return WAITING_CUSTOM_PATH
 
 
-async def download_history_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show download history"""
+HISTORY_PER_PAGE = 20
+
+
+async def download_history_handler(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                   page: int = 0, cursor: str = None):
+    """
+    Show download history
+    
+    Args:
+        page: Nomor halaman (hanya untuk penomoran item)
+        cursor: Keyset cursor dari halaman sebelumnya (None = halaman pertama)
+    """
     query = update.callback_query
     await query.answer()
     
@@ -206,8 +216,17 @@ async def download_history_handler(update: Update, context: ContextTypes.DEFAULT
         )
         return MAIN_MENU
     
-    # Ambil riwayat unduhan (20 terakhir)
-    history = db_manager.get_download_history(user_id, limit=20)
+    # Ambil satu halaman riwayat unduhan (keyset cursor, tanpa OFFSET)
+    try:
+        result = db_manager.get_download_history_page(
+            user_id, limit=HISTORY_PER_PAGE, cursor=cursor
+        )
+    except ValueError:
+        result = db_manager.get_download_history_page(user_id, limit=HISTORY_PER_PAGE)
+        page = 0
+    
+    history = result['items']
+    next_cursor = result['next_cursor']
     
     if not history:
         await query.edit_message_text(
@@ -240,7 +259,8 @@ async def download_history_handler(update: Update, context: ContextTypes.DEFAULT
     # Format riwayat
     text = f"📋 <b>Riwayat Unduhan</b>\n\n{storage_info}"
     
-    for i, item in enumerate(history, 1):
+    first = page * HISTORY_PER_PAGE + 1
+    for i, item in enumerate(history, first):
         status_emoji = {
             'completed': '✅',
             'failed': '❌',
@@ -271,14 +291,24 @@ async def download_history_handler(update: Update, context: ContextTypes.DEFAULT
         text += f"   📅 {time_str} | 📦 {size_str}\n"
         
         # Tambah separator setiap 5 item untuk readability
-        if i % 5 == 0 and i < len(history):
+        if i % 5 == 0 and i < first + len(history) - 1:
             text += "\n"
     
     # Keyboard
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⏮️ Terbaru", callback_data="download_history"))
+    if next_cursor:
+        nav.append(InlineKeyboardButton(
+            "Berikutnya ➡️", callback_data=f"history_page:{page + 1}:{next_cursor}"
+        ))
+    
     keyboard = [
         [InlineKeyboardButton("🔄 Refresh", callback_data="download_history")],
         [InlineKeyboardButton("🔙 Kembali", callback_data="back_to_main")]
     ]
+    if nav:
+        keyboard.insert(0, nav)
     
     await query.edit_message_text(
         text,
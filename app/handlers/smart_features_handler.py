@@ -4,6 +4,7 @@ Handler untuk duplicate detection, queue management, preview, statistics, cloud,
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from telegram.error import BadRequest
 import os
 import logging
 from datetime import datetime
@@ -15,20 +16,24 @@ AWAITING_CLOUD_AUTH = 1
 AWAITING_MANUAL_CATEGORY = 2
 
 
-async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show download queue status"""
+QUEUE_ITEMS_PER_PAGE = 10
+
+
+async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE, offset: int = 0):
+    """Show download queue status (dari /queue, atau edit pesan saat refresh/pindah halaman)"""
     user_id = update.effective_user.id
+    query = update.callback_query
     
     try:
         # Get queue manager dari context
         queue_manager = context.bot_data.get('queue_manager')
         
         if not queue_manager:
-            await update.message.reply_text("❌ Queue manager tidak tersedia")
+            await update.effective_message.reply_text("❌ Queue manager tidak tersedia")
             return
         
         # Get queue status
-        status = await queue_manager.get_queue_status(user_id)
+        status = await queue_manager.get_queue_status(user_id, offset=offset, limit=QUEUE_ITEMS_PER_PAGE)
         
         text = "📋 **Download Queue Status**\n\n"
         text += f"• Total Items: {status['total']}\n"
@@ -41,7 +46,7 @@ async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Show queue items
         if status['items']:
             text += "**Queue Items:**\n"
-            for item in status['items'][:10]:  # Show max 10
+            for item in status['items']:
                 status_emoji = {
                     'pending': '⏳',
                     'downloading': '⬇️',
@@ -54,7 +59,12 @@ async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 if len(filename) > 30:
                     filename = filename[:27] + "..."
                 
-                priority_emoji = ['🔴', '🟡', '🟢', '🔵'][min(item['priority'], 3)]
+                priority_emoji = {
+                    'URGENT': '🔴',
+                    'HIGH': '🟡',
+                    'NORMAL': '🟢',
+                    'LOW': '🔵'
+                }.get(item['priority'], '⚪')
                 
                 text += f"{status_emoji} {priority_emoji} {filename}\n"
                 
@@ -62,18 +72,44 @@ async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 if item['status'] == 'downloading' and item['progress'] > 0:
                     text += f"   Progress: {item['progress']:.1f}%\n"
         
+        # Item yang baru selesai (hanya di halaman pertama)
+        if offset == 0 and status['recent']:
+            text += "\n**Recently Finished:**\n"
+            for item in status['recent'][:5]:
+                status_emoji = {'completed': '✅', 'failed': '❌', 'cancelled': '⚠️'}.get(item['status'], '❓')
+                filename = item['filename']
+                if len(filename) > 30:
+                    filename = filename[:27] + "..."
+                text += f"{status_emoji} {filename}\n"
+        
         # Create buttons untuk queue management
-        keyboard = [
+        keyboard = []
+        nav = []
+        if offset > 0:
+            nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"queue_page:{max(0, offset - QUEUE_ITEMS_PER_PAGE)}"))
+        if status['next_offset'] is not None:
+            nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"queue_page:{status['next_offset']}"))
+        if nav:
+            keyboard.append(nav)
+        keyboard += [
             [InlineKeyboardButton("🔄 Refresh", callback_data="queue_refresh")],
             [InlineKeyboardButton("📊 Queue Stats", callback_data="queue_stats")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        if query:
+            try:
+                await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+            except BadRequest as e:
+                # Refresh tanpa perubahan isi bukan error
+                if 'not modified' not in str(e).lower():
+                    raise
+        else:
+            await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
     
     except Exception as e:
         logger.error(f"Error in queue_command: {e}")
-        await update.message.reply_text(f"❌ Error: {e}")
+        await update.effective_message.reply_text(f"❌ Error: {e}")
 
 
 async def preview_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -242,55 +278,70 @@ async def smart_category_command(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text(f"❌ Error: {e}")
 
 
+def _duplicate_roots(context: ContextTypes.DEFAULT_TYPE, user_id: int, scope: str) -> list:
+    """Folder untuk duplicate scan: 'all' = seluruh library (admin), selain itu folder user"""
+    from app.handlers.common import is_admin, get_download_path
+    
+    duplicate_index = context.bot_data.get('duplicate_index')
+    if scope == 'all' and is_admin(user_id):
+        return list(duplicate_index.roots)
+    return [get_download_path(context, user_id, context.bot_data.get('db_manager'))]
+
+
 async def duplicate_check_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Check untuk duplicate files"""
+    """Check untuk duplicate files (scan rekursif folder download user, /duplicates all = seluruh library)"""
     user_id = update.effective_user.id
     
     try:
+        from src.managers.download_manager import DownloadManager
+        
         db_manager = context.bot_data.get('db_manager')
+        duplicate_index = context.bot_data.get('duplicate_index')
         
-        if not db_manager:
-            await update.message.reply_text("❌ Database tidak tersedia")
+        if not db_manager or not duplicate_index:
+            await update.message.reply_text("❌ Duplicate index tidak tersedia")
             return
         
-        # Get file hashes
-        hashes = db_manager.get_file_hashes(user_id)
-        
-        if not hashes:
+        scope = 'all' if context.args and context.args[0].lower() == 'all' else 'own'
+        roots = _duplicate_roots(context, user_id, scope)
+        download_path = roots[0]
+        if not any(os.path.isdir(root) for root in roots):
             await update.message.reply_text("📁 Belum ada file untuk check duplicates")
             return
         
-        # Find duplicates
-        hash_map = {}
-        duplicates = []
-        
-        for file_info in hashes:
-            hash_val = file_info['md5_hash']
-            if hash_val in hash_map:
-                duplicates.append({
-                    'original': hash_map[hash_val],
-                    'duplicate': file_info
-                })
-            else:
-                hash_map[hash_val] = file_info
+        status_message = await update.message.reply_text("🔍 Scanning for duplicates...")
+        
+        # Size bucket -> partial hash -> full hash, file yang tidak berubah dari cache
+        report = await duplicate_index.scan_async(roots)
+        groups = report['groups']
+        format_size = DownloadManager.format_size
         
         text = "🔍 **Duplicate Detection Results**\n\n"
-        text += f"📊 Total Files: {len(hashes)}\n"
-        text += f"🔄 Duplicates Found: {len(duplicates)}\n\n"
+        text += f"📊 Total Files: {report.get('files', 0)} ({format_size(report.get('bytes', 0))})\n"
+        text += f"🔄 Duplicate Groups: {len(groups)}\n"
+        text += f"💾 Reclaimable: {format_size(report['reclaimable_bytes'])}\n"
+        text += f"⚡ Hashed: {report.get('partial_hashed', 0)} partial, {report.get('full_hashed', 0)} full\n\n"
         
-        if duplicates:
+        if groups:
             text += "**Duplicate Files:**\n"
-            for i, dup in enumerate(duplicates[:10], 1):  # Show max 10
-                orig = dup['original']
-                dupl = dup['duplicate']
+            for i, group in enumerate(groups[:10], 1):  # Show max 10
+                orig = group[0]
                 
-                text += f"\n{i}. **{orig['filename']}**\n"
-                text += f"   Duplicate: {dupl['filename']}\n"
-                text += f"   Size: {orig['file_size']} bytes\n"
+                text += f"\n{i}. **{orig['filename']}** ({format_size(orig['file_size'])})\n"
+                for dupl in group[1:4]:
+                    text += f"   Duplicate: {os.path.relpath(dupl['filepath'], download_path)}\n"
+                if len(group) > 4:
+                    text += f"   ... +{len(group) - 4} more\n"
         else:
             text += "✨ No duplicates found! All files are unique."
         
-        await update.message.reply_text(text, parse_mode='Markdown')
+        reply_markup = None
+        if report['reclaimable_bytes']:
+            reply_markup = InlineKeyboardMarkup([[
+                InlineKeyboardButton("🧹 Preview Reclaim", callback_data=f"smart_dedup_preview:{scope}")
+            ]])
+        
+        await status_message.edit_text(text, reply_markup=reply_markup, parse_mode='Markdown')
     
     except Exception as e:
         logger.error(f"Error in duplicate_check_command: {e}")
@@ -310,6 +361,9 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if data == "queue_refresh":
             await queue_command(update, context)
         
+        elif data.startswith("queue_page:"):
+            await queue_command(update, context, offset=max(0, int(data.split(":")[1])))
+        
         elif data == "queue_stats":
             queue_manager = context.bot_data.get('queue_manager')
             status = await queue_manager.get_queue_status(user_id)
@@ -325,6 +379,13 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text += f"• Completed: {status['completed']}\n"
             text += f"• Failed: {status['failed']}\n"
             
+            wait = status.get('wait')
+            if wait:
+                text += "\n⏱️ **Wait Time**\n"
+                text += f"• Average: {wait['avg_wait']:.1f}s\n"
+                text += f"• Max: {wait['max_wait']:.1f}s\n"
+                text += f"• Oldest Pending: {wait['oldest_wait']:.1f}s\n"
+            
             await query.edit_message_text(text, parse_mode='Markdown')
         
         # Preview callback
@@ -433,6 +494,48 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             await query.edit_message_text(text, parse_mode='HTML')
         
+        # Duplicate reclaim callbacks (preview = dry-run, run = ganti duplicate dengan link)
+        elif data.startswith(("smart_dedup_preview:", "smart_dedup_run:")):
+            from app.handlers.common import is_admin
+            from src.managers.download_manager import DownloadManager
+            
+            action, scope = data.split(":", 1)
+            dry_run = action == "smart_dedup_preview"
+            duplicate_index = context.bot_data.get('duplicate_index')
+            
+            if not duplicate_index:
+                await query.edit_message_text("❌ Duplicate index tidak tersedia")
+                return
+            if not dry_run and not is_admin(user_id):
+                await query.edit_message_text("❌ Hanya admin yang bisa reclaim duplicate")
+                return
+            
+            await query.edit_message_text("🔍 Verifying duplicates..." if dry_run else "🧹 Reclaiming space...")
+            
+            result = await duplicate_index.reclaim_async(_duplicate_roots(context, user_id, scope),
+                                                         dry_run=dry_run)
+            format_size = DownloadManager.format_size
+            
+            text = "🧹 **Reclaim Preview (dry-run)**\n\n" if dry_run else "✅ **Reclaim Complete!**\n\n"
+            text += f"💾 {'Will free' if dry_run else 'Freed'}: {format_size(result['bytes_saved'])}\n"
+            text += f"🔗 Files {'to link' if dry_run else 'linked'}: {result['files']} "
+            text += f"({', '.join(f'{method} {count}' for method, count in result['methods'].items()) or '-'})\n"
+            text += f"♻️ Already linked: {result['already_linked']}\n"
+            text += f"⚙️ Mode: {result['mode']}\n"
+            if result['skipped']:
+                text += "\n**Skipped:**\n"
+                for reason, count in result['skipped'].items():
+                    text += f"• {reason}: {count}\n"
+            
+            reply_markup = None
+            if dry_run and result['files'] and is_admin(user_id):
+                reply_markup = InlineKeyboardMarkup([[
+                    InlineKeyboardButton(f"✅ Reclaim {format_size(result['bytes_saved'])}",
+                                         callback_data=f"smart_dedup_run:{scope}")
+                ]])
+            
+            await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        
         # Cloud callbacks
         elif data.startswith("cloud_"):
             service = data.split("_")[1]
@@ -479,5 +582,10 @@ def get_smart_features_handlers():
         CommandHandler('cloud', cloud_command),
         CommandHandler('smartcat', smart_category_command),
         CommandHandler('duplicates', duplicate_check_command),
-        CallbackQueryHandler(button_callback, pattern="^(queue_|preview_|stats_|smart_|cloud_)")
+        # Hanya callback yang ditangani di sini; smart_queue, smart_dashboard,
+        # cloud_setup_* dst. milik button_handler (smart menu)
+        CallbackQueryHandler(button_callback, pattern=(
+            "^(queue_(refresh|stats)$|queue_page:|preview_|stats_|smart_auto$|"
+            "smart_dedup_(preview|run):|cloud_(gdrive|dropbox|onedrive|help)$)"
+        ))
     ]
@@ -12,6 +12,25 @@ ADMIN_IDS = [int(id.strip()) for id in os.getenv('ADMIN_IDS', '').split(',') if
 DEFAULT_DOWNLOAD_DIR = os.getenv('DEFAULT_DOWNLOAD_DIR', './downloads')
 MAX_CONCURRENT_DOWNLOADS = int(os.getenv('MAX_CONCURRENT_DOWNLOADS', '5'))
 CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '8192'))  # 8KB
+QUEUE_FLUSH_INTERVAL = float(os.getenv('QUEUE_FLUSH_INTERVAL', '0.5'))  # seconds, batch write queue ke database
+QUEUE_FAIR_SHARE = os.getenv('QUEUE_FAIR_SHARE', 'true').lower() == 'true'  # round-robin antar user
+QUEUE_PRIORITY_WEIGHTS = [float(w) for w in os.getenv('QUEUE_PRIORITY_WEIGHTS', '1,2,4,8').split(',')]  # LOW,NORMAL,HIGH,URGENT
+QUEUE_AGING_SECONDS = float(os.getenv('QUEUE_AGING_SECONDS', '300'))  # naik 1 level priority per interval, 0 = disabled
+QUEUE_SIZE_AWARE = os.getenv('QUEUE_SIZE_AWARE', 'true').lower() == 'true'  # probe ukuran + shortest-first campuran
+QUEUE_SHORT_JOB_RATIO = float(os.getenv('QUEUE_SHORT_JOB_RATIO', '0.75'))  # proporsi dispatch untuk file terkecil
+QUEUE_PROBE_CONCURRENCY = int(os.getenv('QUEUE_PROBE_CONCURRENCY', '4'))
+QUEUE_PROBE_CACHE_TTL = float(os.getenv('QUEUE_PROBE_CACHE_TTL', '3600'))  # seconds, cache hasil probe per URL
+QUEUE_FINISHED_LIMIT = int(os.getenv('QUEUE_FINISHED_LIMIT', '1000'))  # item selesai terakhir yang disimpan di memory
+QUEUE_PREEMPTION = os.getenv('QUEUE_PREEMPTION', 'true').lower() == 'true'  # item HIGH/URGENT boleh suspend download priority rendah
+QUEUE_PREEMPT_PRIORITY = os.getenv('QUEUE_PREEMPT_PRIORITY', 'HIGH').upper()  # priority minimal pemicu preemption
+QUEUE_PREEMPT_MIN_RUNTIME = float(os.getenv('QUEUE_PREEMPT_MIN_RUNTIME', '120'))  # seconds, victim minimal berjalan
+QUEUE_PREEMPT_MAX_COUNT = int(os.getenv('QUEUE_PREEMPT_MAX_COUNT', '2'))  # maksimal suspend per item
+
+# Resume Configuration (checkpoint disimpan di tabel resume_journal)
+RESUME_SAVE_INTERVAL = int(os.getenv('RESUME_SAVE_INTERVAL', '1048576'))  # bytes antar checkpoint per download
+RESUME_FLUSH_INTERVAL = float(os.getenv('RESUME_FLUSH_INTERVAL', '1.0'))  # seconds, batch write checkpoint ke database
+RESUME_STATE_DIR = os.getenv('RESUME_STATE_DIR', './downloads/.state')  # state file JSON lama, diimpor sekali
+RESUME_VERIFY_OVERLAP = int(os.getenv('RESUME_VERIFY_OVERLAP', '16384'))  # bytes ekor file yang dicek ulang saat resume, 0 = disabled
 
 # Auto-Retry Configuration
 MAX_DOWNLOAD_RETRIES = int(os.getenv('MAX_DOWNLOAD_RETRIES', '3'))
@@ -19,6 +38,49 @@ RETRY_DELAY_BASE = int(os.getenv('RETRY_DELAY_BASE', '5'))  # Base delay in seco
 
 # Database Configuration
 DATABASE_PATH = os.getenv('DATABASE_PATH', './data/bot.db')
+SETTINGS_CACHE_TTL = int(os.getenv('SETTINGS_CACHE_TTL', '300'))  # seconds, 0 = disabled
+SETTINGS_CACHE_SIZE = int(os.getenv('SETTINGS_CACHE_SIZE', '1024'))  # max cached entries
+
+# Retention Configuration (archive row lama, 0 = tanpa batas)
+RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'true').lower() == 'true'
+RETENTION_ARCHIVE_PATH = os.getenv('RETENTION_ARCHIVE_PATH', './data/bot_archive.db')
+RETENTION_INTERVAL_HOURS = float(os.getenv('RETENTION_INTERVAL_HOURS', '24'))
+RETENTION_SLICE_SIZE = int(os.getenv('RETENTION_SLICE_SIZE', '500'))
+RETENTION_CONVERT_VACUUM = os.getenv('RETENTION_CONVERT_VACUUM', 'false').lower() == 'true'
+RETENTION_POLICIES = {
+    'download_history': (int(os.getenv('RETENTION_HISTORY_DAYS', '180')),
+                         int(os.getenv('RETENTION_HISTORY_MAX_ROWS', '0'))),
+    'virus_scan_results': (int(os.getenv('RETENTION_SCAN_DAYS', '90')),
+                           int(os.getenv('RETENTION_SCAN_MAX_ROWS', '0'))),
+    'download_queue': (int(os.getenv('RETENTION_QUEUE_DAYS', '30')),
+                       int(os.getenv('RETENTION_QUEUE_MAX_ROWS', '0'))),
+    'batch_download_items': (int(os.getenv('RETENTION_BATCH_DAYS', '30')),
+                             int(os.getenv('RETENTION_BATCH_MAX_ROWS', '0'))),
+}
+
+# Hashing Configuration (duplicate detection, scan cache)
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', '4'))  # file yang di-hash bersamaan
+HASH_BUFFER_SIZE = int(os.getenv('HASH_BUFFER_SIZE', str(1024 * 1024)))  # bytes per read
+HASH_MMAP_THRESHOLD = int(os.getenv('HASH_MMAP_THRESHOLD', str(64 * 1024 * 1024)))  # file >= ini dibaca via mmap, 0 = disabled
+DEDUP_LINK_MODE = os.getenv('DEDUP_LINK_MODE', 'auto').lower()  # reclaim duplicate: auto, reflink, hardlink
+
+# Encryption Configuration (format segmented AES-256-GCM)
+ENCRYPTION_SEGMENT_SIZE = int(os.getenv('ENCRYPTION_SEGMENT_SIZE', str(1024 * 1024)))  # plaintext per segment
+ENCRYPTION_WORKERS = int(os.getenv('ENCRYPTION_WORKERS', '4'))  # segment yang diproses bersamaan
+ENCRYPTION_KEY_CACHE_TTL = int(os.getenv('ENCRYPTION_KEY_CACHE_TTL', '900'))  # detik master key PBKDF2 di-cache, 0 = disabled
+ENCRYPT_DOWNLOADS = os.getenv('ENCRYPT_DOWNLOADS', 'false').lower() == 'true'  # encrypt selama download (.enc)
+ENCRYPT_DOWNLOADS_PASSWORD = os.getenv('ENCRYPT_DOWNLOADS_PASSWORD', '')
+
+# Virus Scan Configuration
+VT_API_KEY = os.getenv('VT_API_KEY', '')
+CLAMAV_PATH = os.getenv('CLAMAV_PATH', '')  # clamscan fallback, kosong = cari di PATH
+CLAMD_SOCKET = os.getenv('CLAMD_SOCKET', '')  # Unix socket clamd, kosong = auto-detect
+CLAMD_HOST = os.getenv('CLAMD_HOST', '')  # clamd via TCP (jika CLAMD_SOCKET kosong)
+CLAMD_PORT = int(os.getenv('CLAMD_PORT', '3310'))
+CLAMD_POOL_SIZE = int(os.getenv('CLAMD_POOL_SIZE', '2'))  # koneksi clamd / scan bersamaan
+CLAMD_TIMEOUT = float(os.getenv('CLAMD_TIMEOUT', '60'))  # detik
+CLAMD_STREAM_MAX_LENGTH = int(os.getenv('CLAMD_STREAM_MAX_LENGTH', str(25 * 1024 * 1024)))  # = StreamMaxLength clamd, 0 = tidak dicek
+VT_CACHE_TTL = int(os.getenv('VT_CACHE_TTL', '86400'))  # detik verdict VirusTotal di-cache per SHA-256, 0 = disabled
 
 # Smart Features Configuration
 AUTO_CATEGORIZE_DOWNLOADS = os.getenv('AUTO_CATEGORIZE', 'false').lower() == 'true'
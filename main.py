@@ -1,5 +1,6 @@
 import os
 import logging
+from dataclasses import replace
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -17,6 +18,9 @@ from app.handlers.download_handler import handle_direct_download_link
 from app.handlers.schedule_handler import handle_schedule_link, handle_schedule_time
 from app.handlers.settings_handler import handle_custom_path
 from app.handlers.notification_handler import notification_save_message
+from app.handlers.search_handler import get_search_handlers
+from app.handlers.security_handler import get_security_handlers
+from app.handlers.smart_features_handler import get_smart_features_handlers
 from app.handlers.states import (
     MAIN_MENU, WAITING_LINK, WAITING_SCHEDULE_LINK, 
     WAITING_SCHEDULE_TIME, WAITING_CUSTOM_PATH, WAITING_NOTIFICATION_MESSAGE
@@ -25,7 +29,13 @@ from app.handlers.states import (
 # Import managers and database
 from src.managers.download_manager import DownloadManager
 from src.managers.scheduler_manager import SchedulerManager
+from src.managers.queue_manager import QueueManager, QueuePriority
 from src.managers.notification_manager import NotificationManager
+from src.managers.retention_manager import RetentionManager, DEFAULT_POLICIES
+from src.managers.resume_downloader import DownloadState, ResumableDownloader
+from src.utils.file_hasher import HashEngine, DuplicateIndex
+from src.utils.file_encryption import FileEncryption
+from src.utils.virus_scanner import ClamdClient, VirusScanner
 from src.database.db_manager import Database
 
 # Import config
@@ -52,7 +62,11 @@ def main():
     
     # Initialize database
     logger.info("Initializing database...")
-    db_manager = Database(config.DATABASE_PATH)
+    db_manager = Database(
+        config.DATABASE_PATH,
+        cache_ttl=config.SETTINGS_CACHE_TTL,
+        cache_size=config.SETTINGS_CACHE_SIZE
+    )
     
     # Create application first to get bot instance
     logger.info("Creating bot application...")
@@ -70,19 +84,129 @@ def main():
     logger.info("Initializing notification manager...")
     notification_manager = NotificationManager(application.bot)
     
+    # File encryption (format segmented, segment di-encrypt paralel)
+    file_encryption = FileEncryption(
+        segment_size=config.ENCRYPTION_SEGMENT_SIZE,
+        max_workers=config.ENCRYPTION_WORKERS,
+        key_cache_ttl=config.ENCRYPTION_KEY_CACHE_TTL
+    )
+    
+    # Encrypt-on-download butuh password tetap (password acak tidak bisa dikirim ulang)
+    encrypt_password = None
+    if config.ENCRYPT_DOWNLOADS:
+        encrypt_password = config.ENCRYPT_DOWNLOADS_PASSWORD or None
+        if not encrypt_password:
+            logger.warning("ENCRYPT_DOWNLOADS aktif tanpa ENCRYPT_DOWNLOADS_PASSWORD, encrypt-on-download dimatikan")
+    
     # Initialize download manager
     logger.info("Initializing download manager...")
-    download_manager = DownloadManager(db_manager=db_manager, notification_manager=notification_manager)
+    download_manager = DownloadManager(
+        db_manager=db_manager,
+        notification_manager=notification_manager,
+        file_encryption=file_encryption,
+        encrypt_password=encrypt_password
+    )
+    
+    # Initialize queue manager
+    logger.info("Initializing download queue...")
+    queue_manager = QueueManager(
+        max_concurrent=config.MAX_CONCURRENT_DOWNLOADS,
+        download_manager=download_manager,
+        download_dir=config.DEFAULT_DOWNLOAD_DIR,
+        db_manager=db_manager,
+        flush_interval=config.QUEUE_FLUSH_INTERVAL,
+        fair_share=config.QUEUE_FAIR_SHARE,
+        priority_weights=dict(zip(QueuePriority, config.QUEUE_PRIORITY_WEIGHTS)),
+        aging_seconds=config.QUEUE_AGING_SECONDS,
+        size_aware=config.QUEUE_SIZE_AWARE,
+        short_job_ratio=config.QUEUE_SHORT_JOB_RATIO,
+        probe_concurrency=config.QUEUE_PROBE_CONCURRENCY,
+        probe_cache_ttl=config.QUEUE_PROBE_CACHE_TTL,
+        finished_limit=config.QUEUE_FINISHED_LIMIT,
+        preemption=config.QUEUE_PREEMPTION,
+        preempt_priority=QueuePriority[config.QUEUE_PREEMPT_PRIORITY],
+        preempt_min_runtime=config.QUEUE_PREEMPT_MIN_RUNTIME,
+        preempt_max_count=config.QUEUE_PREEMPT_MAX_COUNT
+    )
     
     # Initialize scheduler manager
     logger.info("Initializing scheduler...")
     scheduler_manager = SchedulerManager(download_manager, db_manager=db_manager, notification_manager=notification_manager)
     
+    # Initialize resume journal (state file JSON lama diimpor sekali)
+    download_state = DownloadState(
+        db_manager,
+        state_dir=config.RESUME_STATE_DIR,
+        flush_interval=config.RESUME_FLUSH_INTERVAL
+    )
+    resume_downloader = ResumableDownloader(
+        download_state,
+        save_interval=config.RESUME_SAVE_INTERVAL,
+        verify_overlap=config.RESUME_VERIFY_OVERLAP
+    )
+    
+    # Shared hash engine (thread pool, MD5 + SHA256 dalam satu pass)
+    hash_engine = HashEngine(
+        max_workers=config.HASH_WORKERS,
+        chunk_size=config.HASH_BUFFER_SIZE,
+        mmap_threshold=config.HASH_MMAP_THRESHOLD or None
+    )
+    
+    # Duplicate index rekursif (hash di-cache di file_hashes)
+    duplicate_index = DuplicateIndex(db_manager, hash_engine, roots=[config.DEFAULT_DOWNLOAD_DIR],
+                                     link_mode=config.DEDUP_LINK_MODE)
+    
+    # Virus scanner: clamd jika ada, clamscan sebagai fallback; verdict di-cache per SHA-256
+    clamd = ClamdClient.detect(
+        socket_path=config.CLAMD_SOCKET or None,
+        host=config.CLAMD_HOST or None,
+        port=config.CLAMD_PORT,
+        pool_size=config.CLAMD_POOL_SIZE,
+        timeout=config.CLAMD_TIMEOUT,
+        stream_max_length=config.CLAMD_STREAM_MAX_LENGTH or None
+    )
+    virus_scanner = VirusScanner(
+        virustotal_api_key=config.VT_API_KEY or None,
+        clamd=clamd,
+        clamscan_path=config.CLAMAV_PATH or None,
+        db_manager=db_manager,
+        hash_engine=hash_engine,
+        vt_cache_ttl=config.VT_CACHE_TTL
+    )
+    
+    # Initialize retention manager
+    retention_manager = None
+    if config.RETENTION_ENABLED:
+        logger.info("Initializing retention manager...")
+        policies = {
+            table: replace(DEFAULT_POLICIES[table], max_age_days=max_age_days, max_rows=max_rows)
+            for table, (max_age_days, max_rows) in config.RETENTION_POLICIES.items()
+        }
+        
+        retention_manager = RetentionManager(
+            db_manager,
+            policies=policies,
+            archive_path=config.RETENTION_ARCHIVE_PATH or None,
+            slice_size=config.RETENTION_SLICE_SIZE,
+            interval_hours=config.RETENTION_INTERVAL_HOURS
+        )
+        
+        if config.RETENTION_CONVERT_VACUUM:
+            retention_manager.enable_incremental_vacuum()
+    
     # Store managers in bot_data
     application.bot_data['download_manager'] = download_manager
     application.bot_data['scheduler_manager'] = scheduler_manager
+    application.bot_data['queue_manager'] = queue_manager
     application.bot_data['db_manager'] = db_manager
     application.bot_data['notification_manager'] = notification_manager
+    application.bot_data['retention_manager'] = retention_manager
+    application.bot_data['download_state'] = download_state
+    application.bot_data['resume_downloader'] = resume_downloader
+    application.bot_data['hash_engine'] = hash_engine
+    application.bot_data['duplicate_index'] = duplicate_index
+    application.bot_data['file_encryption'] = file_encryption
+    application.bot_data['virus_scanner'] = virus_scanner
     
     # Create conversation handler
     conv_handler = ConversationHandler(
@@ -131,6 +255,19 @@ def main():
         fallbacks=[CommandHandler('cancel', cancel_handler)],
     )
     
+    # Search handlers didaftarkan sebelum conversation handler agar
+    # callback pagination tidak tertangkap button_handler
+    for handler in get_search_handlers():
+        application.add_handler(handler)
+    
+    # /scan, /encrypt, /encryptall, /decrypt, /resume + callback-nya
+    for handler in get_security_handlers():
+        application.add_handler(handler)
+    
+    # /queue, /duplicates (+ reclaim), /stats, /preview, /cloud, /smartcat
+    for handler in get_smart_features_handlers():
+        application.add_handler(handler)
+    
     application.add_handler(conv_handler)
     
     # Setup post_init callback untuk start scheduler dan set commands
@@ -139,11 +276,25 @@ def main():
         logger.info("Starting scheduler...")
         scheduler_manager.start()
         
+        logger.info("Starting download queue...")
+        queue_manager.start_processing()
+        
+        if retention_manager:
+            logger.info("Starting retention maintenance...")
+            retention_manager.start()
+        
         # Set bot commands untuk autocomplete
         from telegram import BotCommand
         commands = [
             BotCommand("start", "🏠 Mulai bot"),
             BotCommand("menu", "📋 Tampilkan menu utama"),
+            BotCommand("search", "🔎 Cari riwayat unduhan"),
+            BotCommand("scan", "🛡️ Scan file untuk virus"),
+            BotCommand("encrypt", "🔒 Encrypt file"),
+            BotCommand("encryptall", "🔐 Encrypt semua file di folder"),
+            BotCommand("decrypt", "🔓 Decrypt file"),
+            BotCommand("queue", "📋 Status antrian download"),
+            BotCommand("duplicates", "🔍 Cari & reclaim file duplikat"),
         ]
         await application.bot.set_my_commands(commands)
         logger.info("✅ Bot commands registered")
@@ -153,6 +304,14 @@ def main():
         """Cleanup saat bot dihentikan"""
         logger.info("Stopping scheduler...")
         scheduler_manager.stop()
+        queue_manager.stop_processing()
+        download_state.flush()
+        hash_engine.shutdown()
+        file_encryption.shutdown()
+        await virus_scanner.close()
+        
+        if retention_manager:
+            retention_manager.stop()
     
     # Setup error handler untuk network errors
     async def error_handler(update, context):
@@ -0,0 +1,750 @@
+#!/usr/bin/env python3
+"""
+Database Benchmark
+Micro-benchmark untuk semua public method Database pada dataset sintetis
+berukuran produksi, termasuk skenario beberapa writer bersamaan.
+
+Contoh:
+    python scripts/benchmark_db.py
+    python scripts/benchmark_db.py --history 200000 --output before.json
+    python scripts/benchmark_db.py --output after.json --compare before.json
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from src.database.db_manager import Database  # noqa: E402
+
+DAY_MS = 86400 * 1000
+STATUSES = ['completed'] * 8 + ['failed', 'cancelled']
+HOSTS = ['github.com', 'example.com', 'cdn.kernel.org', 'files.pythonhosted.org',
+         'archive.org', 'drive.google.com', 'dl.dropboxusercontent.com', 'mirror.math.princeton.edu']
+WORDS = ['laporan', 'backup', 'video', 'release', 'ubuntu', 'dataset', 'invoice', 'slides',
+         'music', 'photo', 'archive', 'linux', 'setup', 'manual', 'ebook', 'podcast']
+EXTENSIONS = ['zip', 'pdf', 'mp4', 'iso', 'tar.gz', 'mp3', 'jpg', 'docx', 'epub', 'apk']
+
+
+# ===== DATASET =====
+
+class Dataset:
+    """Parameter dan generator dataset sintetis"""
+
+    def __init__(self, args):
+        self.users = args.users
+        self.history = args.history
+        self.hashes = args.hashes
+        self.queue = args.queue
+        self.scans = args.scans
+        self.schedules = args.schedules
+        self.batches = args.batches
+        self.batch_size = args.batch_size
+        self.seed = args.seed
+        self.now_ms = int(time.time() * 1000)
+
+    @property
+    def params(self) -> Dict:
+        return {
+            'users': self.users,
+            'history': self.history,
+            'hashes': self.hashes,
+            'queue': self.queue,
+            'scans': self.scans,
+            'schedules': self.schedules,
+            'batches': self.batches,
+            'batch_size': self.batch_size,
+            'seed': self.seed
+        }
+
+    def user_id(self, rng: random.Random) -> int:
+        """User ID dengan distribusi miring (sedikit user sangat aktif)"""
+        return 100000 + int(self.users * rng.random() ** 3)
+
+    def timestamp(self, rng: random.Random, days: int = 365):
+        """(iso, ms) acak dalam N hari terakhir"""
+        ms = self.now_ms - int(rng.random() * days * DAY_MS)
+        return datetime.fromtimestamp(ms / 1000).isoformat(), ms
+
+    @staticmethod
+    def filename(rng: random.Random, i: int) -> str:
+        return f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}.{rng.choice(EXTENSIONS)}"
+
+    @staticmethod
+    def url(rng: random.Random, filename: str) -> str:
+        return f"https://{rng.choice(HOSTS)}/{rng.choice(WORDS)}/{filename}"
+
+    def generate(self, path: str, chunk: int = 50000):
+        """Buat bot.db sintetis (schema dari Database, data via executemany)"""
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+        Database(path, cache_ttl=0)
+        rng = random.Random(self.seed)
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA journal_mode = MEMORY')
+        conn.execute('PRAGMA synchronous = OFF')
+
+        def insert(label: str, sql: str, total: int, row_factory: Callable[[int], tuple]):
+            started = time.perf_counter()
+            for offset in range(0, total, chunk):
+                rows = [row_factory(i) for i in range(offset, min(offset + chunk, total))]
+                conn.executemany(sql, rows)
+                conn.commit()
+            print(f"  {label:<22} {total:>9,} rows  {time.perf_counter() - started:6.1f}s")
+
+        def history_row(i):
+            filename = self.filename(rng, i)
+            start, start_ms = self.timestamp(rng)
+            end_ms = start_ms + rng.randint(1000, 600000)
+            return (self.user_id(rng), f"bench-dl-{i}", self.url(rng, filename), filename,
+                    f"/downloads/{filename}", rng.choice(STATUSES), rng.randint(1024, 2 ** 31),
+                    start, datetime.fromtimestamp(end_ms / 1000).isoformat(),
+                    start_ms, end_ms, rng.choice(HOSTS))
+
+        insert('download_history', '''
+            INSERT INTO download_history
+            (user_id, download_id, url, filename, filepath, status, file_size,
+             start_time, end_time, start_time_ms, end_time_ms, host)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', self.history, history_row)
+
+        def hash_row(i):
+            filename = self.filename(rng, i)
+            created, created_ms = self.timestamp(rng)
+            # ~5% duplikat: pakai ulang hash dari file sebelumnya
+            key = rng.randrange(i) if i and rng.random() < 0.05 else i
+            return (self.user_id(rng), filename, f"/downloads/{i}/{filename}", rng.randint(1024, 2 ** 31),
+                    hashlib.md5(str(key).encode()).hexdigest(),
+                    hashlib.sha256(str(key).encode()).hexdigest(), created, created_ms)
+
+        insert('file_hashes', '''
+            INSERT INTO file_hashes
+            (user_id, filename, filepath, file_size, md5_hash, sha256_hash, created_time, created_time_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', self.hashes, hash_row)
+
+        def queue_row(i):
+            filename = self.filename(rng, i)
+            added, added_ms = self.timestamp(rng, days=30)
+            status = rng.choice(['pending'] * 4 + ['downloading', 'completed', 'failed'])
+            return (f"bench-q-{i}", self.user_id(rng), self.url(rng, filename), filename,
+                    rng.randint(1, 4), status, added, added_ms)
+
+        insert('download_queue', '''
+            INSERT INTO download_queue
+            (queue_id, user_id, url, filename, priority, status, added_time, added_time_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', self.queue, queue_row)
+
+        def scan_row(i):
+            filename = self.filename(rng, i)
+            scanned, scanned_ms = self.timestamp(rng)
+            infected = rng.random() < 0.01
+            return (self.user_id(rng), f"/downloads/{filename}", filename, scanned, scanned_ms,
+                    'infected' if infected else 'clean', int(infected),
+                    json.dumps(['Eicar-Test'] if infected else []), json.dumps(['clamav']))
+
+        insert('virus_scan_results', '''
+            INSERT INTO virus_scan_results
+            (user_id, filepath, filename, scan_time, scan_time_ms, status, infected, threats, scanners)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', self.scans, scan_row)
+
+        def schedule_row(i):
+            scheduled_ms = self.now_ms + rng.randint(-30 * DAY_MS, 30 * DAY_MS)
+            status = 'pending' if scheduled_ms > self.now_ms else 'completed'
+            created, created_ms = self.timestamp(rng, days=30)
+            return (self.user_id(rng), f"bench-s-{i}", self.url(rng, self.filename(rng, i)),
+                    datetime.fromtimestamp(scheduled_ms / 1000).isoformat(), scheduled_ms,
+                    created, created_ms, status, '/downloads')
+
+        insert('scheduled_downloads', '''
+            INSERT INTO scheduled_downloads
+            (user_id, schedule_id, url, scheduled_time, scheduled_time_ms,
+             created_time, created_time_ms, status, download_path)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', self.schedules, schedule_row)
+
+        def batch_row(i):
+            created, created_ms = self.timestamp(rng)
+            return (self.user_id(rng), f"bench-b-{i}", self.batch_size, self.batch_size, 0,
+                    'completed', created, created_ms)
+
+        insert('batch_downloads', '''
+            INSERT INTO batch_downloads
+            (user_id, batch_id, total_urls, completed_urls, failed_urls, status,
+             created_time, created_time_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', self.batches, batch_row)
+
+        def batch_item_row(i):
+            batch, item = divmod(i, self.batch_size)
+            filename = self.filename(rng, i)
+            return (f"bench-b-{batch}", self.url(rng, filename), f"bench-b-{batch}-{item}",
+                    'completed', filename)
+
+        insert('batch_download_items', '''
+            INSERT INTO batch_download_items (batch_id, url, download_id, status, filename)
+            VALUES (?, ?, ?, ?, ?)
+        ''', self.batches * self.batch_size, batch_item_row)
+
+        def preference_row(i):
+            created, _ = self.timestamp(rng)
+            # Path relatif, diarahkan ke folder sementara oleh use_paths_root()
+            return (100000 + i, f"users/{i}", int(rng.random() < 0.3), created, created)
+
+        insert('user_preferences', '''
+            INSERT INTO user_preferences
+            (user_id, custom_download_path, use_custom_path, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', self.users, preference_row)
+
+        def bandwidth_row(i):
+            updated, _ = self.timestamp(rng)
+            return (100000 + i, rng.choice([0, 512, 1024, 4096]), int(rng.random() < 0.2),
+                    '22:00', '06:00', 2048, updated)
+
+        insert('bandwidth_settings', '''
+            INSERT INTO bandwidth_settings
+            (user_id, max_speed_kbps, schedule_enabled, schedule_start_time,
+             schedule_end_time, schedule_speed_kbps, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', self.users, bandwidth_row)
+
+        def rule_row(i):
+            created, _ = self.timestamp(rng)
+            return (100000 + i // 5, f"*{rng.choice(WORDS)}*", rng.choice(WORDS).title(),
+                    1.0, created, created, rng.randint(0, 50))
+
+        insert('categorization_rules', '''
+            INSERT INTO categorization_rules
+            (user_id, pattern, category, confidence, created_time, last_used, use_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', self.users * 5, rule_row)
+
+        def statistics_row(i):
+            user, day = divmod(i, 30)
+            date = datetime.fromtimestamp((self.now_ms - day * DAY_MS) / 1000).date().isoformat()
+            total = rng.randint(1, 40)
+            failed = rng.randint(0, total // 4)
+            return (100000 + user, date, total, total * rng.randint(10 ** 6, 10 ** 8),
+                    total - failed, failed, rng.uniform(100, 20000))
+
+        insert('download_statistics', '''
+            INSERT INTO download_statistics
+            (user_id, date, total_downloads, total_bytes, successful_downloads,
+             failed_downloads, avg_speed_kbps)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', self.users * 30, statistics_row)
+
+        def metadata_row(i):
+            extracted, _ = self.timestamp(rng)
+            return (f"/downloads/{i}/meta.{rng.choice(EXTENSIONS)}", 'video', 'video/mp4',
+                    rng.randint(10, 7200), 1920, 1080, None, json.dumps({'codec': 'h264'}), extracted)
+
+        insert('file_metadata', '''
+            INSERT INTO file_metadata
+            (filepath, file_type, mime_type, duration, width, height,
+             thumbnail_path, metadata_json, extracted_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', self.hashes // 10, metadata_row)
+
+        def encryption_row(i):
+            created, _ = self.timestamp(rng)
+            filename = self.filename(rng, i)
+            return (self.user_id(rng), filename, filename + '.enc', '', created)
+
+        insert('encryption_passwords', '''
+            INSERT INTO encryption_passwords
+            (user_id, filename, encrypted_filename, password_hint, created_time)
+            VALUES (?, ?, ?, ?, ?)
+        ''', self.hashes // 10, encryption_row)
+
+        conn.execute('CREATE TABLE bench_meta (params TEXT)')
+        conn.execute('INSERT INTO bench_meta VALUES (?)', (json.dumps(self.params, sort_keys=True),))
+        conn.commit()
+        conn.execute('ANALYZE')
+        conn.close()
+
+    def matches(self, path: str) -> bool:
+        """True jika dataset di path dibuat dengan parameter yang sama"""
+        if not os.path.exists(path):
+            return False
+        try:
+            conn = sqlite3.connect(path)
+            row = conn.execute('SELECT params FROM bench_meta').fetchone()
+            conn.close()
+        except sqlite3.Error:
+            return False
+        return bool(row) and json.loads(row[0]) == self.params
+
+
+# ===== MEASUREMENT =====
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile dari list yang sudah terurut"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    """Ringkas latency (detik) menjadi statistik dalam milidetik"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'iterations': count,
+        'errors': errors,
+        'p50_ms': round(percentile(values, 50) * 1000, 4),
+        'p90_ms': round(percentile(values, 90) * 1000, 4),
+        'p99_ms': round(percentile(values, 99) * 1000, 4),
+        'mean_ms': round(sum(values) / count * 1000, 4) if count else 0.0,
+        'max_ms': round(values[-1] * 1000, 4) if count else 0.0,
+        'ops_per_sec': round(count / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+
+def measure(call: Callable[[int], object], iterations: int, warmup: int = 3) -> Dict:
+    """Jalankan call(i) berulang dan ukur latency setiap panggilan"""
+    for i in range(warmup):
+        call(-1 - i)
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        try:
+            call(i)
+        except (sqlite3.Error, OSError):
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+# ===== BENCHMARK CASES =====
+
+def use_paths_root(db_path: str, paths_root: str):
+    """
+    Arahkan custom_download_path di salinan kerja ke bawah paths_root
+
+    get_download_path membuat folder custom path, jadi path dataset tidak boleh
+    menunjuk ke lokasi nyata di luar folder benchmark.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        UPDATE user_preferences
+        SET custom_download_path = ? || '/users/' || user_id
+    ''', (paths_root,))
+    conn.commit()
+    conn.close()
+
+
+def build_cases(db: Database, dataset: Dataset, rng: random.Random,
+                paths_root: str) -> Dict[str, tuple]:
+    """
+    Daftar benchmark per method: name -> (method, call, iterations_factor)
+
+    iterations_factor < 1 untuk method yang membaca banyak row sekaligus.
+    Folder yang dibuat method (custom download path) berada di bawah paths_root.
+    """
+    counter = iter(range(10 ** 9))
+
+    def uid():
+        return dataset.user_id(rng)
+
+    def any_user():
+        return 100000 + rng.randrange(dataset.users)
+
+    def history_id():
+        return f"bench-dl-{rng.randrange(dataset.history)}"
+
+    def queue_id():
+        return f"bench-q-{rng.randrange(dataset.queue)}"
+
+    def batch_id():
+        return f"bench-b-{rng.randrange(dataset.batches)}"
+
+    def md5():
+        return hashlib.md5(str(rng.randrange(dataset.hashes)).encode()).hexdigest()
+
+    # Cursor di tengah riwayat user paling aktif untuk mengukur halaman "dalam"
+    heavy_user = 100000
+    deep = db.get_download_history_page(heavy_user, limit=max(1, dataset.history // dataset.users // 2))
+    deep_cursor = deep['next_cursor']
+
+    def fresh_batch(i):
+        bid = f"bench-new-b-{next(counter)}"
+        db.add_batch_download(uid(), bid, 10, [
+            {'url': f"https://example.com/{n}", 'download_id': f"{bid}-{n}"} for n in range(10)
+        ])
+        return bid
+
+    cases = {
+        # User preferences
+        'get_user_preference': (db.get_user_preference, lambda i: db.get_user_preference(any_user()), 1),
+        'set_user_download_path': (db.set_user_download_path,
+                                   lambda i: db.set_user_download_path(
+                                       any_user(), os.path.join(paths_root, 'bench', str(i))), 1),
+        'toggle_custom_path': (db.toggle_custom_path,
+                               lambda i: db.toggle_custom_path(any_user(), bool(i % 2)), 1),
+        'get_download_path': (db.get_download_path,
+                              lambda i: db.get_download_path(
+                                  any_user(), os.path.join(paths_root, 'downloads')), 1),
+        'get_cache_stats': (db.get_cache_stats, lambda i: db.get_cache_stats(), 1),
+
+        # Download history
+        'add_download_history': (db.add_download_history, lambda i: db.add_download_history(
+            uid(), f"bench-new-dl-{next(counter)}", 'https://example.com/file.zip',
+            'file.zip', '/downloads/file.zip', 'downloading'), 1),
+        'update_download_history': (db.update_download_history, lambda i: db.update_download_history(
+            history_id(), 'completed', file_size=1024), 1),
+        'get_download_history': (db.get_download_history,
+                                 lambda i: db.get_download_history(uid(), limit=20), 1),
+        'get_download_history_page': (db.get_download_history_page,
+                                      lambda i: db.get_download_history_page(uid(), limit=20), 1),
+        'get_download_history_page_deep': (db.get_download_history_page,
+                                           lambda i: db.get_download_history_page(
+                                               heavy_user, limit=20, cursor=deep_cursor), 1),
+        'search_history': (db.search_history,
+                           lambda i: db.search_history(uid(), rng.choice(WORDS), limit=10), 1),
+
+        # Schedules
+        'add_scheduled_download': (db.add_scheduled_download, lambda i: db.add_scheduled_download(
+            uid(), f"bench-new-s-{next(counter)}", 'https://example.com/later.iso',
+            datetime.now().isoformat(), '/downloads'), 1),
+        'get_pending_schedules': (db.get_pending_schedules, lambda i: db.get_pending_schedules(), 0.1),
+        'update_schedule_status': (db.update_schedule_status, lambda i: db.update_schedule_status(
+            f"bench-s-{rng.randrange(dataset.schedules)}", 'pending'), 1),
+        'get_user_schedules': (db.get_user_schedules, lambda i: db.get_user_schedules(uid()), 1),
+        'get_user_schedules_page': (db.get_user_schedules_page,
+                                    lambda i: db.get_user_schedules_page(uid(), limit=10), 1),
+
+        # Batches
+        'add_batch_download': (db.add_batch_download, fresh_batch, 1),
+        'add_batch_items': (db.add_batch_items, lambda i: db.add_batch_items(batch_id(), [
+            {'url': f"https://example.com/{n}", 'download_id': f"bench-new-i-{next(counter)}"}
+            for n in range(50)
+        ]), 1),
+        'add_batch_item': (db.add_batch_item, lambda i: db.add_batch_item(
+            batch_id(), 'https://example.com/x', f"bench-new-i-{next(counter)}"), 1),
+        'update_batch_item_status': (db.update_batch_item_status, lambda i: db.update_batch_item_status(
+            batch_id(), f"{batch_id()}-{rng.randrange(dataset.batch_size)}",
+            rng.choice(['completed', 'failed'])), 1),
+        'get_batch_info': (db.get_batch_info, lambda i: db.get_batch_info(batch_id()), 1),
+        'get_user_batches': (db.get_user_batches, lambda i: db.get_user_batches(uid()), 1),
+        'get_user_batches_page': (db.get_user_batches_page,
+                                  lambda i: db.get_user_batches_page(uid(), limit=10), 1),
+
+        # Bandwidth
+        'get_bandwidth_settings': (db.get_bandwidth_settings,
+                                   lambda i: db.get_bandwidth_settings(any_user()), 1),
+        'set_bandwidth_limit': (db.set_bandwidth_limit,
+                                lambda i: db.set_bandwidth_limit(any_user(), 1024), 1),
+        'set_bandwidth_schedule': (db.set_bandwidth_schedule, lambda i: db.set_bandwidth_schedule(
+            any_user(), True, '22:00', '06:00', 2048), 1),
+        'get_current_bandwidth_limit': (db.get_current_bandwidth_limit,
+                                        lambda i: db.get_current_bandwidth_limit(any_user()), 1),
+
+        # File hashes
+        'add_file_hash': (db.add_file_hash, lambda i: db.add_file_hash(
+            uid(), 'new.bin', f"/downloads/new/{next(counter)}.bin", 4096,
+            hashlib.md5(str(i).encode()).hexdigest()), 1),
+        'find_duplicate_by_hash': (db.find_duplicate_by_hash,
+                                   lambda i: db.find_duplicate_by_hash(md5()), 1),
+        'find_duplicate_by_hash_user': (db.find_duplicate_by_hash,
+                                        lambda i: db.find_duplicate_by_hash(md5(), uid()), 1),
+        'get_file_hashes': (db.get_file_hashes, lambda i: db.get_file_hashes(uid()), 0.2),
+
+        # Queue
+        'add_to_queue': (db.add_to_queue, lambda i: db.add_to_queue(
+            uid(), f"bench-new-q-{next(counter)}", 'https://example.com/q.zip', 'q.zip',
+            rng.randint(1, 4)), 1),
+        'update_queue_status': (db.update_queue_status, lambda i: db.update_queue_status(
+            queue_id(), rng.choice(['downloading', 'completed', 'paused']), download_id='bench'), 1),
+        'update_queue_progress': (db.update_queue_progress, lambda i: db.update_queue_progress(
+            queue_id(), 512, 1024, 50.0), 1),
+        'get_queue_items': (db.get_queue_items,
+                            lambda i: db.get_queue_items(user_id=uid()), 1),
+        'get_queue_items_all': (db.get_queue_items, lambda i: db.get_queue_items(), 0.05),
+        'get_queue_items_page': (db.get_queue_items_page,
+                                 lambda i: db.get_queue_items_page(uid(), limit=10), 1),
+        'change_queue_priority': (db.change_queue_priority,
+                                  lambda i: db.change_queue_priority(queue_id(), rng.randint(1, 4)), 1),
+        'remove_from_queue': (db.remove_from_queue,
+                              lambda i: db.remove_from_queue(f"bench-missing-{i}"), 1),
+
+        # Metadata & statistics
+        'add_file_metadata': (db.add_file_metadata, lambda i: db.add_file_metadata(
+            f"/downloads/meta/{next(counter)}.mp4", 'video', 'video/mp4', {'duration': 10}), 1),
+        'get_file_metadata': (db.get_file_metadata, lambda i: db.get_file_metadata(
+            f"/downloads/{rng.randrange(max(1, dataset.hashes // 10))}/meta.mp4"), 1),
+        'update_statistics': (db.update_statistics,
+                              lambda i: db.update_statistics(any_user(), 10 ** 6, True, 1500.0), 1),
+        'get_statistics': (db.get_statistics, lambda i: db.get_statistics(any_user()), 1),
+
+        # Cloud, categorization, scans, encryption
+        'save_cloud_token': (db.save_cloud_token,
+                             lambda i: db.save_cloud_token(any_user(), 'dropbox', 'token'), 1),
+        'get_cloud_token': (db.get_cloud_token, lambda i: db.get_cloud_token(any_user(), 'dropbox'), 1),
+        'add_categorization_rule': (db.add_categorization_rule, lambda i: db.add_categorization_rule(
+            any_user(), '*bench*', 'Bench'), 1),
+        'get_categorization_rules': (db.get_categorization_rules,
+                                     lambda i: db.get_categorization_rules(any_user()), 1),
+        'update_rule_usage': (db.update_rule_usage,
+                              lambda i: db.update_rule_usage(any_user(), '*bench*'), 1),
+        'add_scan_result': (db.add_scan_result, lambda i: db.add_scan_result(
+            uid(), '/downloads/x.bin', 'x.bin', 'clean', False, [], ['clamav']), 1),
+        'get_scan_history': (db.get_scan_history, lambda i: db.get_scan_history(uid()), 1),
+        'get_scan_history_page': (db.get_scan_history_page,
+                                  lambda i: db.get_scan_history_page(uid(), limit=10), 1),
+        'save_encryption_info': (db.save_encryption_info, lambda i: db.save_encryption_info(
+            uid(), 'x.bin', 'x.bin.enc'), 1),
+        'get_encrypted_files': (db.get_encrypted_files, lambda i: db.get_encrypted_files(uid()), 1),
+    }
+
+    return cases
+
+
+def uncovered_methods(cases: Dict[str, tuple]) -> List[str]:
+    """Public method Database yang belum punya benchmark"""
+    covered = {case[0].__name__ for case in cases.values()}
+    public = {
+        name for name, _ in inspect.getmembers(Database, inspect.isfunction)
+        if not name.startswith('_')
+    }
+    return sorted(public - covered)
+
+
+# ===== CONCURRENT WRITERS =====
+
+def run_concurrent_writers(db: Database, dataset: Dataset, writers: int, duration: float) -> Dict:
+    """
+    Beberapa thread menulis bersamaan (history + queue + batch progress),
+    ditambah satu reader yang membaca halaman history.
+    """
+    stop = threading.Event()
+    results: Dict[str, Dict] = {}
+    lock = threading.Lock()
+
+    def writer(index: int):
+        rng = random.Random(dataset.seed + 1000 + index)
+        latencies: List[float] = []
+        errors = 0
+        n = 0
+        while not stop.is_set():
+            n += 1
+            op = n % 3
+            t0 = time.perf_counter()
+            try:
+                if op == 0:
+                    download_id = f"bench-cw-{index}-{n}"
+                    db.add_download_history(dataset.user_id(rng), download_id,
+                                            'https://example.com/c.zip', 'c.zip', '/downloads/c.zip',
+                                            'downloading')
+                elif op == 1:
+                    db.update_queue_status(f"bench-q-{rng.randrange(dataset.queue)}", 'downloading',
+                                           download_id=f"bench-cw-{index}-{n}")
+                else:
+                    batch = rng.randrange(dataset.batches)
+                    db.update_batch_item_status(f"bench-b-{batch}",
+                                                f"bench-b-{batch}-{rng.randrange(dataset.batch_size)}",
+                                                rng.choice(['completed', 'failed']))
+            except sqlite3.OperationalError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+        with lock:
+            results[f"writer_{index}"] = {'latencies': latencies, 'errors': errors}
+
+    def reader():
+        rng = random.Random(dataset.seed + 999)
+        latencies: List[float] = []
+        errors = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                db.get_download_history_page(dataset.user_id(rng), limit=20)
+            except sqlite3.OperationalError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+        with lock:
+            results['reader'] = {'latencies': latencies, 'errors': errors}
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads.append(threading.Thread(target=reader))
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    write_latencies = [v for k, r in results.items() if k.startswith('writer_') for v in r['latencies']]
+    write_errors = sum(r['errors'] for k, r in results.items() if k.startswith('writer_'))
+
+    return {
+        'writers': writers,
+        'duration_s': round(elapsed, 2),
+        'writes': summarize(write_latencies, write_errors, elapsed),
+        'reads': summarize(results['reader']['latencies'], results['reader']['errors'], elapsed)
+    }
+
+
+# ===== REPORT =====
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: Dict[str, Dict], baseline: Optional[Dict] = None):
+    header = f"{'method':<34} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>10}"
+    if baseline:
+        header += f" {'p50 Δ':>9} {'p99 Δ':>9}"
+    print(header)
+    print('-' * len(header))
+
+    for name, stats in results.items():
+        line = f"{name:<34} {stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f} {stats['ops_per_sec']:>10.1f}"
+        before = (baseline or {}).get(name)
+        if before:
+            def delta(key):
+                return f"{(stats[key] - before[key]) / before[key] * 100:+.0f}%" if before[key] else 'n/a'
+            line += f" {delta('p50_ms'):>9} {delta('p99_ms'):>9}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Database pada dataset sintetis")
+    parser.add_argument('--dataset', default='./data/bench_dataset.db',
+                        help="File dataset sintetis (dibuat ulang jika parameter berubah)")
+    parser.add_argument('--workdir', default='./data/bench_work.db',
+                        help="Salinan dataset yang dipakai (ditulis oleh benchmark)")
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--history', type=int, default=1_000_000)
+    parser.add_argument('--hashes', type=int, default=100_000)
+    parser.add_argument('--queue', type=int, default=50_000)
+    parser.add_argument('--scans', type=int, default=200_000)
+    parser.add_argument('--schedules', type=int, default=20_000)
+    parser.add_argument('--batches', type=int, default=10_000)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=300, help="Iterasi per method")
+    parser.add_argument('--cache-ttl', type=float, default=0,
+                        help="TTL settings cache (0 = ukur query database tanpa cache)")
+    parser.add_argument('--writers', type=int, default=4, help="Jumlah writer bersamaan (0 = skip)")
+    parser.add_argument('--concurrent-seconds', type=float, default=10)
+    parser.add_argument('--only', nargs='*', help="Hanya jalankan benchmark dengan nama ini")
+    parser.add_argument('--regenerate', action='store_true', help="Paksa buat ulang dataset")
+    parser.add_argument('--output', default='bench_results.json', help="File hasil JSON")
+    parser.add_argument('--compare', help="File JSON hasil sebelumnya untuk dibandingkan")
+    args = parser.parse_args()
+
+    dataset = Dataset(args)
+    os.makedirs(os.path.dirname(os.path.abspath(args.dataset)), exist_ok=True)
+
+    if args.regenerate or not dataset.matches(args.dataset):
+        print(f"📦 Generating synthetic dataset → {args.dataset}")
+        started = time.perf_counter()
+        dataset.generate(args.dataset)
+        print(f"   done in {time.perf_counter() - started:.1f}s\n")
+
+    # Benchmark selalu jalan di salinan agar setiap run mulai dari data yang sama
+    os.makedirs(os.path.dirname(os.path.abspath(args.workdir)), exist_ok=True)
+    shutil.copyfile(args.dataset, args.workdir)
+
+    # Folder yang dibuat selama benchmark, dihapus setelah selesai
+    paths_root = tempfile.mkdtemp(prefix='bench_paths_',
+                                  dir=os.path.dirname(os.path.abspath(args.workdir)))
+    use_paths_root(args.workdir, paths_root)
+
+    db = Database(args.workdir, cache_ttl=args.cache_ttl)
+    rng = random.Random(args.seed)
+    cases = build_cases(db, dataset, rng, paths_root)
+
+    results: Dict[str, Dict] = {}
+    for name, (_, call, factor) in cases.items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(call, max(5, int(args.iterations * factor)))
+        print(f"  {name:<34} p50 {results[name]['p50_ms']:8.3f} ms   p99 {results[name]['p99_ms']:8.3f} ms")
+
+    concurrent = None
+    if args.writers > 0 and not args.only:
+        print(f"\n✍️  Concurrent writers: {args.writers} for {args.concurrent_seconds:.0f}s")
+        concurrent = run_concurrent_writers(db, dataset, args.writers, args.concurrent_seconds)
+
+    shutil.rmtree(paths_root, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'dataset': dataset.params,
+            'dataset_bytes': os.path.getsize(args.dataset),
+            'iterations': args.iterations,
+            'cache_ttl': args.cache_ttl
+        },
+        'results': results,
+        'concurrent': concurrent,
+        'not_covered': uncovered_methods(cases)
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get('results')
+
+    print()
+    print_table(results, baseline)
+
+    if concurrent:
+        writes, reads = concurrent['writes'], concurrent['reads']
+        print(f"\nConcurrent writes: {writes['ops_per_sec']:.0f} ops/s, p50 {writes['p50_ms']:.2f} ms, "
+              f"p99 {writes['p99_ms']:.2f} ms, errors {writes['errors']}")
+        print(f"Concurrent reads:  {reads['ops_per_sec']:.0f} ops/s, p50 {reads['p50_ms']:.2f} ms, "
+              f"p99 {reads['p99_ms']:.2f} ms, errors {reads['errors']}")
+
+    if report['not_covered']:
+        print(f"\n⚠️ Methods without benchmark: {', '.join(report['not_covered'])}")
+
+    print(f"\n📄 Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
 import sqlite3
 import logging
-from typing import Optional, Dict, List
+import json
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
+from urllib.parse import urlparse
 import os
+import re
+
+from src.database.settings_cache import SettingsCache
+from src.database.timestamps import SQL_ISO_TO_MS, to_epoch_ms, now_pair
 
 logger = logging.getLogger(__name__)
 
@@ -10,10 +16,24 @@ logger = logging.getLogger(__name__)
 class Database:
     """Database manager untuk menyimpan user preferences dan download history"""
     
-    def __init__(self, db_path: str):
+    # Kolom waktu ISO TEXT yang punya pasangan INTEGER epoch ms (<kolom>_ms)
+    # untuk range query, ordering dan rollup tanpa compare string
+    TIME_COLUMNS = {
+        'download_history': ('start_time', 'end_time'),
+        'scheduled_downloads': ('scheduled_time', 'created_time', 'executed_time'),
+        'batch_downloads': ('created_time', 'completed_time'),
+        'download_queue': ('added_time', 'started_time', 'completed_time'),
+        'virus_scan_results': ('scan_time',),
+        'file_hashes': ('created_time',),
+    }
+    
+    def __init__(self, db_path: str, cache_ttl: float = 300, cache_size: int = 1024):
         self.db_path = db_path
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self._init_database()
+        
+        # Read-through cache untuk settings per-user yang sering dibaca
+        self.cache = SettingsCache(ttl=cache_ttl, max_size=cache_size)
     
     def _get_connection(self):
         """Get database connection"""
@@ -24,6 +44,10 @@ class Database:
         conn = self._get_connection()
         cursor = conn.cursor()
         
+        # Incremental auto-vacuum (hanya berlaku untuk database baru,
+        # database lama dikonversi lewat RetentionManager.enable_incremental_vacuum)
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        
         # Table untuk user preferences
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS user_preferences (
@@ -97,6 +121,12 @@ class Database:
             )
         ''')
         
+        # Index untuk lookup item per batch
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_batch_items_batch
+            ON batch_download_items (batch_id, download_id)
+        ''')
+        
         # Table untuk bandwidth settings
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS bandwidth_settings (
@@ -142,7 +172,9 @@ class Database:
                 error_message TEXT,
                 file_size INTEGER DEFAULT 0,
                 downloaded_size INTEGER DEFAULT 0,
-                progress REAL DEFAULT 0.0
+                progress REAL DEFAULT 0.0,
+                download_dir TEXT,
+                batch_id TEXT
             )
         ''')
         
@@ -218,6 +250,21 @@ class Database:
             )
         ''')
         
+        # Cache verdict per isi file (SHA-256) dan scanner; valid selama
+        # engine_version (versi engine + signature) sama
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_cache (
+                sha256_hash TEXT NOT NULL,
+                scanner TEXT NOT NULL,
+                engine_version TEXT,
+                infected INTEGER DEFAULT 0,
+                threats TEXT,
+                scan_time TEXT,
+                scan_time_ms INTEGER,
+                PRIMARY KEY (sha256_hash, scanner)
+            )
+        ''')
+        
         # Table untuk encryption passwords (obfuscated)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS encryption_passwords (
@@ -230,14 +277,297 @@ class Database:
             )
         ''')
         
+        # Resume journal: satu row per download yang bisa dilanjutkan.
+        # segments = JSON list [start, end) byte range yang sudah tersimpan
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resume_journal (
+                download_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                filepath TEXT NOT NULL,
+                downloaded_bytes INTEGER DEFAULT 0,
+                total_bytes INTEGER DEFAULT 0,
+                segments TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                resume_supported INTEGER DEFAULT 1,
+                updated_time TEXT,
+                updated_time_ms INTEGER
+            )
+        ''')
+        
+        self._init_time_columns(cursor)
+        
+        # Folder tujuan item queue (database lama belum punya kolom ini)
+        queue_columns = {row[1] for row in cursor.execute('PRAGMA table_info(download_queue)')}
+        if 'download_dir' not in queue_columns:
+            cursor.execute('ALTER TABLE download_queue ADD COLUMN download_dir TEXT')
+        if 'batch_id' not in queue_columns:
+            cursor.execute('ALTER TABLE download_queue ADD COLUMN batch_id TEXT')
+        
+        # Cache duplicate index: partial hash + stat (mtime, inode) untuk validasi
+        hash_columns = {row[1] for row in cursor.execute('PRAGMA table_info(file_hashes)')}
+        for column, column_type in (('partial_hash', 'TEXT'), ('mtime_ns', 'INTEGER'),
+                                    ('inode', 'INTEGER')):
+            if column not in hash_columns:
+                cursor.execute(f'ALTER TABLE file_hashes ADD COLUMN {column} {column_type}')
+        
+        # Encrypt-on-download: ukuran & hash plaintext (dihitung saat download)
+        encryption_columns = {row[1] for row in cursor.execute('PRAGMA table_info(encryption_passwords)')}
+        for column, column_type in (('file_size', 'INTEGER'), ('md5_hash', 'TEXT'),
+                                    ('sha256_hash', 'TEXT')):
+            if column not in encryption_columns:
+                cursor.execute(f'ALTER TABLE encryption_passwords ADD COLUMN {column} {column_type}')
+        
+        # Hash isi file yang di-scan (cache hasil scan per konten)
+        scan_columns = {row[1] for row in cursor.execute('PRAGMA table_info(virus_scan_results)')}
+        if 'sha256_hash' not in scan_columns:
+            cursor.execute('ALTER TABLE virus_scan_results ADD COLUMN sha256_hash TEXT')
+        
+        # Index versi lama di kolom TEXT digantikan index di kolom *_ms
+        for index in ('idx_batch_downloads_user', 'idx_history_user_time',
+                      'idx_scan_user_time', 'idx_schedules_user_active',
+                      'idx_queue_user_order'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        
+        # Index untuk keyset pagination per user. id (rowid) ikut tersimpan
+        # di setiap entry index, jadi cursor (waktu, id) tetap berupa index seek
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_history_user_start_ms
+            ON download_history (user_id, start_time_ms)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_scan_user_scan_ms
+            ON virus_scan_results (user_id, scan_time_ms)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_batch_downloads_user_ms
+            ON batch_downloads (user_id, created_time_ms)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_schedules_user_active_ms
+            ON scheduled_downloads (user_id, scheduled_time_ms)
+            WHERE status IN ('pending', 'executing')
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_schedules_pending_ms
+            ON scheduled_downloads (scheduled_time_ms)
+            WHERE status = 'pending'
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_queue_user_order_ms
+            ON download_queue (user_id, priority DESC, added_time_ms)
+        ''')
+        # Item yang belum selesai, untuk restore queue saat startup
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_queue_open
+            ON download_queue (id)
+            WHERE status IN ('pending', 'paused', 'downloading')
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_resume_journal_updated_ms
+            ON resume_journal (updated_time_ms)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_file_hashes_md5_ms
+            ON file_hashes (md5_hash, created_time_ms)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_file_hashes_size
+            ON file_hashes (file_size)
+        ''')
+        
+        self._init_search_index(cursor)
+        
         conn.commit()
         conn.close()
         logger.info("Database initialized successfully")
     
+    def _init_time_columns(self, cursor):
+        """
+        Tambahkan kolom INTEGER epoch ms di samping kolom waktu TEXT
+        
+        Kolom baru di-backfill dari kolom TEXT sekali saat ditambahkan.
+        Setelah itu semua writer mengisi kedua kolom, jadi API berbasis
+        ISO string tetap jalan.
+        """
+        for table, time_columns in self.TIME_COLUMNS.items():
+            existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+            
+            for column in time_columns:
+                ms_column = f'{column}_ms'
+                if ms_column in existing:
+                    continue
+                
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {ms_column} INTEGER')
+                cursor.execute(f'''
+                    UPDATE {table}
+                    SET {ms_column} = {SQL_ISO_TO_MS.format(column=column)}
+                    WHERE {column} IS NOT NULL
+                ''')
+    
+    def _init_search_index(self, cursor):
+        """Initialize FTS5 index untuk download history (filename, url, host)"""
+        # Kolom host untuk search per domain (database lama di-backfill)
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(download_history)')]
+        needs_rebuild = False
+        
+        if 'host' not in columns:
+            cursor.execute('ALTER TABLE download_history ADD COLUMN host TEXT')
+            rows = cursor.execute('SELECT id, url FROM download_history').fetchall()
+            cursor.executemany(
+                'UPDATE download_history SET host = ? WHERE id = ?',
+                [(self._extract_host(url), row_id) for row_id, url in rows]
+            )
+            needs_rebuild = True
+        
+        # Index lama tanpa kolom user_id: buat ulang (trigger ikut diganti)
+        fts_columns = [row[1] for row in cursor.execute('PRAGMA table_info(download_history_fts)')]
+        if fts_columns and 'user_id' not in fts_columns:
+            for trigger in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS download_history_fts_{trigger}')
+            cursor.execute('DROP TABLE download_history_fts')
+        
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'download_history_fts'")
+        if not cursor.fetchone():
+            # user_id UNINDEXED: filter per user di dalam query FTS (sebelum join & sort rank)
+            cursor.execute('''
+                CREATE VIRTUAL TABLE download_history_fts USING fts5(
+                    filename, url, host, user_id UNINDEXED,
+                    content='download_history',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+            ''')
+            # Filename paling relevan, lalu host, lalu url
+            cursor.execute('''
+                INSERT INTO download_history_fts (download_history_fts, rank)
+                VALUES ('rank', 'bm25(10.0, 2.0, 5.0)')
+            ''')
+            needs_rebuild = True
+        
+        # Triggers untuk sync index dengan download_history
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS download_history_fts_insert
+            AFTER INSERT ON download_history BEGIN
+                INSERT INTO download_history_fts (rowid, filename, url, host, user_id)
+                VALUES (new.id, new.filename, new.url, new.host, new.user_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS download_history_fts_delete
+            AFTER DELETE ON download_history BEGIN
+                INSERT INTO download_history_fts (download_history_fts, rowid, filename, url, host, user_id)
+                VALUES ('delete', old.id, old.filename, old.url, old.host, old.user_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS download_history_fts_update
+            AFTER UPDATE OF filename, url, host, user_id ON download_history BEGIN
+                INSERT INTO download_history_fts (download_history_fts, rowid, filename, url, host, user_id)
+                VALUES ('delete', old.id, old.filename, old.url, old.host, old.user_id);
+                INSERT INTO download_history_fts (rowid, filename, url, host, user_id)
+                VALUES (new.id, new.filename, new.url, new.host, new.user_id);
+            END
+        ''')
+        
+        if needs_rebuild:
+            cursor.execute("INSERT INTO download_history_fts (download_history_fts) VALUES ('rebuild')")
+    
+    @staticmethod
+    def _extract_host(url: str) -> str:
+        """Ambil hostname dari URL (tanpa www.)"""
+        try:
+            host = urlparse(url or '').hostname or ''
+        except ValueError:
+            return ''
+        return host[4:] if host.startswith('www.') else host
+    
+    @staticmethod
+    def _build_fts_query(query: str) -> str:
+        """Ubah input user menjadi FTS5 query aman (semua term, prefix match)"""
+        terms = re.findall(r'\w+', query.lower())
+        return ' '.join(f'"{term}"*' for term in terms)
+    
+    # ===== KEYSET PAGINATION =====
+    
+    @staticmethod
+    def _encode_cursor(values) -> str:
+        """Encode nilai sort key row terakhir menjadi cursor (muat di callback_data)"""
+        return json.dumps(list(values), separators=(',', ':'))
+    
+    @staticmethod
+    def _decode_cursor(cursor: str, size: int) -> list:
+        """Decode cursor, raise ValueError jika formatnya tidak valid"""
+        try:
+            values = json.loads(cursor)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        
+        return values
+    
+    def _keyset_page(self, columns: str, table: str, where: str, params: tuple,
+                     time_column: str, cursor: Optional[str], limit: int,
+                     descending: bool = True) -> Tuple[List[tuple], Optional[str]]:
+        """
+        Ambil satu halaman dengan cursor (time_column, id)
+        
+        Kondisi cursor berupa row-value comparison pada index (user_id, waktu),
+        jadi biaya per halaman sama berapapun kedalamannya (tanpa OFFSET).
+        
+        Args:
+            columns: Kolom yang di-SELECT
+            table: Nama tabel
+            where: Kondisi filter (harus cocok dengan prefix index)
+            params: Parameter untuk kondisi filter
+            time_column: Kolom waktu untuk urutan
+            cursor: Cursor dari halaman sebelumnya (None = halaman pertama)
+            limit: Jumlah row per halaman
+            descending: True = terbaru dulu
+            
+        Returns:
+            Tuple (rows, next_cursor). next_cursor None jika tidak ada halaman lagi
+        """
+        direction = 'DESC' if descending else 'ASC'
+        params = list(params)
+        
+        if cursor:
+            where += f" AND ({time_column}, id) {'<' if descending else '>'} (?, ?)"
+            params.extend(self._decode_cursor(cursor, 2))
+        
+        conn = self._get_connection()
+        cursor_db = conn.cursor()
+        
+        # Ambil satu row ekstra untuk tahu apakah ada halaman berikutnya
+        cursor_db.execute(f'''
+            SELECT {columns}, {time_column}, id
+            FROM {table}
+            WHERE {where}
+            ORDER BY {time_column} {direction}, id {direction}
+            LIMIT ?
+        ''', (*params, limit + 1))
+        
+        rows = cursor_db.fetchall()
+        conn.close()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_cursor(rows[-1][-2:])
+        
+        return [row[:-2] for row in rows], next_cursor
+    
     # ===== USER PREFERENCES =====
     
     def get_user_preference(self, user_id: int) -> Optional[Dict]:
         """Get user preference"""
+        cached = self.cache.get('preference', user_id)
+        if cached is not SettingsCache.MISSING:
+            return dict(cached) if cached else None
+        
         conn = self._get_connection()
         cursor = conn.cursor()
         
@@ -250,15 +580,18 @@ class Database:
         row = cursor.fetchone()
         conn.close()
         
+        pref = None
         if row:
-            return {
+            pref = {
                 'user_id': row[0],
                 'custom_download_path': row[1],
                 'use_custom_path': bool(row[2]),
                 'created_at': row[3],
                 'updated_at': row[4]
             }
-        return None
+        
+        self.cache.set('preference', user_id, pref)
+        return dict(pref) if pref else None
     
     def set_user_download_path(self, user_id: int, path: str, use_custom: bool = True):
         """Set custom download path for user"""
@@ -283,6 +616,7 @@ class Database:
         
         conn.commit()
         conn.close()
+        self.cache.invalidate(user_id, 'preference', 'download_path')
         logger.info(f"User {user_id} download path updated: {path}")
     
     def toggle_custom_path(self, user_id: int, use_custom: bool):
@@ -299,17 +633,28 @@ class Database:
         
         conn.commit()
         conn.close()
+        self.cache.invalidate(user_id, 'preference', 'download_path')
     
     def get_download_path(self, user_id: int, default_path: str) -> str:
         """Get download path untuk user (custom atau default)"""
-        pref = self.get_user_preference(user_id)
+        custom_path = self.cache.get('download_path', user_id)
         
-        if pref and pref['use_custom_path'] and pref['custom_download_path']:
-            # Pastikan folder exist
-            os.makedirs(pref['custom_download_path'], exist_ok=True)
-            return pref['custom_download_path']
+        if custom_path is SettingsCache.MISSING:
+            pref = self.get_user_preference(user_id)
+            custom_path = None
+            
+            if pref and pref['use_custom_path'] and pref['custom_download_path']:
+                custom_path = pref['custom_download_path']
+                # Pastikan folder exist (sekali per cache entry)
+                os.makedirs(custom_path, exist_ok=True)
+            
+            self.cache.set('download_path', user_id, custom_path)
         
-        return default_path
+        return custom_path or default_path
+    
+    def get_cache_stats(self) -> Dict:
+        """Get hit/miss counters dari settings cache"""
+        return self.cache.get_stats()
     
     # ===== DOWNLOAD HISTORY =====
     
@@ -318,13 +663,14 @@ class Database:
         """Add download history"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        now = datetime.now().isoformat()
+        now, now_ms = now_pair()
         
         cursor.execute('''
             INSERT INTO download_history 
-            (user_id, download_id, url, filename, filepath, status, start_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, download_id, url, filename, filepath, status, now))
+            (user_id, download_id, url, filename, filepath, status, start_time, start_time_ms, host)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, download_id, url, filename, filepath, status, now, now_ms,
+              self._extract_host(url)))
         
         conn.commit()
         conn.close()
@@ -335,36 +681,95 @@ class Database:
         """Update download history"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        now = datetime.now().isoformat()
+        now, now_ms = now_pair()
         
         if file_size is not None:
             cursor.execute('''
                 UPDATE download_history
-                SET status = ?, file_size = ?, end_time = ?, error_message = ?
+                SET status = ?, file_size = ?, end_time = ?, end_time_ms = ?, error_message = ?
                 WHERE download_id = ?
-            ''', (status, file_size, now, error_message, download_id))
+            ''', (status, file_size, now, now_ms, error_message, download_id))
         else:
             cursor.execute('''
                 UPDATE download_history
-                SET status = ?, end_time = ?, error_message = ?
+                SET status = ?, end_time = ?, end_time_ms = ?, error_message = ?
                 WHERE download_id = ?
-            ''', (status, now, error_message, download_id))
+            ''', (status, now, now_ms, error_message, download_id))
         
         conn.commit()
         conn.close()
     
     def get_download_history(self, user_id: int, limit: int = 10) -> List[Dict]:
         """Get download history for user"""
+        return self.get_download_history_page(user_id, limit=limit)['items']
+    
+    def get_download_history_page(self, user_id: int, limit: int = 10,
+                                  cursor: Optional[str] = None) -> Dict:
+        """
+        Get satu halaman download history (terbaru dulu)
+        
+        Args:
+            user_id: User ID
+            limit: Jumlah item per halaman
+            cursor: next_cursor dari halaman sebelumnya (None = halaman pertama)
+            
+        Returns:
+            Dict dengan 'items' dan 'next_cursor'
+        """
+        rows, next_cursor = self._keyset_page(
+            'download_id, url, filename, status, file_size, start_time, end_time, '
+            'start_time_ms, end_time_ms',
+            'download_history', 'user_id = ?', (user_id,),
+            'start_time_ms', cursor, limit
+        )
+        
+        items = [
+            {
+                'download_id': row[0],
+                'url': row[1],
+                'filename': row[2],
+                'status': row[3],
+                'file_size': row[4],
+                'start_time': row[5],
+                'end_time': row[6],
+                'start_time_ms': row[7],
+                'end_time_ms': row[8]
+            }
+            for row in rows
+        ]
+        
+        return {'items': items, 'next_cursor': next_cursor}
+    
+    def search_history(self, user_id: int, query: str, limit: int = 10,
+                       offset: int = 0) -> List[Dict]:
+        """
+        Full-text search di download history (filename, url, host)
+        
+        Args:
+            user_id: User ID
+            query: Kata kunci (semua kata harus cocok, prefix match)
+            limit: Jumlah hasil per halaman
+            offset: Offset halaman
+            
+        Returns:
+            List hasil, diurutkan berdasarkan relevansi
+        """
+        fts_query = self._build_fts_query(query)
+        if not fts_query:
+            return []
+        
         conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT download_id, url, filename, status, file_size, start_time, end_time
-            FROM download_history
-            WHERE user_id = ?
-            ORDER BY start_time DESC
-            LIMIT ?
-        ''', (user_id, limit))
+            SELECT h.download_id, h.url, h.filename, h.filepath, h.status,
+                   h.file_size, h.start_time, h.end_time, h.host, h.start_time_ms
+            FROM download_history_fts f
+            JOIN download_history h ON h.id = f.rowid
+            WHERE download_history_fts MATCH ? AND f.user_id = ?
+            ORDER BY f.rank
+            LIMIT ? OFFSET ?
+        ''', (fts_query, user_id, limit, offset))
         
         rows = cursor.fetchall()
         conn.close()
@@ -374,10 +779,13 @@ class Database:
                 'download_id': row[0],
                 'url': row[1],
                 'filename': row[2],
-                'status': row[3],
-                'file_size': row[4],
-                'start_time': row[5],
-                'end_time': row[6]
+                'filepath': row[3],
+                'status': row[4],
+                'file_size': row[5],
+                'start_time': row[6],
+                'end_time': row[7],
+                'host': row[8],
+                'start_time_ms': row[9]
             }
             for row in rows
         ]
@@ -389,13 +797,15 @@ class Database:
         """Add scheduled download"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        now = datetime.now().isoformat()
+        now, now_ms = now_pair()
         
         cursor.execute('''
             INSERT INTO scheduled_downloads
-            (user_id, schedule_id, url, scheduled_time, created_time, status, download_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, schedule_id, url, scheduled_time, now, 'pending', download_path))
+            (user_id, schedule_id, url, scheduled_time, scheduled_time_ms,
+             created_time, created_time_ms, status, download_path)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, schedule_id, url, scheduled_time, to_epoch_ms(scheduled_time),
+              now, now_ms, 'pending', download_path))
         
         conn.commit()
         conn.close()
@@ -406,10 +816,10 @@ class Database:
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT schedule_id, user_id, url, scheduled_time, download_path
+            SELECT schedule_id, user_id, url, scheduled_time, download_path, scheduled_time_ms
             FROM scheduled_downloads
             WHERE status = 'pending'
-            ORDER BY scheduled_time ASC
+            ORDER BY scheduled_time_ms ASC
         ''')
         
         rows = cursor.fetchall()
@@ -421,7 +831,8 @@ class Database:
                 'user_id': row[1],
                 'url': row[2],
                 'scheduled_time': row[3],
-                'download_path': row[4]
+                'download_path': row[4],
+                'scheduled_time_ms': row[5]
             }
             for row in rows
         ]
@@ -431,20 +842,20 @@ class Database:
         """Update schedule status"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        now = datetime.now().isoformat()
+        now, now_ms = now_pair()
         
         if download_id:
             cursor.execute('''
                 UPDATE scheduled_downloads
-                SET status = ?, download_id = ?, executed_time = ?
+                SET status = ?, download_id = ?, executed_time = ?, executed_time_ms = ?
                 WHERE schedule_id = ?
-            ''', (status, download_id, now, schedule_id))
+            ''', (status, download_id, now, now_ms, schedule_id))
         else:
             cursor.execute('''
                 UPDATE scheduled_downloads
-                SET status = ?, executed_time = ?
+                SET status = ?, executed_time = ?, executed_time_ms = ?
                 WHERE schedule_id = ?
-            ''', (status, now, schedule_id))
+            ''', (status, now, now_ms, schedule_id))
         
         conn.commit()
         conn.close()
@@ -455,10 +866,10 @@ class Database:
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT schedule_id, url, scheduled_time, status, download_id
+            SELECT schedule_id, url, scheduled_time, status, download_id, scheduled_time_ms
             FROM scheduled_downloads
             WHERE user_id = ? AND status IN ('pending', 'executing')
-            ORDER BY scheduled_time ASC
+            ORDER BY scheduled_time_ms ASC, id ASC
         ''', (user_id,))
         
         rows = cursor.fetchall()
@@ -470,118 +881,203 @@ class Database:
                 'url': row[1],
                 'scheduled_time': row[2],
                 'status': row[3],
-                'download_id': row[4]
+                'download_id': row[4],
+                'scheduled_time_ms': row[5]
             }
             for row in rows
         ]
+    
+    def get_user_schedules_page(self, user_id: int, limit: int = 10,
+                                cursor: Optional[str] = None) -> Dict:
+        """
+        Get satu halaman jadwal aktif user (jadwal terdekat dulu)
+        
+        Returns:
+            Dict dengan 'items' dan 'next_cursor'
+        """
+        rows, next_cursor = self._keyset_page(
+            'schedule_id, url, scheduled_time, status, download_id, scheduled_time_ms',
+            'scheduled_downloads', "user_id = ? AND status IN ('pending', 'executing')",
+            (user_id,), 'scheduled_time_ms', cursor, limit, descending=False
+        )
+        
+        items = [
+            {
+                'schedule_id': row[0],
+                'url': row[1],
+                'scheduled_time': row[2],
+                'status': row[3],
+                'download_id': row[4],
+                'scheduled_time_ms': row[5]
+            }
+            for row in rows
+        ]
+        
+        return {'items': items, 'next_cursor': next_cursor}
 
-def add_batch_download(self, user_id: int, batch_id: str, total_urls: int):
-    """Create new batch download"""
-    conn = self._get_connection()
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
-    
-    cursor.execute('''
-        INSERT INTO batch_downloads
-        (user_id, batch_id, total_urls, status, created_time)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (user_id, batch_id, total_urls, 'processing', now))
-    
-    conn.commit()
-    conn.close()
-
-def add_batch_item(self, batch_id: str, url: str, download_id: str):
-    """Add item to batch"""
-    conn = self._get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO batch_download_items
-        (batch_id, url, download_id, status)
-        VALUES (?, ?, ?, ?)
-    ''', (batch_id, url, download_id, 'pending'))
-    
-    conn.commit()
-    conn.close()
-
-def update_batch_item_status(self, batch_id: str, download_id: str, 
-                             status: str, filename: Optional[str] = None,
-                             error_message: Optional[str] = None):
-    """Update batch item status"""
-    conn = self._get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        UPDATE batch_download_items
-        SET status = ?, filename = ?, error_message = ?
-        WHERE batch_id = ? AND download_id = ?
-    ''', (status, filename, error_message, batch_id, download_id))
-    
-    conn.commit()
-    conn.close()
-    
-    # Update batch progress
-    self._update_batch_progress(batch_id)
-
-def _update_batch_progress(self, batch_id: str):
-    """Update batch download progress"""
-    conn = self._get_connection()
-    cursor = conn.cursor()
-    
-    # Count completed and failed
-    cursor.execute('''
-        SELECT 
-            SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed,
-            SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed,
-            COUNT(*) as total
-        FROM batch_download_items
-        WHERE batch_id = ?
-    ''', (batch_id,))
-    
-    row = cursor.fetchone()
-    completed = row[0] or 0
-    failed = row[1] or 0
-    total = row[2]
-    
-    # Update batch
-    status = 'completed' if (completed + failed) == total else 'processing'
-    completed_time = datetime.now().isoformat() if status == 'completed' else None
-    
-    cursor.execute('''
-        UPDATE batch_downloads
-        SET completed_urls = ?, failed_urls = ?, status = ?, completed_time = ?
-        WHERE batch_id = ?
-    ''', (completed, failed, status, completed_time, batch_id))
-    
-    conn.commit()
-    conn.close()
-
-def get_batch_info(self, batch_id: str) -> Optional[Dict]:
-    """Get batch download info"""
-    conn = self._get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT batch_id, total_urls, completed_urls, failed_urls, status,
-               created_time, completed_time
-        FROM batch_downloads
-        WHERE batch_id = ?
-    ''', (batch_id,))
-    
-    row = cursor.fetchone()
-    
-    if row:
-        # Get items
+    # ===== BATCH DOWNLOADS =====
+    
+    def add_batch_download(self, user_id: int, batch_id: str, total_urls: int,
+                           items: Optional[List[Dict]] = None):
+        """
+        Create new batch download
+        
+        Jika items diberikan, batch dan semua item di-insert dalam satu transaction
+        (lihat add_batch_items untuk format item).
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        now, now_ms = now_pair()
+        
+        cursor.execute('''
+            INSERT INTO batch_downloads
+            (user_id, batch_id, total_urls, status, created_time, created_time_ms)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, batch_id, total_urls, 'processing', now, now_ms))
+        
+        if items:
+            self._insert_batch_items(cursor, batch_id, items)
+        
+        conn.commit()
+        conn.close()
+    
+    def add_batch_items(self, batch_id: str, items: List[Dict]) -> int:
+        """
+        Add banyak item ke batch dalam satu transaction (executemany)
+        
+        Args:
+            batch_id: Batch ID
+            items: List of dict dengan key 'url', 'download_id' dan optional
+                   'status' (default 'pending'), 'filename', 'error_message'
+            
+        Returns:
+            Jumlah item yang di-insert
+        """
+        if not items:
+            return 0
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        self._insert_batch_items(cursor, batch_id, items)
+        
+        conn.commit()
+        conn.close()
+        return len(items)
+    
+    def add_batch_item(self, batch_id: str, url: str, download_id: str,
+                       status: str = 'pending', error_message: Optional[str] = None):
+        """Add item to batch"""
+        self.add_batch_items(batch_id, [{
+            'url': url,
+            'download_id': download_id,
+            'status': status,
+            'error_message': error_message
+        }])
+    
+    def _insert_batch_items(self, cursor, batch_id: str, items: List[Dict]):
+        """Insert batch items dan update counter batch (tanpa commit)"""
+        cursor.executemany('''
+            INSERT INTO batch_download_items
+            (batch_id, url, download_id, status, filename, error_message)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (batch_id, item['url'], item['download_id'], item.get('status', 'pending'),
+             item.get('filename'), item.get('error_message'))
+            for item in items
+        ])
+        
+        # Item yang langsung masuk dengan status final ikut dihitung
+        completed = sum(1 for item in items if item.get('status') == 'completed')
+        failed = sum(1 for item in items if item.get('status') == 'failed')
+        if completed or failed:
+            self._apply_batch_delta(cursor, batch_id, completed, failed)
+    
+    def update_batch_item_status(self, batch_id: str, download_id: str, 
+                                 status: str, filename: Optional[str] = None,
+                                 error_message: Optional[str] = None):
+        """Update batch item status (counter batch di-update secara incremental)"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
         cursor.execute('''
-            SELECT url, status, filename, error_message
-            FROM batch_download_items
+            SELECT id, status FROM batch_download_items
+            WHERE batch_id = ? AND download_id = ?
+        ''', (batch_id, download_id))
+        
+        row = cursor.fetchone()
+        if not row:
+            conn.close()
+            return
+        
+        item_id, old_status = row
+        
+        cursor.execute('''
+            UPDATE batch_download_items
+            SET status = ?, filename = ?, error_message = ?
+            WHERE id = ?
+        ''', (status, filename, error_message, item_id))
+        
+        # Hitung perubahan counter dari transisi status lama -> baru
+        completed_delta = (status == 'completed') - (old_status == 'completed')
+        failed_delta = (status == 'failed') - (old_status == 'failed')
+        if completed_delta or failed_delta:
+            self._apply_batch_delta(cursor, batch_id, completed_delta, failed_delta)
+        
+        conn.commit()
+        conn.close()
+    
+    def _apply_batch_delta(self, cursor, batch_id: str, completed_delta: int, failed_delta: int):
+        """Update completed/failed counter batch secara O(1) (tanpa commit)"""
+        now, now_ms = now_pair()
+        
+        # Kolom di sisi kanan SET memakai nilai lama, jadi delta ditambahkan ulang
+        cursor.execute('''
+            UPDATE batch_downloads
+            SET completed_urls = completed_urls + ?,
+                failed_urls = failed_urls + ?,
+                status = CASE
+                    WHEN completed_urls + ? + failed_urls + ? >= total_urls THEN 'completed'
+                    ELSE 'processing'
+                END,
+                completed_time = CASE
+                    WHEN completed_urls + ? + failed_urls + ? >= total_urls THEN COALESCE(completed_time, ?)
+                    ELSE NULL
+                END,
+                completed_time_ms = CASE
+                    WHEN completed_urls + ? + failed_urls + ? >= total_urls THEN COALESCE(completed_time_ms, ?)
+                    ELSE NULL
+                END
             WHERE batch_id = ?
-            ORDER BY id ASC
+        ''', (completed_delta, failed_delta,
+              completed_delta, failed_delta,
+              completed_delta, failed_delta, now,
+              completed_delta, failed_delta, now_ms,
+              batch_id))
+    
+    def get_batch_info(self, batch_id: str) -> Optional[Dict]:
+        """Get batch download info"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT b.batch_id, b.total_urls, b.completed_urls, b.failed_urls, b.status,
+                   b.created_time, b.completed_time,
+                   i.id, i.url, i.status, i.filename, i.error_message,
+                   b.created_time_ms, b.completed_time_ms
+            FROM batch_downloads b
+            LEFT JOIN batch_download_items i ON i.batch_id = b.batch_id
+            WHERE b.batch_id = ?
+            ORDER BY i.id ASC
         ''', (batch_id,))
         
-        items = cursor.fetchall()
+        rows = cursor.fetchall()
         conn.close()
         
+        if not rows:
+            return None
+        
+        row = rows[0]
         return {
             'batch_id': row[0],
             'total_urls': row[1],
@@ -590,154 +1086,169 @@ def get_batch_info(self, batch_id: str) -> Optional[Dict]:
             'status': row[4],
             'created_time': row[5],
             'completed_time': row[6],
+            'created_time_ms': row[12],
+            'completed_time_ms': row[13],
             'items': [
                 {
-                    'url': item[0],
-                    'status': item[1],
-                    'filename': item[2],
-                    'error_message': item[3]
+                    'url': item[8],
+                    'status': item[9],
+                    'filename': item[10],
+                    'error_message': item[11]
                 }
-                for item in items
+                for item in rows
+                if item[7] is not None
             ]
         }
     
-    conn.close()
-    return None
-
-def get_user_batches(self, user_id: int, limit: int = 10) -> List[Dict]:
-    """Get user's batch downloads"""
-    conn = self._get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT batch_id, total_urls, completed_urls, failed_urls, status, created_time
-        FROM batch_downloads
-        WHERE user_id = ?
-        ORDER BY created_time DESC
-        LIMIT ?
-    ''', (user_id, limit))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [
-        {
-            'batch_id': row[0],
-            'total_urls': row[1],
-            'completed_urls': row[2],
-            'failed_urls': row[3],
-            'status': row[4],
-            'created_time': row[5]
-        }
-        for row in rows
-    ]
-
-# ===== BANDWIDTH SETTINGS =====
+    def get_user_batches(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """Get user's batch downloads"""
+        return self.get_user_batches_page(user_id, limit=limit)['items']
+    
+    def get_user_batches_page(self, user_id: int, limit: int = 10,
+                              cursor: Optional[str] = None) -> Dict:
+        """
+        Get satu halaman batch downloads user (terbaru dulu)
+        
+        Returns:
+            Dict dengan 'items' dan 'next_cursor'
+        """
+        rows, next_cursor = self._keyset_page(
+            'batch_id, total_urls, completed_urls, failed_urls, status, created_time, '
+            'created_time_ms',
+            'batch_downloads', 'user_id = ?', (user_id,),
+            'created_time_ms', cursor, limit
+        )
+        
+        items = [
+            {
+                'batch_id': row[0],
+                'total_urls': row[1],
+                'completed_urls': row[2],
+                'failed_urls': row[3],
+                'status': row[4],
+                'created_time': row[5],
+                'created_time_ms': row[6]
+            }
+            for row in rows
+        ]
+        
+        return {'items': items, 'next_cursor': next_cursor}
 
-def get_bandwidth_settings(self, user_id: int) -> Optional[Dict]:
-    """Get bandwidth settings for user"""
-    conn = self._get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT max_speed_kbps, schedule_enabled, schedule_start_time,
-               schedule_end_time, schedule_speed_kbps
-        FROM bandwidth_settings
-        WHERE user_id = ?
-    ''', (user_id,))
-    
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        return {
-            'max_speed_kbps': row[0],
-            'schedule_enabled': bool(row[1]),
-            'schedule_start_time': row[2],
-            'schedule_end_time': row[3],
-            'schedule_speed_kbps': row[4]
-        }
-    return None
+    # ===== BANDWIDTH SETTINGS =====
 
-def set_bandwidth_limit(self, user_id: int, max_speed_kbps: int):
-    """Set bandwidth limit for user"""
-    conn = self._get_connection()
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
-    
-    # Check if exists
-    existing = self.get_bandwidth_settings(user_id)
-    
-    if existing:
+    def get_bandwidth_settings(self, user_id: int) -> Optional[Dict]:
+        """Get bandwidth settings for user"""
+        cached = self.cache.get('bandwidth', user_id)
+        if cached is not SettingsCache.MISSING:
+            return dict(cached) if cached else None
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
         cursor.execute('''
-            UPDATE bandwidth_settings
-            SET max_speed_kbps = ?, updated_at = ?
+            SELECT max_speed_kbps, schedule_enabled, schedule_start_time,
+                   schedule_end_time, schedule_speed_kbps
+            FROM bandwidth_settings
             WHERE user_id = ?
-        ''', (max_speed_kbps, now, user_id))
-    else:
-        cursor.execute('''
-            INSERT INTO bandwidth_settings (user_id, max_speed_kbps, updated_at)
-            VALUES (?, ?, ?)
-        ''', (user_id, max_speed_kbps, now))
-    
-    conn.commit()
-    conn.close()
+        ''', (user_id,))
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        settings = None
+        if row:
+            settings = {
+                'max_speed_kbps': row[0],
+                'schedule_enabled': bool(row[1]),
+                'schedule_start_time': row[2],
+                'schedule_end_time': row[3],
+                'schedule_speed_kbps': row[4]
+            }
+        
+        self.cache.set('bandwidth', user_id, settings)
+        return dict(settings) if settings else None
 
-def set_bandwidth_schedule(self, user_id: int, enabled: bool, 
-                          start_time: str, end_time: str, speed_kbps: int):
-    """Set bandwidth schedule for user"""
-    conn = self._get_connection()
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
-    
-    # Check if exists
-    existing = self.get_bandwidth_settings(user_id)
-    
-    if existing:
-        cursor.execute('''
-            UPDATE bandwidth_settings
-            SET schedule_enabled = ?, schedule_start_time = ?, 
-                schedule_end_time = ?, schedule_speed_kbps = ?, updated_at = ?
-            WHERE user_id = ?
-        ''', (int(enabled), start_time, end_time, speed_kbps, now, user_id))
-    else:
-        cursor.execute('''
-            INSERT INTO bandwidth_settings 
-            (user_id, schedule_enabled, schedule_start_time, schedule_end_time,
-             schedule_speed_kbps, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, int(enabled), start_time, end_time, speed_kbps, now))
-    
-    conn.commit()
-    conn.close()
+    def set_bandwidth_limit(self, user_id: int, max_speed_kbps: int):
+        """Set bandwidth limit for user"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        now = datetime.now().isoformat()
+        
+        # Check if exists
+        existing = self.get_bandwidth_settings(user_id)
+        
+        if existing:
+            cursor.execute('''
+                UPDATE bandwidth_settings
+                SET max_speed_kbps = ?, updated_at = ?
+                WHERE user_id = ?
+            ''', (max_speed_kbps, now, user_id))
+        else:
+            cursor.execute('''
+                INSERT INTO bandwidth_settings (user_id, max_speed_kbps, updated_at)
+                VALUES (?, ?, ?)
+            ''', (user_id, max_speed_kbps, now))
+        
+        conn.commit()
+        conn.close()
+        self.cache.invalidate(user_id, 'bandwidth')
 
-def get_current_bandwidth_limit(self, user_id: int) -> int:
-    """Get current bandwidth limit based on time and settings"""
-    from datetime import datetime
-    
-    settings = self.get_bandwidth_settings(user_id)
-    
-    if not settings:
-        return 0  # No limit
-    
-    # Check if schedule is enabled
-    if settings['schedule_enabled'] and settings['schedule_start_time'] and settings['schedule_end_time']:
-        now = datetime.now().time()
-        start = datetime.strptime(settings['schedule_start_time'], '%H:%M').time()
-        end = datetime.strptime(settings['schedule_end_time'], '%H:%M').time()
-        
-        # Check if current time is in scheduled range
-        if start <= end:
-            # Normal range (e.g., 09:00 - 17:00)
-            if start <= now <= end:
-                return settings['schedule_speed_kbps'] or 0
+    def set_bandwidth_schedule(self, user_id: int, enabled: bool, 
+                              start_time: str, end_time: str, speed_kbps: int):
+        """Set bandwidth schedule for user"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        now = datetime.now().isoformat()
+        
+        # Check if exists
+        existing = self.get_bandwidth_settings(user_id)
+        
+        if existing:
+            cursor.execute('''
+                UPDATE bandwidth_settings
+                SET schedule_enabled = ?, schedule_start_time = ?, 
+                    schedule_end_time = ?, schedule_speed_kbps = ?, updated_at = ?
+                WHERE user_id = ?
+            ''', (int(enabled), start_time, end_time, speed_kbps, now, user_id))
         else:
-            # Overnight range (e.g., 22:00 - 06:00)
-            if now >= start or now <= end:
-                return settings['schedule_speed_kbps'] or 0
-    
-    # Return default max speed
-    return settings['max_speed_kbps'] or 0
+            cursor.execute('''
+                INSERT INTO bandwidth_settings 
+                (user_id, schedule_enabled, schedule_start_time, schedule_end_time,
+                 schedule_speed_kbps, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, int(enabled), start_time, end_time, speed_kbps, now))
+        
+        conn.commit()
+        conn.close()
+        self.cache.invalidate(user_id, 'bandwidth')
+
+    def get_current_bandwidth_limit(self, user_id: int) -> int:
+        """Get current bandwidth limit based on time and settings"""
+        from datetime import datetime
+        
+        settings = self.get_bandwidth_settings(user_id)
+        
+        if not settings:
+            return 0  # No limit
+        
+        # Check if schedule is enabled
+        if settings['schedule_enabled'] and settings['schedule_start_time'] and settings['schedule_end_time']:
+            now = datetime.now().time()
+            start = datetime.strptime(settings['schedule_start_time'], '%H:%M').time()
+            end = datetime.strptime(settings['schedule_end_time'], '%H:%M').time()
+        
+            # Check if current time is in scheduled range
+            if start <= end:
+                # Normal range (e.g., 09:00 - 17:00)
+                if start <= now <= end:
+                    return settings['schedule_speed_kbps'] or 0
+            else:
+                # Overnight range (e.g., 22:00 - 06:00)
+                if now >= start or now <= end:
+                    return settings['schedule_speed_kbps'] or 0
+        
+        # Return default max speed
+        return settings['max_speed_kbps'] or 0
 
     # ===== FILE HASHES (DUPLICATE DETECTION) =====
     
@@ -746,13 +1257,14 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
         """Add file hash to database"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        now = datetime.now().isoformat()
+        now, now_ms = now_pair()
         
         cursor.execute('''
             INSERT OR REPLACE INTO file_hashes
-            (user_id, filename, filepath, file_size, md5_hash, sha256_hash, created_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, filename, filepath, file_size, md5_hash, sha256_hash, now))
+            (user_id, filename, filepath, file_size, md5_hash, sha256_hash,
+             created_time, created_time_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, filename, filepath, file_size, md5_hash, sha256_hash, now, now_ms))
         
         conn.commit()
         conn.close()
@@ -767,7 +1279,7 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
                 SELECT filename, filepath, file_size, created_time
                 FROM file_hashes
                 WHERE md5_hash = ? AND user_id = ?
-                ORDER BY created_time DESC
+                ORDER BY created_time_ms DESC
                 LIMIT 1
             ''', (md5_hash, user_id))
         else:
@@ -775,7 +1287,7 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
                 SELECT filename, filepath, file_size, created_time
                 FROM file_hashes
                 WHERE md5_hash = ?
-                ORDER BY created_time DESC
+                ORDER BY created_time_ms DESC
                 LIMIT 1
             ''', (md5_hash,))
         
@@ -800,7 +1312,7 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
             SELECT filename, filepath, file_size, md5_hash, created_time
             FROM file_hashes
             WHERE user_id = ?
-            ORDER BY created_time DESC
+            ORDER BY created_time_ms DESC
         ''', (user_id,))
         
         rows = cursor.fetchall()
@@ -817,6 +1329,79 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
             for row in rows
         ]
     
+    _HASH_CACHE_COLUMNS = (
+        'filepath', 'user_id', 'filename', 'file_size', 'mtime_ns', 'inode',
+        'partial_hash', 'md5_hash', 'sha256_hash'
+    )
+    
+    def load_file_hash_cache(self) -> Dict[str, Dict]:
+        """
+        Ambil semua hash yang tersimpan untuk duplicate index (satu query)
+        
+        Returns:
+            Dict {filepath: row}; row valid hanya jika (file_size, mtime_ns,
+            inode) masih sama dengan stat file sekarang
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT {', '.join(self._HASH_CACHE_COLUMNS)}
+            FROM file_hashes
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {row[0]: dict(zip(self._HASH_CACHE_COLUMNS, row)) for row in rows}
+    
+    def save_file_hash_cache(self, entries: List[Dict], removed: Optional[List[str]] = None):
+        """
+        Simpan hasil duplicate index dalam satu transaction (upsert + delete)
+        
+        user_id dan created_time row yang sudah ada tidak ditimpa.
+        
+        Args:
+            entries: Dict dengan kolom _HASH_CACHE_COLUMNS
+            removed: filepath yang sudah tidak ada / berubah tanpa hash baru
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        now, now_ms = now_pair()
+        
+        try:
+            if entries:
+                cursor.executemany('''
+                    INSERT INTO file_hashes
+                    (user_id, filename, filepath, file_size, mtime_ns, inode,
+                     partial_hash, md5_hash, sha256_hash, created_time, created_time_ms)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(filepath) DO UPDATE SET
+                        user_id = COALESCE(file_hashes.user_id, excluded.user_id),
+                        filename = excluded.filename,
+                        file_size = excluded.file_size,
+                        mtime_ns = excluded.mtime_ns,
+                        inode = excluded.inode,
+                        partial_hash = excluded.partial_hash,
+                        md5_hash = excluded.md5_hash,
+                        sha256_hash = excluded.sha256_hash
+                ''', [
+                    (entry.get('user_id'), entry['filename'], entry['filepath'],
+                     entry['file_size'], entry['mtime_ns'], entry['inode'],
+                     entry.get('partial_hash'), entry.get('md5_hash'),
+                     entry.get('sha256_hash'), now, now_ms)
+                    for entry in entries
+                ])
+            
+            if removed:
+                cursor.executemany(
+                    'DELETE FROM file_hashes WHERE filepath = ?',
+                    [(filepath,) for filepath in removed]
+                )
+            
+            conn.commit()
+        finally:
+            conn.close()
+    
     # ===== DOWNLOAD QUEUE =====
     
     def add_to_queue(self, user_id: int, queue_id: str, url: str, filename: str, 
@@ -824,14 +1409,14 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
         """Add item to download queue"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        now = datetime.now().isoformat()
+        now, now_ms = now_pair()
         
         try:
             cursor.execute('''
                 INSERT INTO download_queue
-                (queue_id, user_id, url, filename, priority, status, added_time)
-                VALUES (?, ?, ?, ?, ?, 'pending', ?)
-            ''', (queue_id, user_id, url, filename, priority, now))
+                (queue_id, user_id, url, filename, priority, status, added_time, added_time_ms)
+                VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)
+            ''', (queue_id, user_id, url, filename, priority, now, now_ms))
             
             conn.commit()
             conn.close()
@@ -846,20 +1431,20 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
         """Update queue item status"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        now = datetime.now().isoformat()
+        now, now_ms = now_pair()
         
         if status == 'downloading':
             cursor.execute('''
                 UPDATE download_queue
-                SET status = ?, download_id = ?, started_time = ?
+                SET status = ?, download_id = ?, started_time = ?, started_time_ms = ?
                 WHERE queue_id = ?
-            ''', (status, download_id, now, queue_id))
+            ''', (status, download_id, now, now_ms, queue_id))
         elif status in ['completed', 'failed', 'cancelled']:
             cursor.execute('''
                 UPDATE download_queue
-                SET status = ?, completed_time = ?, error_message = ?
+                SET status = ?, completed_time = ?, completed_time_ms = ?, error_message = ?
                 WHERE queue_id = ?
-            ''', (status, now, error_message, queue_id))
+            ''', (status, now, now_ms, error_message, queue_id))
         else:
             cursor.execute('''
                 UPDATE download_queue
@@ -892,7 +1477,8 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
         
         query = 'SELECT queue_id, user_id, url, filename, priority, status, download_id, ' \
                 'added_time, started_time, completed_time, error_message, file_size, ' \
-                'downloaded_size, progress FROM download_queue WHERE 1=1'
+                'downloaded_size, progress, added_time_ms, started_time_ms, completed_time_ms ' \
+                'FROM download_queue WHERE 1=1'
         params = []
         
         if user_id:
@@ -903,7 +1489,7 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
             query += ' AND status = ?'
             params.append(status)
         
-        query += ' ORDER BY priority DESC, added_time ASC'
+        query += ' ORDER BY priority DESC, added_time_ms ASC, id ASC'
         
         cursor.execute(query, params)
         rows = cursor.fetchall()
@@ -924,10 +1510,97 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
                 'error_message': row[10],
                 'file_size': row[11],
                 'downloaded_size': row[12],
-                'progress': row[13]
+                'progress': row[13],
+                'added_time_ms': row[14],
+                'started_time_ms': row[15],
+                'completed_time_ms': row[16]
+            }
+            for row in rows
+        ]
+    
+    def get_queue_items_page(self, user_id: int, limit: int = 10,
+                             cursor: Optional[str] = None) -> Dict:
+        """
+        Get satu halaman queue user, urutan priority DESC lalu added_time ASC
+        
+        Cursor berbentuk (priority, added_time_ms, id). Karena arah sort priority
+        dan waktu berbeda, halaman diambil sebagai dua index seek: sisa band
+        priority yang sama, lalu band priority yang lebih rendah.
+        
+        Args:
+            user_id: User ID
+            limit: Jumlah item per halaman
+            cursor: next_cursor dari halaman sebelumnya (None = halaman pertama)
+            
+        Returns:
+            Dict dengan 'items' dan 'next_cursor'
+        """
+        columns = 'queue_id, user_id, url, filename, priority, status, download_id, ' \
+                  'added_time, started_time, completed_time, error_message, file_size, ' \
+                  'downloaded_size, progress, added_time_ms, started_time_ms, completed_time_ms, id'
+        
+        conn = self._get_connection()
+        cursor_db = conn.cursor()
+        
+        if cursor:
+            priority, added_time_ms, last_id = self._decode_cursor(cursor, 3)
+            cursor_db.execute(f'''
+                SELECT * FROM (
+                    SELECT {columns} FROM download_queue
+                    WHERE user_id = ? AND priority = ? AND (added_time_ms, id) > (?, ?)
+                    ORDER BY added_time_ms ASC, id ASC
+                    LIMIT ?
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT {columns} FROM download_queue
+                    WHERE user_id = ? AND priority < ?
+                    ORDER BY priority DESC, added_time_ms ASC, id ASC
+                    LIMIT ?
+                )
+            ''', (user_id, priority, added_time_ms, last_id, limit + 1,
+                  user_id, priority, limit + 1))
+        else:
+            cursor_db.execute(f'''
+                SELECT {columns} FROM download_queue
+                WHERE user_id = ?
+                ORDER BY priority DESC, added_time_ms ASC, id ASC
+                LIMIT ?
+            ''', (user_id, limit + 1))
+        
+        rows = cursor_db.fetchall()[:limit + 1]
+        conn.close()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = self._encode_cursor((last[4], last[14], last[17]))
+        
+        items = [
+            {
+                'queue_id': row[0],
+                'user_id': row[1],
+                'url': row[2],
+                'filename': row[3],
+                'priority': row[4],
+                'status': row[5],
+                'download_id': row[6],
+                'added_time': row[7],
+                'started_time': row[8],
+                'completed_time': row[9],
+                'error_message': row[10],
+                'file_size': row[11],
+                'downloaded_size': row[12],
+                'progress': row[13],
+                'added_time_ms': row[14],
+                'started_time_ms': row[15],
+                'completed_time_ms': row[16]
             }
             for row in rows
         ]
+        
+        return {'items': items, 'next_cursor': next_cursor}
     
     def change_queue_priority(self, queue_id: str, new_priority: int) -> bool:
         """Change queue item priority"""
@@ -945,6 +1618,101 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
         conn.close()
         return changed
     
+    def save_queue_items(self, items: List[Dict], removed: Optional[List[str]] = None):
+        """
+        Simpan perubahan queue dalam satu transaction (upsert + delete)
+        
+        Args:
+            items: Dict item queue (format QueueItem.to_dict, priority sebagai int,
+                   waktu sebagai ISO string)
+            removed: queue_id yang dihapus dari queue
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            if items:
+                cursor.executemany('''
+                    INSERT INTO download_queue
+                    (queue_id, user_id, url, filename, priority, status, download_id,
+                     added_time, added_time_ms, started_time, started_time_ms,
+                     completed_time, completed_time_ms, error_message, file_size,
+                     downloaded_size, progress, download_dir, batch_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(queue_id) DO UPDATE SET
+                        priority = excluded.priority,
+                        status = excluded.status,
+                        download_id = excluded.download_id,
+                        started_time = excluded.started_time,
+                        started_time_ms = excluded.started_time_ms,
+                        completed_time = excluded.completed_time,
+                        completed_time_ms = excluded.completed_time_ms,
+                        error_message = excluded.error_message,
+                        file_size = excluded.file_size,
+                        downloaded_size = excluded.downloaded_size,
+                        progress = excluded.progress
+                ''', [
+                    (item['queue_id'], item['user_id'], item['url'], item['filename'],
+                     item['priority'], item['status'], item['download_id'],
+                     item['added_time'], to_epoch_ms(item['added_time']),
+                     item['started_time'], to_epoch_ms(item['started_time']),
+                     item['completed_time'], to_epoch_ms(item['completed_time']),
+                     item['error_message'], item['file_size'], item['downloaded_size'],
+                     item['progress'], item['download_dir'], item.get('batch_id'))
+                    for item in items
+                ])
+            
+            if removed:
+                cursor.executemany(
+                    'DELETE FROM download_queue WHERE queue_id = ?',
+                    [(queue_id,) for queue_id in removed]
+                )
+            
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def load_open_queue_items(self) -> List[Dict]:
+        """
+        Ambil semua item queue yang belum selesai (pending, paused, downloading)
+        
+        Returns:
+            List item, urut sesuai urutan masuk queue (id ASC)
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT queue_id, user_id, url, filename, priority, status, download_id,
+                   added_time_ms, error_message, file_size, downloaded_size, progress,
+                   download_dir, batch_id
+            FROM download_queue
+            WHERE status IN ('pending', 'paused', 'downloading')
+            ORDER BY id
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [
+            {
+                'queue_id': row[0],
+                'user_id': row[1],
+                'url': row[2],
+                'filename': row[3],
+                'priority': row[4],
+                'status': row[5],
+                'download_id': row[6],
+                'added_time_ms': row[7],
+                'error_message': row[8],
+                'file_size': row[9],
+                'downloaded_size': row[10],
+                'progress': row[11],
+                'download_dir': row[12],
+                'batch_id': row[13]
+            }
+            for row in rows
+        ]
+    
     def remove_from_queue(self, queue_id: str) -> bool:
         """Remove item from queue"""
         conn = self._get_connection()
@@ -959,6 +1727,103 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
     
     # ===== FILE METADATA (PREVIEW) =====
     
+    # ===== RESUME JOURNAL =====
+    
+    _RESUME_COLUMNS = (
+        'download_id', 'url', 'filepath', 'downloaded_bytes', 'total_bytes',
+        'segments', 'etag', 'last_modified', 'resume_supported', 'updated_time'
+    )
+    
+    def save_resume_states(self, states: List[Dict], removed: Optional[List[str]] = None):
+        """
+        Simpan checkpoint resume dalam satu transaction (upsert + delete)
+        
+        Args:
+            states: Dict state (segments sebagai list [start, end], updated_time
+                    sebagai ISO string)
+            removed: download_id yang sudah selesai/dibuang
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            if states:
+                cursor.executemany('''
+                    INSERT INTO resume_journal
+                    (download_id, url, filepath, downloaded_bytes, total_bytes, segments,
+                     etag, last_modified, resume_supported, updated_time, updated_time_ms)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(download_id) DO UPDATE SET
+                        url = excluded.url,
+                        filepath = excluded.filepath,
+                        downloaded_bytes = excluded.downloaded_bytes,
+                        total_bytes = excluded.total_bytes,
+                        segments = excluded.segments,
+                        etag = excluded.etag,
+                        last_modified = excluded.last_modified,
+                        resume_supported = excluded.resume_supported,
+                        updated_time = excluded.updated_time,
+                        updated_time_ms = excluded.updated_time_ms
+                ''', [
+                    (state['download_id'], state['url'], state['filepath'],
+                     state['downloaded_bytes'], state['total_bytes'],
+                     json.dumps(state.get('segments') or []),
+                     state.get('etag'), state.get('last_modified'),
+                     1 if state.get('resume_supported', True) else 0,
+                     state['updated_time'], to_epoch_ms(state['updated_time']))
+                    for state in states
+                ])
+            
+            if removed:
+                cursor.executemany(
+                    'DELETE FROM resume_journal WHERE download_id = ?',
+                    [(download_id,) for download_id in removed]
+                )
+            
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _resume_row(self, row) -> Dict:
+        state = dict(zip(self._RESUME_COLUMNS, row))
+        state['segments'] = json.loads(state['segments']) if state['segments'] else []
+        state['resume_supported'] = bool(state['resume_supported'])
+        return state
+    
+    def get_resume_state(self, download_id: str) -> Optional[Dict]:
+        """Ambil checkpoint resume satu download"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT {', '.join(self._RESUME_COLUMNS)}
+            FROM resume_journal WHERE download_id = ?
+        ''', (download_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        return self._resume_row(row) if row else None
+    
+    def get_resume_states(self) -> List[Dict]:
+        """
+        Ambil semua download yang bisa dilanjutkan (satu query, index updated_time_ms)
+        
+        Returns:
+            List state, checkpoint terbaru dulu
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT {', '.join(self._RESUME_COLUMNS)}
+            FROM resume_journal
+            ORDER BY updated_time_ms DESC
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [self._resume_row(row) for row in rows]
+    
     def add_file_metadata(self, filepath: str, file_type: str, mime_type: str,
                          metadata: Dict):
         """Add file metadata for preview"""
@@ -1159,9 +2024,14 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
         
         conn.commit()
         conn.close()
+        self.cache.invalidate(user_id, 'categorization_rules')
     
     def get_categorization_rules(self, user_id: int) -> List[Dict]:
         """Get categorization rules"""
+        cached = self.cache.get('categorization_rules', user_id)
+        if cached is not SettingsCache.MISSING:
+            return [dict(rule) for rule in cached]
+        
         conn = self._get_connection()
         cursor = conn.cursor()
         
@@ -1175,7 +2045,7 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
         rows = cursor.fetchall()
         conn.close()
         
-        return [
+        rules = [
             {
                 'pattern': row[0],
                 'category': row[1],
@@ -1184,6 +2054,9 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
             }
             for row in rows
         ]
+        
+        self.cache.set('categorization_rules', user_id, rules)
+        return [dict(rule) for rule in rules]
     
     def update_rule_usage(self, user_id: int, pattern: str):
         """Update rule usage count"""
@@ -1199,50 +2072,109 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
         
         conn.commit()
         conn.close()
+        
+        # Dipanggil untuk setiap file yang dikategorikan: cukup naikkan
+        # use_count di entry cache, lalu urutkan ulang seperti query di
+        # get_categorization_rules (ORDER BY confidence DESC, use_count DESC)
+        def bump(rules):
+            for rule in rules:
+                if rule['pattern'] == pattern:
+                    rule['use_count'] += 1
+            rules.sort(key=lambda rule: (rule['confidence'], rule['use_count']), reverse=True)
+        
+        self.cache.update('categorization_rules', user_id, bump)
     
     # ===== VIRUS SCAN RESULTS =====
     
     def add_scan_result(self, user_id: int, filepath: str, filename: str,
                        status: str, infected: bool, threats: list, 
-                       scanners: list, quarantined: bool = False):
+                       scanners: list, quarantined: bool = False,
+                       sha256_hash: Optional[str] = None):
         """Add virus scan result"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        now = datetime.now().isoformat()
+        now, now_ms = now_pair()
         
-        import json
         threats_json = json.dumps(threats)
         scanners_json = json.dumps(scanners)
         
         cursor.execute('''
             INSERT INTO virus_scan_results
-            (user_id, filepath, filename, scan_time, status, infected, 
-             threats, scanners, quarantined)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, filepath, filename, now, status, int(infected),
-              threats_json, scanners_json, int(quarantined)))
+            (user_id, filepath, filename, scan_time, scan_time_ms, status, infected, 
+             threats, scanners, quarantined, sha256_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, filepath, filename, now, now_ms, status, int(infected),
+              threats_json, scanners_json, int(quarantined), sha256_hash))
         
         conn.commit()
         conn.close()
     
-    def get_scan_history(self, user_id: int, limit: int = 50) -> List[Dict]:
-        """Get virus scan history"""
+    def get_cached_scan(self, sha256_hash: str, scanner: str) -> Optional[Dict]:
+        """
+        Ambil verdict tersimpan untuk isi file (SHA-256) dari satu scanner
+        
+        Returns:
+            Dict dengan engine_version, infected, threats, scan_time_ms; pemanggil
+            yang memutuskan apakah engine_version masih berlaku
+        """
         conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT filename, scan_time, status, infected, threats, scanners, quarantined
-            FROM virus_scan_results
-            WHERE user_id = ?
-            ORDER BY scan_time DESC
-            LIMIT ?
-        ''', (user_id, limit))
+            SELECT engine_version, infected, threats, scan_time_ms
+            FROM scan_cache
+            WHERE sha256_hash = ? AND scanner = ?
+        ''', (sha256_hash, scanner))
         
-        rows = cursor.fetchall()
+        row = cursor.fetchone()
         conn.close()
         
-        import json
-        return [
+        if not row:
+            return None
+        
+        return {
+            'engine_version': row[0],
+            'infected': bool(row[1]),
+            'threats': json.loads(row[2]) if row[2] else [],
+            'scan_time_ms': row[3]
+        }
+    
+    def save_cached_scan(self, sha256_hash: str, scanner: str, engine_version: str,
+                         infected: bool, threats: list):
+        """Simpan verdict scanner untuk isi file (menimpa verdict versi lama)"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        now, now_ms = now_pair()
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO scan_cache
+            (sha256_hash, scanner, engine_version, infected, threats, scan_time, scan_time_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (sha256_hash, scanner, engine_version, int(infected),
+              json.dumps(threats), now, now_ms))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_scan_history(self, user_id: int, limit: int = 50) -> List[Dict]:
+        """Get virus scan history"""
+        return self.get_scan_history_page(user_id, limit=limit)['items']
+    
+    def get_scan_history_page(self, user_id: int, limit: int = 10,
+                              cursor: Optional[str] = None) -> Dict:
+        """
+        Get satu halaman virus scan history (terbaru dulu)
+        
+        Returns:
+            Dict dengan 'items' dan 'next_cursor'
+        """
+        rows, next_cursor = self._keyset_page(
+            'filename, scan_time, status, infected, threats, scanners, quarantined, scan_time_ms',
+            'virus_scan_results', 'user_id = ?', (user_id,),
+            'scan_time_ms', cursor, limit
+        )
+        
+        items = [
             {
                 'filename': row[0],
                 'scan_time': row[1],
@@ -1250,25 +2182,32 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
                 'infected': bool(row[3]),
                 'threats': json.loads(row[4]) if row[4] else [],
                 'scanners': json.loads(row[5]) if row[5] else [],
-                'quarantined': bool(row[6])
+                'quarantined': bool(row[6]),
+                'scan_time_ms': row[7]
             }
             for row in rows
         ]
+        
+        return {'items': items, 'next_cursor': next_cursor}
     
     # ===== ENCRYPTION PASSWORDS =====
     
     def save_encryption_info(self, user_id: int, filename: str, 
-                            encrypted_filename: str, password_hint: str = ""):
-        """Save encryption info (not the actual password!)"""
+                            encrypted_filename: str, password_hint: str = "",
+                            file_size: Optional[int] = None, md5_hash: Optional[str] = None,
+                            sha256_hash: Optional[str] = None):
+        """Save encryption info (not the actual password!), optional ukuran & hash plaintext"""
         conn = self._get_connection()
         cursor = conn.cursor()
         now = datetime.now().isoformat()
         
         cursor.execute('''
             INSERT INTO encryption_passwords
-            (user_id, filename, encrypted_filename, password_hint, created_time)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, filename, encrypted_filename, password_hint, now))
+            (user_id, filename, encrypted_filename, password_hint, created_time,
+             file_size, md5_hash, sha256_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, filename, encrypted_filename, password_hint, now,
+              file_size, md5_hash, sha256_hash))
         
         conn.commit()
         conn.close()
@@ -1279,7 +2218,8 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT filename, encrypted_filename, password_hint, created_time
+            SELECT filename, encrypted_filename, password_hint, created_time,
+                   file_size, md5_hash, sha256_hash
             FROM encryption_passwords
             WHERE user_id = ?
             ORDER BY created_time DESC
@@ -1293,7 +2233,10 @@ def get_current_bandwidth_limit(self, user_id: int) -> int:
                 'filename': row[0],
                 'encrypted_filename': row[1],
                 'password_hint': row[2],
-                'created_time': row[3]
+                'created_time': row[3],
+                'file_size': row[4],
+                'md5_hash': row[5],
+                'sha256_hash': row[6]
             }
             for row in rows
         ]
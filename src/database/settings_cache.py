@@ -0,0 +1,104 @@
+"""
+Settings Cache
+In-process read-through cache untuk per-user settings (TTL + ukuran terbatas)
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class SettingsCache:
+    """LRU cache dengan TTL untuk record per-user, key berbentuk (kind, user_id)"""
+
+    MISSING = object()
+
+    def __init__(self, ttl: float = 300, max_size: int = 1024):
+        """
+        Initialize cache
+
+        Args:
+            ttl: Umur maksimal entry dalam detik (0 = cache dimatikan)
+            max_size: Jumlah maksimal entry sebelum entry terlama dibuang
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()  # (kind, user_id) -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, kind: str, user_id: Hashable) -> Any:
+        """Ambil value dari cache, return SettingsCache.MISSING jika tidak ada/expired"""
+        key = (kind, user_id)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return self.MISSING
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, kind: str, user_id: Hashable, value: Any):
+        """Simpan value ke cache (None juga di-cache sebagai negative entry)"""
+        if not self.enabled:
+            return
+
+        key = (kind, user_id)
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update(self, kind: str, user_id: Hashable, func: Callable[[Any], None]) -> bool:
+        """
+        Ubah value yang ter-cache in-place (tanpa mengubah TTL, urutan LRU, atau hit/miss)
+
+        Returns:
+            True jika entry ada dan sudah diubah
+        """
+        key = (kind, user_id)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return False
+            func(entry[1])
+            return True
+
+    def invalidate(self, user_id: Hashable, *kinds: str):
+        """Hapus entry untuk user tertentu (semua kind yang disebutkan)"""
+        with self._lock:
+            for kind in kinds:
+                self._entries.pop((kind, user_id), None)
+
+    def clear(self):
+        """Kosongkan cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Get hit/miss counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total * 100) if total > 0 else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl
+            }
@@ -0,0 +1,42 @@
+"""
+Timestamps
+Konversi waktu ISO-8601 (kolom TEXT lama) <-> epoch milliseconds (kolom *_ms)
+"""
+from datetime import datetime
+from typing import Optional, Tuple, Union
+
+# Ekspresi SQL untuk backfill: ISO text (waktu lokal, dari datetime.now().isoformat())
+# -> epoch ms UTC, sama dengan datetime.fromisoformat(value).timestamp() * 1000
+SQL_ISO_TO_MS = "CAST(ROUND((julianday({column}, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def to_epoch_ms(value: Union[datetime, str, None]) -> Optional[int]:
+    """
+    Convert datetime atau ISO string ke epoch milliseconds
+
+    Returns:
+        Epoch ms, atau None jika value kosong/tidak valid
+    """
+    if value is None or value == '':
+        return None
+
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+
+    return round(value.timestamp() * 1000)
+
+
+def from_epoch_ms(value: Optional[int]) -> Optional[datetime]:
+    """Convert epoch milliseconds ke datetime lokal (naive, seperti datetime.now())"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value / 1000)
+
+
+def now_pair() -> Tuple[str, int]:
+    """Waktu sekarang sebagai (ISO string, epoch ms) untuk ditulis ke kedua kolom"""
+    now = datetime.now()
+    return now.isoformat(), round(now.timestamp() * 1000)
@@ -9,20 +9,32 @@ import logging
 import urllib.request
 import urllib.error
 
+from src.managers.resume_downloader import ResumableDownloader
+
 logger = logging.getLogger(__name__)
 
 
 class DownloadManager:
     """Mengelola multiple download secara bersamaan"""
     
-    def __init__(self, db_manager=None, notification_manager=None):
+    def __init__(self, db_manager=None, notification_manager=None,
+                 file_encryption=None, encrypt_password: Optional[str] = None):
+        """
+        Args:
+            file_encryption: FileEncryption untuk encrypt-on-download (optional)
+            encrypt_password: Password encrypt-on-download; jika di-set, semua
+                download langsung ditulis terenkripsi (.enc)
+        """
         self.db_manager = db_manager
         self.notification_manager = notification_manager
+        self.file_encryption = file_encryption
+        self.encrypt_password = encrypt_password if file_encryption else None
         self.active_downloads: Dict[str, dict] = {}
         self.completed_downloads: Dict[str, dict] = {}
         self.failed_downloads: Dict[str, dict] = {}
         self.download_tasks: Dict[str, asyncio.Task] = {}
         self.progress_callbacks: Dict[str, Callable] = {}  # Callback untuk progress update
+        self.suspended_downloads: Dict[str, dict] = {}  # Dihentikan sementara, file parsial disimpan
         
         # Auto-retry configuration
         import config
@@ -30,17 +42,37 @@ class DownloadManager:
         self.retry_delay_base = getattr(config, 'RETRY_DELAY_BASE', 5)  # seconds
         
     async def start_download(self, url: str, download_dir: str, user_id: Optional[int] = None, 
-                             progress_callback: Optional[Callable] = None) -> str:
-        """Mulai download file dari URL"""
-        download_id = str(uuid.uuid4())[:8]
+                             progress_callback: Optional[Callable] = None,
+                             resume_from: Optional[dict] = None,
+                             encrypt: Optional[bool] = None) -> str:
+        """
+        Mulai download file dari URL
+        
+        Args:
+            resume_from: Hasil suspend_download; download dilanjutkan dari file
+                parsial dengan download_id dan filepath yang sama
+            encrypt: Tulis file terenkripsi (.enc) selama download
+                (default: aktif jika encrypt_password di-set)
+        """
+        if encrypt is None:
+            encrypt = self.encrypt_password is not None
+        if encrypt and not resume_from and self.encrypt_password is None:
+            raise ValueError("Encrypt-on-download tidak dikonfigurasi")
+        
+        download_id = resume_from['download_id'] if resume_from else str(uuid.uuid4())[:8]
+        self.suspended_downloads.pop(download_id, None)
         
         # Pastikan folder download exist
         os.makedirs(download_dir, exist_ok=True)
         
-        # Dapatkan nama file dari URL
-        filename = self._get_filename_from_url(url)
-        filepath = os.path.join(download_dir, filename)
-        filepath = os.path.abspath(filepath)  # Convert to absolute path
+        if resume_from:
+            filepath = resume_from['filepath']
+            filename = os.path.basename(filepath)
+        else:
+            # Dapatkan nama file dari URL
+            filename = self._get_filename_from_url(url)
+            filepath = os.path.join(download_dir, filename)
+            filepath = os.path.abspath(filepath)  # Convert to absolute path
         
         # Tambahkan ke active downloads
         self.active_downloads[download_id] = {
@@ -56,11 +88,16 @@ class DownloadManager:
             'speed': 0,
             'user_id': user_id,
             'retry_count': 0,  # Track retry attempts
-            'last_error': None
+            'last_error': None,
+            'resume': resume_from,
+            'validator': resume_from.get('validator') if resume_from else None,
+            # Password + EncryptedStreamWriter (dibuat saat response diterima)
+            'encryption': (resume_from.get('encryption') if resume_from
+                           else {'password': self.encrypt_password, 'writer': None} if encrypt else None)
         }
         
-        # Simpan ke database jika tersedia
-        if self.db_manager and user_id:
+        # Simpan ke database jika tersedia (download yang dilanjutkan memakai row lama)
+        if self.db_manager and user_id and not resume_from:
             self.db_manager.add_download_history(
                 user_id, download_id, url, filename, filepath, 'starting'
             )
@@ -167,6 +204,9 @@ class DownloadManager:
             await self._download_with_aiohttp(download_id, url, filepath, user_id)
             return
         except Exception as e:
+            # Fallback urllib/requests menulis plaintext, tidak dipakai untuk encrypt-on-download
+            if (self.active_downloads.get(download_id) or {}).get('encryption'):
+                raise
             logger.warning(f"⚠️ aiohttp gagal: {e}")
             logger.info(f"🔄 Mencoba dengan urllib...")
             
@@ -237,8 +277,20 @@ class DownloadManager:
                             )
                     raise Exception(f"Semua metode download gagal. aiohttp: {e}, urllib: {e2}, requests: {e3}")
     
+    def _resume_writer(self, encryption: dict, filepath: str):
+        """EncryptedStreamWriter untuk melanjutkan file .enc parsial"""
+        from src.utils.file_encryption import EncryptedStreamWriter
+        
+        writer = encryption.get('writer')
+        if writer is None or not writer.reopen():
+            writer = EncryptedStreamWriter.resume(self.file_encryption, filepath, encryption['password'])
+        encryption['writer'] = writer
+        return writer
+    
     async def _download_with_aiohttp(self, download_id: str, url: str, filepath: str, user_id: Optional[int] = None):
         """Download menggunakan aiohttp"""
+        loop = asyncio.get_running_loop()
+        writer = None  # EncryptedStreamWriter jika encrypt-on-download
         try:
             # Headers untuk bypass 403
             headers = {
@@ -275,13 +327,63 @@ class DownloadManager:
                 except:
                     pass
                 
-                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=None)) as response:
-                    if response.status != 200:
+                # Lanjutkan file parsial dari suspend_download; If-Range membuat
+                # server mengirim file utuh (200) jika file di server sudah berubah
+                offset = 0
+                info = self.active_downloads[download_id]
+                encryption = info.get('encryption')
+                if info.get('resume') and os.path.exists(filepath):
+                    if encryption:
+                        # File .enc hanya berisi segment lengkap, lanjut dari batas segment
+                        writer = await loop.run_in_executor(None, self._resume_writer, encryption, filepath)
+                        offset = writer.offset
+                    else:
+                        offset = os.path.getsize(filepath)
+                    if offset > 0:
+                        headers['Range'] = f'bytes={offset}-'
+                        if info.get('validator'):
+                            headers['If-Range'] = info['validator']
+                
+                timeout = aiohttp.ClientTimeout(total=None)
+                response = await session.get(url, headers=headers, timeout=timeout)
+                if offset > 0 and response.status == 206:
+                    # Append hanya aman jika server benar-benar mulai dari offset
+                    # dan ukuran total sama dengan yang tercatat saat suspend
+                    content_range = ResumableDownloader._parse_content_range(
+                        response.headers.get('Content-Range', '')
+                    )
+                    expected_total = info['resume'].get('total_size') or None
+                    if (not content_range or content_range[0] != offset
+                            or (expected_total and content_range[2] is not None
+                                and content_range[2] != expected_total)):
+                        logger.warning(
+                            f"⚠️ Content-Range tidak cocok ({response.headers.get('Content-Range')!r}, "
+                            f"offset {offset}), download diulang dari awal"
+                        )
+                        response.release()
+                        headers.pop('Range', None)
+                        headers.pop('If-Range', None)
+                        offset = 0
+                        response = await session.get(url, headers=headers, timeout=timeout)
+                
+                async with response:
+                    if offset > 0 and response.status == 206:
+                        logger.info(f"📍 Melanjutkan dari byte {offset}")
+                    elif response.status != 200:
                         raise Exception(f"HTTP {response.status}")
+                    else:
+                        offset = 0
+                        if writer is not None:
+                            writer.abort()  # File di server berubah, mulai dari awal
+                            writer = None
+                        etag = response.headers.get('ETag', '')
+                        # Weak ETag tidak boleh dipakai untuk If-Range
+                        info['validator'] = (etag if etag and not etag.startswith('W/')
+                                             else response.headers.get('Last-Modified'))
                     
                     # Cek Content-Disposition untuk nama file sebenarnya
                     content_disp = response.headers.get('Content-Disposition', '')
-                    if content_disp and 'filename=' in content_disp:
+                    if content_disp and 'filename=' in content_disp and not info.get('resume'):
                         import re
                         match = re.search(r'filename[*]?=["\']?([^"\';\r\n]+)', content_disp)
                         if match:
@@ -295,7 +397,7 @@ class DownloadManager:
                                 logger.info(f"📝 Nama file terdeteksi: {suggested_filename}")
                     
                     # Jika tidak ada ekstensi, coba deteksi dari Content-Type
-                    if '.' not in os.path.basename(filepath):
+                    if '.' not in os.path.basename(filepath) and not info.get('resume'):
                         content_type = response.headers.get('Content-Type', '')
                         ext = self._get_extension_from_content_type(content_type)
                         if ext:
@@ -305,34 +407,61 @@ class DownloadManager:
                             self.active_downloads[download_id]['filename'] = os.path.basename(filepath)
                             logger.info(f"📝 Ekstensi ditambahkan: {ext}")
                     
-                    total_size = int(response.headers.get('content-length', 0))
+                    # Encrypt-on-download: hanya ciphertext (.enc) yang ditulis ke disk
+                    if encryption and writer is None:
+                        from src.utils.file_encryption import EncryptedStreamWriter
+                        
+                        if not filepath.endswith('.enc'):
+                            filepath += '.enc'
+                            self.active_downloads[download_id]['filepath'] = filepath
+                            self.active_downloads[download_id]['filename'] = os.path.basename(filepath)
+                        writer = await loop.run_in_executor(
+                            None, EncryptedStreamWriter, self.file_encryption, filepath, encryption['password']
+                        )
+                        encryption['writer'] = writer
+                    
+                    content_length = int(response.headers.get('content-length', 0))
+                    total_size = offset + content_length if content_length else 0
                     self.active_downloads[download_id]['total_size'] = total_size
                     self.active_downloads[download_id]['status'] = 'downloading'
                     
                     logger.info(f"📦 Ukuran file: {self.format_size(total_size)}")
                     
-                    downloaded_size = 0
+                    downloaded_size = offset
                     start_time = datetime.now()
                     last_progress_log = 0
                     
-                    # Buat file dan mulai download
-                    async with aiofiles.open(filepath, 'wb') as f:
+                    # Buat file (atau append ke file parsial) dan mulai download
+                    f = await aiofiles.open(filepath, 'ab' if offset else 'wb') if writer is None else None
+                    try:
                         async for chunk in response.content.iter_chunked(65536):  # 64KB chunks
                             if download_id not in self.active_downloads:
-                                # Download dibatalkan
-                                await f.close()
-                                if os.path.exists(filepath):
+                                # Download dibatalkan (file parsial dipertahankan jika di-suspend)
+                                if f is not None:
+                                    await f.close()
+                                elif download_id in self.suspended_downloads:
+                                    writer.suspend()
+                                else:
+                                    writer.abort()
+                                if download_id not in self.suspended_downloads and os.path.exists(filepath):
                                     os.remove(filepath)
                                 logger.warning(f"⚠️ Download dibatalkan: {os.path.basename(filepath)}")
                                 return
                             
-                            await f.write(chunk)
-                            await f.flush()  # Ensure data is written to disk
+                            if f is None:
+                                # Hash + encrypt segment penuh dijalankan di thread
+                                if writer.will_seal(len(chunk)):
+                                    await loop.run_in_executor(None, writer.write, chunk)
+                                else:
+                                    writer.write(chunk)
+                            else:
+                                await f.write(chunk)
+                                await f.flush()  # Ensure data is written to disk
                             downloaded_size += len(chunk)
                             
                             # Update progress
                             elapsed = (datetime.now() - start_time).total_seconds()
-                            speed = downloaded_size / elapsed if elapsed > 0 else 0
+                            speed = (downloaded_size - offset) / elapsed if elapsed > 0 else 0
                             progress_pct = (downloaded_size / total_size * 100) if total_size > 0 else 0
                             
                             self.active_downloads[download_id].update({
@@ -357,12 +486,23 @@ class DownloadManager:
                                         await self.progress_callbacks[download_id](download_id, progress_pct, downloaded_size, total_size, speed)
                                     except Exception as e:
                                         logger.error(f"Progress callback error: {e}")
+                    finally:
+                        if f is not None:
+                            await f.close()
                     
                     # Ensure all data is written
                     logger.info(f"💾 Finalizing file... {self.format_size(downloaded_size)} written")
             
             # Verify file size matches
-            if os.path.exists(filepath):
+            encrypted = None
+            if writer is not None:
+                # Segment terakhir + ukuran di header; hash dihitung dari plaintext
+                encrypted = await loop.run_in_executor(None, writer.close)
+                if encrypted['size'] != downloaded_size:
+                    logger.warning(f"⚠️ File size mismatch: expected {downloaded_size}, encrypted {encrypted['size']}")
+                else:
+                    logger.info(f"🔒 Encrypted: {self.format_size(encrypted['size'])} (SHA256 {encrypted['sha256'][:16]}...)")
+            elif os.path.exists(filepath):
                 actual_size = os.path.getsize(filepath)
                 if actual_size != downloaded_size:
                     logger.warning(f"⚠️ File size mismatch: expected {downloaded_size}, got {actual_size}")
@@ -375,6 +515,20 @@ class DownloadManager:
             download_info['end_time'] = datetime.now()
             self.completed_downloads[download_id] = download_info
             
+            if encrypted:
+                download_info.pop('encryption', None)  # Password tidak disimpan di completed_downloads
+                download_info.update({
+                    'encrypted': True,
+                    'md5_hash': encrypted['md5'],
+                    'sha256_hash': encrypted['sha256']
+                })
+                if self.db_manager and user_id:
+                    self.db_manager.save_encryption_info(
+                        user_id, os.path.basename(filepath)[:-len('.enc')], os.path.basename(filepath),
+                        file_size=encrypted['size'], md5_hash=encrypted['md5'],
+                        sha256_hash=encrypted['sha256']
+                    )
+            
             # Calculate download duration
             duration = (download_info['end_time'] - download_info['start_time']).total_seconds()
             duration_str = self.format_duration(duration)
@@ -482,6 +636,14 @@ class DownloadManager:
                 del self.download_tasks[download_id]
             
             raise  # Re-raise exception for caller
+        
+        finally:
+            # Writer yang belum selesai: tetap bisa dilanjutkan jika di-suspend
+            if writer is not None:
+                if download_id in self.suspended_downloads:
+                    writer.suspend()
+                else:
+                    writer.abort()
     
     def cancel_download(self, download_id: str) -> bool:
         """Batalkan download yang sedang berjalan"""
@@ -505,6 +667,66 @@ class DownloadManager:
             return True
         return False
     
+    async def suspend_download(self, download_id: str) -> Optional[dict]:
+        """
+        Hentikan download sementara tanpa menghapus file parsial
+        
+        Task download dibatalkan dan ditunggu sampai benar-benar berhenti,
+        jadi download_id aman dipakai lagi lewat start_download(resume_from=...).
+        
+        Returns:
+            Resume info (download_id, filepath, downloaded_size, total_size,
+            validator) atau None jika download tidak aktif
+        """
+        download_info = self.active_downloads.pop(download_id, None)
+        if download_info is None:
+            return None
+        
+        resume_info = {
+            'download_id': download_id,
+            'url': download_info['url'],
+            'filepath': download_info['filepath'],
+            'downloaded_size': download_info.get('downloaded_size', 0),
+            'total_size': download_info.get('total_size', 0),
+            'validator': download_info.get('validator'),
+            'encryption': download_info.get('encryption')
+        }
+        self.suspended_downloads[download_id] = resume_info
+        self.progress_callbacks.pop(download_id, None)
+        
+        task = self.download_tasks.pop(download_id, None)
+        if task and not task.done():
+            task.cancel()
+            await asyncio.wait({task}, timeout=10)
+        
+        if self.db_manager and download_info.get('user_id'):
+            self.db_manager.update_download_history(download_id, 'suspended')
+        
+        logger.info(f"⏸️ Download suspended: {download_info['filename']} "
+                    f"({self.format_size(resume_info['downloaded_size'])})")
+        return resume_info
+    
+    def discard_suspended(self, download_id: str) -> bool:
+        """Hapus file parsial download yang di-suspend dan tidak akan dilanjutkan"""
+        resume_info = self.suspended_downloads.pop(download_id, None)
+        if resume_info is None:
+            return False
+        
+        if resume_info.get('encryption') and resume_info['encryption'].get('writer'):
+            resume_info['encryption']['writer'].abort()
+        
+        if os.path.exists(resume_info['filepath']):
+            try:
+                os.remove(resume_info['filepath'])
+            except OSError:
+                pass
+        
+        if self.db_manager:
+            self.db_manager.update_download_history(
+                download_id, 'cancelled', error_message='Cancelled by user'
+            )
+        return True
+    
     def get_active_downloads(self) -> Dict[str, dict]:
         """Dapatkan daftar download aktif"""
         return self.active_downloads.copy()
@@ -606,6 +828,8 @@ class DownloadManager:
     async def _download_with_urllib(self, download_id: str, url: str, filepath: str, user_id: Optional[int] = None):
         """Download menggunakan urllib sebagai fallback"""
         logger.info(f"🔧 Menggunakan urllib untuk download")
+        # File parsial dari suspend: nama file tidak boleh berubah
+        resume = bool(self.active_downloads.get(download_id, {}).get('resume'))
         
         def download_sync():
             """Synchronous download function"""
@@ -636,7 +860,7 @@ class DownloadManager:
                                 logger.info(f"📝 Nama file terdeteksi: {suggested_filename}")
                     
                     # Jika tidak ada ekstensi, coba deteksi dari Content-Type
-                    if '.' not in os.path.basename(filepath):
+                    if '.' not in os.path.basename(filepath) and not resume:
                         content_type = response.headers.get('Content-Type', '')
                         ext = self._get_extension_from_content_type(content_type)
                         if ext:
@@ -764,6 +988,8 @@ class DownloadManager:
     async def _download_with_requests(self, download_id: str, url: str, filepath: str, user_id: Optional[int] = None):
         """Download menggunakan requests library sebagai fallback terakhir"""
         logger.info(f"🔧 Menggunakan requests library untuk download")
+        # File parsial dari suspend: nama file tidak boleh berubah
+        resume = bool(self.active_downloads.get(download_id, {}).get('resume'))
         
         def download_sync():
             """Synchronous download function using requests"""
@@ -810,7 +1036,7 @@ class DownloadManager:
                                 logger.info(f"📝 Nama file terdeteksi: {suggested_filename}")
                     
                     # Jika tidak ada ekstensi, coba deteksi dari Content-Type
-                    if '.' not in os.path.basename(filepath):
+                    if '.' not in os.path.basename(filepath) and not resume:
                         content_type = response.headers.get('Content-Type', '')
                         ext = self._get_extension_from_content_type(content_type)
                         if ext:
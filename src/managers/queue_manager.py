@@ -3,12 +3,21 @@ Download Queue Manager
 Priority-based queue dengan pause/resume capability
 """
 import asyncio
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from collections import Counter, deque
 from typing import Dict, List, Optional, Callable
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 import logging
 
+from src.database.settings_cache import SettingsCache
+from src.database.timestamps import from_epoch_ms
+
 logger = logging.getLogger(__name__)
 
 
@@ -47,6 +56,15 @@ class QueueItem:
     file_size: int = 0
     downloaded_size: int = 0
     progress: float = 0.0
+    sequence: int = 0               # Urutan masuk queue (FIFO dalam satu priority)
+    download_dir: Optional[str] = None
+    enqueued_at: float = 0.0        # time.monotonic() saat mulai menunggu (untuk aging & wait metrics)
+    expected_size: Optional[int] = None     # Dari probe HEAD/Range (None = belum/tidak diketahui)
+    accepts_ranges: Optional[bool] = None
+    preempt_count: int = 0          # Berapa kali di-suspend oleh item priority lebih tinggi
+    resume_state: Optional[Dict] = None     # Dari DownloadManager.suspend_download (file parsial)
+    batch_id: Optional[str] = None  # Batch /batch pemilik item (status batch di-update saat selesai)
+    progress_callback: Optional[Callable] = field(default=None, repr=False)  # Callback pemilik (tidak dipersist)
     
     def to_dict(self) -> dict:
         """Convert to dictionary"""
@@ -64,29 +82,807 @@ class QueueItem:
             'error_message': self.error_message,
             'file_size': self.file_size,
             'downloaded_size': self.downloaded_size,
-            'progress': self.progress
+            'progress': self.progress,
+            'download_dir': self.download_dir,
+            'expected_size': self.expected_size,
+            'accepts_ranges': self.accepts_ranges,
+            'preempt_count': self.preempt_count,
+            'batch_id': self.batch_id
         }
 
 
+class _Bucket:
+    """Item pending milik satu user (atau semua user jika fair share mati)"""
+    
+    __slots__ = ('key', 'levels', 'sizes', 'deficit', 'size', 'stale', 'in_ring')
+    
+    def __init__(self, key):
+        self.key = key
+        # Per priority level: heap FIFO, entry [sequence, push_no, queue_id],
+        # dan heap ukuran, entry [expected_size, sequence, push_no, queue_id]
+        self.levels: Dict[int, List[list]] = {priority.value: [] for priority in QueuePriority}
+        self.sizes: Dict[int, List[list]] = {priority.value: [] for priority in QueuePriority}
+        self.deficit = 0.0
+        self.size = 0
+        self.stale = 0
+        self.in_ring = False
+
+
 class QueueManager:
-    """Manage download queue dengan priority dan concurrency control"""
+    """
+    Manage download queue dengan priority dan concurrency control
+    
+    Item pending dikelompokkan per user (bucket), dan di dalam bucket ada satu
+    heap per priority level dengan key sequence (FIFO). Dispatch memakai
+    deficit round-robin antar user: setiap giliran, bucket mendapat kredit
+    sebesar bobot priority item teratasnya, dan satu item keluar per satu
+    kredit. User dengan satu link tidak perlu menunggu batch ribuan item milik
+    user lain, dan priority tinggi tetap mendapat porsi lebih besar.
+    
+    Aging: setiap aging_seconds menunggu, priority efektif item naik satu level
+    (maksimal URGENT), jadi item LOW tidak pernah starve. Karena head setiap
+    heap adalah item tertua di level itu, aging cukup dihitung di head.
+    
+    Dengan fair_share=False semua item masuk satu bucket: urutan murni
+    priority (dengan aging), FIFO dalam priority yang sama.
+    
+    Size-aware (size_aware=True): item baru di-probe (HEAD, fallback GET
+    Range 0-0) di background untuk tahu ukuran & dukungan Range, hasilnya
+    di-cache per URL. Dalam level priority yang terpilih, sebagian dispatch
+    (short_job_ratio) mengambil item dengan ukuran terkecil untuk menurunkan
+    rata-rata waktu selesai, sisanya mengambil item tertua (biasanya file
+    besar yang tertinggal) supaya bandwidth tetap terpakai dan tidak ada
+    item yang starve. Item yang ukurannya belum diketahui dianggap besar.
+    
+    Entry heap tidak pernah dihapus di tengah: remove/pause/reprioritize cukup
+    menandai entry lama sebagai stale (lazy deletion), dan entry stale dibuang
+    saat sampai di puncak heap. Semua item bisa di-lookup lewat queue_id.
+    
+    Semua operasi sinkron (tanpa await) sehingga atomic di dalam event loop.
+    
+    Jumlah item per status (global dan per user) disimpan sebagai counter yang
+    di-update di setiap transisi, jadi status queue tidak perlu scan. Item yang
+    selesai/gagal/dibatalkan keluar dari self.items ke ring item terakhir
+    (finished_limit); counter completed/failed/cancelled bersifat kumulatif
+    sejak bot start.
+    
+    Dispatcher (_process_queue) tidak polling: ia tidur di asyncio.Event dan
+    dibangunkan saat item ditambah/di-resume, priority berubah, atau slot
+    download kosong. Jika download_manager diberikan, item dijalankan lewat
+    DownloadManager.start_download dan progress/selesai/gagal dari download
+    tersebut kembali ke update_progress/mark_completed/mark_failed.
+    
+    Jika db_manager diberikan, queue disimpan di tabel download_queue. Setiap
+    perubahan menandai item sebagai dirty, lalu flusher menulis semua item
+    dirty dalam satu transaction setiap flush_interval detik (perubahan yang
+    berdekatan, misalnya progress, tergabung jadi satu write; write SQLite
+    dijalankan di executor supaya tidak mem-block event loop). Saat start,
+    item pending/paused/downloading dimuat ulang sekaligus; item yang sedang
+    downloading saat bot mati dikembalikan ke pending.
+    
+    Preemption (preemption=True): jika semua slot terpakai dan ada item
+    pending dengan priority dasar >= preempt_priority, dispatcher men-suspend
+    download aktif dengan priority paling rendah (harus lebih rendah dari item
+    tersebut). File parsial dipertahankan lewat DownloadManager.suspend_download
+    dan item kembali ke pending untuk dilanjutkan dengan Range request.
+    Hysteresis supaya download panjang tidak thrash: victim harus sudah jalan
+    minimal preempt_min_runtime detik sejak (re)start, item yang sudah di-suspend
+    preempt_max_count kali atau hampir selesai tidak di-suspend lagi, server
+    tanpa dukungan Range tidak pernah jadi victim, dan priority hasil aging
+    tidak memicu preemption.
+    """
+    
+    # Rebuild heap jika entry stale melebihi proporsi ini (dan minimal COMPACT_MIN)
+    COMPACT_RATIO = 0.5
+    COMPACT_MIN = 1024
+    
+    # Download yang progress-nya sudah di atas ini tidak di-preempt
+    PREEMPT_SKIP_PROGRESS = 90.0
+    
+    # Kredit per giliran round-robin, berdasarkan priority efektif item teratas
+    DEFAULT_PRIORITY_WEIGHTS = {
+        QueuePriority.LOW: 1.0,
+        QueuePriority.NORMAL: 2.0,
+        QueuePriority.HIGH: 4.0,
+        QueuePriority.URGENT: 8.0,
+    }
     
-    def __init__(self, max_concurrent: int = 3):
+    def __init__(self, max_concurrent: int = 3, download_manager=None,
+                 download_dir: str = './downloads', db_manager=None,
+                 flush_interval: float = 0.5, fair_share: bool = True,
+                 priority_weights: Optional[Dict[QueuePriority, float]] = None,
+                 aging_seconds: float = 300, size_aware: bool = False,
+                 short_job_ratio: float = 0.75, link_validator=None,
+                 probe_concurrency: int = 4, probe_cache_ttl: float = 3600,
+                 finished_limit: int = 1000, preemption: bool = False,
+                 preempt_priority: QueuePriority = QueuePriority.HIGH,
+                 preempt_min_runtime: float = 120, preempt_max_count: int = 2):
         """
         Initialize queue manager
         
         Args:
             max_concurrent: Maximum concurrent downloads
+            download_manager: DownloadManager untuk menjalankan item (optional)
+            download_dir: Folder default jika item tidak punya download_dir
+            db_manager: Database untuk persistensi queue (optional)
+            flush_interval: Jeda (detik) untuk mengumpulkan perubahan per batch write
+            fair_share: Round-robin antar user (False = urutan priority global)
+            priority_weights: Bobot round-robin per priority (harus > 0)
+            aging_seconds: Lama menunggu per kenaikan satu level priority (0 = tanpa aging)
+            size_aware: Aktifkan probe ukuran dan dispatch shortest-first campuran
+            short_job_ratio: Proporsi dispatch yang mengambil item terkecil (0..1)
+            link_validator: LinkValidator untuk probe (default: LinkValidator())
+            probe_concurrency: Jumlah probe yang berjalan bersamaan
+            probe_cache_ttl: Umur cache hasil probe per URL (detik)
+            finished_limit: Jumlah item selesai terakhir yang disimpan di memory
+            preemption: Item priority tinggi boleh men-suspend download priority rendah
+            preempt_priority: Priority minimal item yang boleh memicu preemption
+            preempt_min_runtime: Lama minimal (detik) victim berjalan sebelum boleh di-suspend
+            preempt_max_count: Maksimal berapa kali satu item boleh di-suspend
         """
         self.max_concurrent = max_concurrent
-        self.queue: List[QueueItem] = []
+        self.download_manager = download_manager
+        self.download_dir = download_dir
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self.fair_share = fair_share
+        self.aging_seconds = aging_seconds
+        
+        weights = dict(self.DEFAULT_PRIORITY_WEIGHTS)
+        weights.update(priority_weights or {})
+        if any(weight <= 0 for weight in weights.values()):
+            raise ValueError("Priority weights must be positive")
+        self.priority_weights = {priority.value: weight for priority, weight in weights.items()}
+        
+        self.size_aware = size_aware
+        self.short_job_ratio = min(max(short_job_ratio, 0.0), 1.0)
+        self.probe_concurrency = max(1, probe_concurrency)
+        if size_aware and link_validator is None:
+            from src.utils.link_validator import LinkValidator
+            link_validator = LinkValidator()
+        self.link_validator = link_validator
+        self.probe_cache = SettingsCache(ttl=probe_cache_ttl, max_size=10000)
+        
+        self.preemption = preemption
+        self.preempt_priority = preempt_priority
+        self.preempt_min_runtime = preempt_min_runtime
+        self.preempt_max_count = preempt_max_count
+        self._short_credit = 0.0
+        self.items: Dict[str, QueueItem] = {}
         self.active_downloads: Dict[str, QueueItem] = {}
-        self.queue_lock = asyncio.Lock()
+        
+        # Counter per status (global & per user) dan index item live per user
+        self.status_counts: Counter = Counter()
+        self.user_status_counts: Dict[int, Counter] = {}
+        self._user_items: Dict[int, Dict[str, QueueItem]] = {}
+        
+        # Ring item yang sudah selesai (terbaru di kanan)
+        self.finished: deque = deque(maxlen=max(1, finished_limit))
+        self._finished_index: Dict[str, QueueItem] = {}
+        
+        # Listing terurut per user (None = global), dibangun ulang hanya jika
+        # item live bertambah/berkurang atau priority berubah
+        self._listing_version: Counter = Counter()
+        self._listing_cache: Dict[Optional[int], tuple] = {}
         self.processing = False
         self.processor_task: Optional[asyncio.Task] = None
+        
+        # Heap entry diakhiri queue_id; queue_id None = stale. push_no unik per
+        # push supaya entry stale & baru dengan key sama tidak pernah
+        # membandingkan queue_id (None vs str).
+        # _entries: queue_id -> [entry FIFO, entry ukuran (None jika tidak size-aware)]
+        self._buckets: Dict[Optional[int], _Bucket] = {}
+        self._ring: deque = deque()
+        self._entries: Dict[str, list] = {}
+        self._sequence = itertools.count()
+        self._push_counter = itertools.count()
+        
+        # Wait time (detik) dari masuk antrian sampai dispatch, per user
+        self.wait_stats: Dict[int, Dict] = {}
+        
+        # Perubahan yang belum ditulis ke database
+        self._dirty: Dict[str, QueueItem] = {}
+        self._removed: Dict[str, None] = {}
+        self._batch_updates: List[tuple] = []  # (batch_id, queue_id, status, filename, error)
+        self._inflight: Optional[tuple] = None  # Snapshot yang sedang ditulis di executor
+        self._write_lock = threading.Lock()
+        self._flush_generation = 0
+        self._written_generation = 0
+        self._restored = False
+        self.flush_task: Optional[asyncio.Task] = None
+        
+        # Dibuat saat start_processing (butuh event loop yang berjalan)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_wakeup: Optional[asyncio.Event] = None
+        self._probe_queue: Optional[asyncio.Queue] = None
+        self._unprobed: List[str] = []
+        self.probe_tasks: List[asyncio.Task] = []
+    
+    # ===== HEAP INTERNALS =====
+    
+    def _bucket_key(self, item: QueueItem) -> Optional[int]:
+        return item.user_id if self.fair_share else None
+    
+    def _get_bucket(self, item: QueueItem) -> _Bucket:
+        """Bucket milik item, dibuat dan dimasukkan ke ring jika belum ada"""
+        key = self._bucket_key(item)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(key)
+        if not bucket.in_ring:
+            bucket.in_ring = True
+            self._ring.append(key)
+        return bucket
+    
+    def _size_key(self, item: QueueItem) -> float:
+        """Key heap ukuran; ukuran yang belum diketahui dianggap paling besar"""
+        return item.expected_size if item.expected_size is not None else float('inf')
+    
+    def _push(self, item: QueueItem, reset_wait: bool = True):
+        """Masukkan item pending ke heap bucket-nya (O(log n))"""
+        self._invalidate(item.queue_id)
+        if reset_wait:
+            item.enqueued_at = time.monotonic()
+        
+        bucket = self._get_bucket(item)
+        level = item.priority.value
+        push_no = next(self._push_counter)
+        
+        entry = [item.sequence, push_no, item.queue_id]
+        heapq.heappush(bucket.levels[level], entry)
+        
+        size_entry = None
+        if self.size_aware:
+            size_entry = [self._size_key(item), item.sequence, push_no, item.queue_id]
+            heapq.heappush(bucket.sizes[level], size_entry)
+        
+        self._entries[item.queue_id] = [entry, size_entry]
+        bucket.size += 1
+    
+    def _invalidate(self, queue_id: str):
+        """Tandai entry heap sebagai stale (O(1))"""
+        entries = self._entries.pop(queue_id, None)
+        if entries is None:
+            return
+        
+        bucket = self._buckets[self._bucket_key(self.items[queue_id])]
+        for entry in entries:
+            if entry is not None:
+                entry[-1] = None
+                bucket.stale += 1
+        bucket.size -= 1
+        self._maybe_compact(bucket)
+    
+    def _resize(self, item: QueueItem):
+        """Re-key entry ukuran setelah expected_size diketahui"""
+        entries = self._entries.get(item.queue_id)
+        if not entries or entries[1] is None:
+            return
+        
+        bucket = self._buckets[self._bucket_key(item)]
+        old = entries[1]
+        old[-1] = None
+        bucket.stale += 1
+        
+        size_entry = [self._size_key(item), old[1], old[2], item.queue_id]
+        heapq.heappush(bucket.sizes[item.priority.value], size_entry)
+        entries[1] = size_entry
+        self._maybe_compact(bucket)
+    
+    def _maybe_compact(self, bucket: _Bucket):
+        """Buang entry stale sekaligus jika jumlahnya sudah dominan"""
+        if bucket.stale >= self.COMPACT_MIN and bucket.stale > (bucket.size + bucket.stale) * self.COMPACT_RATIO:
+            for heaps in (bucket.levels, bucket.sizes):
+                for level, heap in heaps.items():
+                    heap = [entry for entry in heap if entry[-1] is not None]
+                    heapq.heapify(heap)
+                    heaps[level] = heap
+            bucket.stale = 0
+    
+    def _effective_priority(self, level: int, waited: float) -> int:
+        """Priority setelah aging"""
+        if self.aging_seconds > 0:
+            level += int(waited // self.aging_seconds)
+        return min(level, QueuePriority.URGENT.value)
+    
+    @staticmethod
+    def _clean(heap: List[list], bucket: _Bucket):
+        """Buang entry stale di puncak heap"""
+        while heap and heap[0][-1] is None:
+            heapq.heappop(heap)
+            bucket.stale -= 1
+    
+    def _head(self, bucket: _Bucket, now: float):
+        """
+        Level priority berikutnya dari satu bucket
+        
+        Returns:
+            (priority efektif, level heap) atau None jika bucket kosong
+        """
+        best = None
+        best_key = None
+        
+        for level, heap in bucket.levels.items():
+            self._clean(heap, bucket)
+            if not heap:
+                continue
+            
+            item = self.items[heap[0][-1]]
+            effective = self._effective_priority(level, now - item.enqueued_at)
+            key = (effective, -item.sequence)
+            if best_key is None or key > best_key:
+                best_key = key
+                best = (effective, level)
+        
+        return best
+    
+    def _short_turn(self) -> bool:
+        """Apakah dispatch berikutnya mengambil item terkecil"""
+        return self.size_aware and self._short_credit + self.short_job_ratio >= 1
+    
+    def _choose(self, bucket: _Bucket, level: int, short: bool) -> list:
+        """Entry yang akan diambil dari level: terkecil (short turn) atau tertua"""
+        if short:
+            heap = bucket.sizes[level]
+            self._clean(heap, bucket)
+            if heap:
+                return heap[0]
+        return bucket.levels[level][0]
+    
+    def _peek(self) -> Optional[QueueItem]:
+        """Item yang akan keluar di _pop berikutnya, tanpa mengeluarkannya"""
+        now = time.monotonic()
+        short = self._short_turn()
+        fallback = None
+        
+        for key in self._ring:
+            bucket = self._buckets[key]
+            head = self._head(bucket, now)
+            if head is None:
+                continue
+            
+            item = self.items[self._choose(bucket, head[1], short)[-1]]
+            if bucket.deficit >= 1:
+                return item
+            if fallback is None:
+                fallback = item
+        
+        return fallback
+    
+    def _pop(self) -> Optional[QueueItem]:
+        """Keluarkan item berikutnya (deficit round-robin antar bucket)"""
+        now = time.monotonic()
+        
+        while self._ring:
+            key = self._ring[0]
+            bucket = self._buckets[key]
+            head = self._head(bucket, now)
+            
+            if head is None:
+                # Bucket kosong keluar dari ring dan kehilangan sisa kreditnya
+                self._ring.popleft()
+                del self._buckets[key]
+                continue
+            
+            effective, level = head
+            if bucket.deficit < 1:
+                bucket.deficit += self.priority_weights[effective]
+                self._ring.rotate(-1)
+                continue
+            
+            bucket.deficit -= 1
+            short = self._short_turn()
+            if self.size_aware:
+                self._short_credit = self._short_credit + self.short_job_ratio - (1 if short else 0)
+            
+            item = self.items[self._choose(bucket, level, short)[-1]]
+            self._invalidate(item.queue_id)
+            
+            self._record_wait(item, now)
+            return item
+        
+        return None
+    
+    def _record_wait(self, item: QueueItem, now: float):
+        """Catat berapa lama item menunggu sebelum dispatch"""
+        waited = max(0.0, now - item.enqueued_at)
+        stats = self.wait_stats.get(item.user_id)
+        if stats is None:
+            stats = self.wait_stats[item.user_id] = {
+                'dispatched': 0, 'total_wait': 0.0, 'max_wait': 0.0, 'last_wait': 0.0
+            }
+        stats['dispatched'] += 1
+        stats['total_wait'] += waited
+        stats['max_wait'] = max(stats['max_wait'], waited)
+        stats['last_wait'] = waited
+    
+    # ===== STATUS BOOKKEEPING =====
+    
+    def _count(self, item: QueueItem, delta: int):
+        """Update counter status item (global & per user)"""
+        self.status_counts[item.status] += delta
+        counts = self.user_status_counts.get(item.user_id)
+        if counts is None:
+            counts = self.user_status_counts[item.user_id] = Counter()
+        counts[item.status] += delta
+    
+    def _set_status(self, item: QueueItem, status: QueueStatus):
+        """Transisi status item live dengan counter tetap konsisten"""
+        self._count(item, -1)
+        item.status = status
+        self._count(item, 1)
+    
+    def _touch_listing(self, item: QueueItem):
+        """Invalidate listing terurut milik user item (dan listing global)"""
+        self._listing_version[item.user_id] += 1
+        self._listing_version[None] += 1
+    
+    def _listing(self, user_id: Optional[int]) -> List[QueueItem]:
+        """Item live terurut (priority DESC, urutan masuk), di-cache per versi"""
+        version = self._listing_version[user_id]
+        cached = self._listing_cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        live = self._user_items.get(user_id, {}).values() if user_id is not None else self.items.values()
+        listing = sorted(live, key=lambda x: (-x.priority.value, x.sequence))
+        self._listing_cache[user_id] = (version, listing)
+        return listing
+    
+    def _track(self, item: QueueItem):
+        """Daftarkan item baru ke index live & counter"""
+        self.items[item.queue_id] = item
+        self._user_items.setdefault(item.user_id, {})[item.queue_id] = item
+        self._count(item, 1)
+        self._touch_listing(item)
+    
+    def _untrack(self, item: QueueItem):
+        """Keluarkan item dari index live (counter diurus pemanggil)"""
+        del self.items[item.queue_id]
+        user_items = self._user_items.get(item.user_id)
+        if user_items is not None:
+            user_items.pop(item.queue_id, None)
+            if not user_items:
+                del self._user_items[item.user_id]
+                self._listing_cache.pop(item.user_id, None)
+        self._touch_listing(item)
+    
+    def _archive(self, item: QueueItem):
+        """Pindahkan item terminal ke ring item selesai"""
+        if len(self.finished) == self.finished.maxlen:
+            evicted = self.finished.popleft()
+            self._finished_index.pop(evicted.queue_id, None)
+        self.finished.append(item)
+        self._finished_index[item.queue_id] = item
+    
+    def _notify(self):
+        """Bangunkan dispatcher (add/resume/priority berubah/slot kosong)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    def _finish(self, item: QueueItem, status: QueueStatus, error_message: Optional[str] = None):
+        """Set status akhir item, pindahkan ke ring item selesai, bebaskan slot"""
+        if self.items.get(item.queue_id) is not item:
+            return
+        
+        self._invalidate(item.queue_id)
+        self._set_status(item, status)
+        item.completed_time = datetime.now()
+        if error_message is not None:
+            item.error_message = error_message
+        self._mark_dirty(item)
+        
+        self._untrack(item)
+        self._archive(item)
+        self._settle_batch(item)
+        
+        if self.active_downloads.pop(item.queue_id, None) is not None:
+            self._notify()
+    
+    # ===== SIZE PROBE =====
+    
+    def _schedule_probe(self, item: QueueItem):
+        """Pakai hasil probe dari cache, atau antrikan probe di background"""
+        if not self.size_aware:
+            return
+        
+        cached = self.probe_cache.get('probe', item.url)
+        if cached is not SettingsCache.MISSING:
+            self._apply_probe(item, cached)
+        elif self._probe_queue is not None:
+            self._probe_queue.put_nowait(item.queue_id)
+        else:
+            self._unprobed.append(item.queue_id)
+    
+    def _apply_probe(self, item: QueueItem, probe: Dict):
+        """Simpan hasil probe ke item dan perbarui posisinya di heap ukuran"""
+        item.expected_size = probe['size']
+        item.accepts_ranges = probe['accepts_ranges']
+        if item.status == QueueStatus.PENDING:
+            self._resize(item)
+    
+    async def probe_url(self, url: str) -> Dict:
+        """
+        Probe ukuran & dukungan Range untuk URL (hasil di-cache per URL)
+        
+        Returns:
+            Dict dengan 'size' (None jika tidak diketahui) dan 'accepts_ranges'
+        """
+        cached = self.probe_cache.get('probe', url)
+        if cached is not SettingsCache.MISSING:
+            return cached
+        
+        result = await self.link_validator.validate_link(url)
+        probe = {
+            'size': (result.get('file_size') or None) if result.get('valid') else None,
+            'accepts_ranges': bool(result.get('accepts_ranges'))
+        }
+        self.probe_cache.set('probe', url, probe)
+        return probe
+    
+    async def _probe_worker(self):
+        """Background worker: probe item pending sebelum di-dispatch"""
+        while self.processing:
+            queue_id = await self._probe_queue.get()
+            try:
+                item = self.items.get(queue_id)
+                if not item or item.status != QueueStatus.PENDING or item.expected_size is not None:
+                    continue
+                
+                probe = await self.probe_url(item.url)
+                self._apply_probe(item, probe)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"Probe failed for {queue_id}: {e}")
+            finally:
+                self._probe_queue.task_done()
+    
+    # ===== PERSISTENCE =====
+    
+    def _mark_dirty(self, item: QueueItem):
+        """Catat item untuk ditulis di batch berikutnya"""
+        if not self.db_manager:
+            return
+        self._dirty[item.queue_id] = item
+        self._removed.pop(item.queue_id, None)
+        if self._flush_wakeup is not None:
+            self._flush_wakeup.set()
+    
+    def _settle_batch(self, item: QueueItem):
+        """Catat status akhir item batch untuk di-update bersama flush berikutnya"""
+        if not self.db_manager or not item.batch_id:
+            return
+        if item.status == QueueStatus.COMPLETED:
+            filename = item.filename
+            if self.download_manager and item.download_id:
+                info = self.download_manager.completed_downloads.get(item.download_id) or {}
+                filename = info.get('filename') or filename
+            update = (item.batch_id, item.queue_id, 'completed', filename, None)
+        else:
+            update = (item.batch_id, item.queue_id, 'failed', None,
+                      item.error_message or item.status.value)
+        self._batch_updates.append(update)
+        if self._flush_wakeup is not None:
+            self._flush_wakeup.set()
+    
+    def _mark_removed(self, queue_id: str):
+        """Catat item yang dihapus untuk di-delete di batch berikutnya"""
+        if not self.db_manager:
+            return
+        self._dirty.pop(queue_id, None)
+        self._removed[queue_id] = None
+        if self._flush_wakeup is not None:
+            self._flush_wakeup.set()
+    
+    @staticmethod
+    def _to_row(item: QueueItem) -> dict:
+        """QueueItem -> dict untuk Database.save_queue_items"""
+        row = item.to_dict()
+        row['priority'] = item.priority.value
+        return row
+    
+    def _take_pending(self) -> Optional[tuple]:
+        """
+        Ambil snapshot perubahan pending di thread event loop
+        
+        Returns:
+            (generation, dirty, removed, batch_updates, rows) atau None jika kosong
+        """
+        if not self.db_manager or not (self._dirty or self._removed or self._batch_updates):
+            return None
+        
+        dirty, removed, batch_updates = self._dirty, self._removed, self._batch_updates
+        self._dirty, self._removed, self._batch_updates = {}, {}, []
+        self._flush_generation += 1
+        
+        # Row dibuat di sini: item hanya boleh dibaca dari thread event loop
+        rows = [self._to_row(item) for item in dirty.values()]
+        return self._flush_generation, dirty, removed, batch_updates, rows
+    
+    def _write_pending(self, snapshot: tuple):
+        """Tulis snapshot ke database (aman dijalankan di executor)"""
+        generation, _, removed, batch_updates, rows = snapshot
+        
+        with self._write_lock:
+            # Snapshot ini sudah digabung ke flush yang lebih baru (stop_processing)
+            if generation <= self._written_generation:
+                return
+            
+            self.db_manager.save_queue_items(rows, list(removed))
+            # Update ulang aman: counter batch dihitung dari transisi status lama -> baru
+            for update in batch_updates:
+                self.db_manager.update_batch_item_status(*update)
+            self._written_generation = generation
+    
+    def _requeue_pending(self, snapshot: tuple):
+        """Kembalikan snapshot ke antrian write tanpa menimpa perubahan yang lebih baru"""
+        _, dirty, removed, batch_updates, _ = snapshot
+        
+        for queue_id, item in dirty.items():
+            if queue_id not in self._removed:
+                self._dirty.setdefault(queue_id, item)
+        for queue_id in removed:
+            if queue_id not in self._dirty:
+                self._removed[queue_id] = None
+        self._batch_updates[:0] = batch_updates
+    
+    def flush(self) -> int:
+        """
+        Tulis semua perubahan pending ke database dalam satu transaction
+        (blocking; flusher di background memakai flush_async)
+        
+        Returns:
+            Jumlah item yang ditulis/dihapus
+        """
+        # Write di executor yang belum selesai ikut ditulis ulang di sini
+        if self._inflight is not None:
+            self._requeue_pending(self._inflight)
+            self._inflight = None
+        
+        snapshot = self._take_pending()
+        if snapshot is None:
+            return 0
+        
+        try:
+            self._write_pending(snapshot)
+        except Exception as e:
+            logger.error(f"Error saving queue: {e}")
+            self._requeue_pending(snapshot)
+            return 0
+        
+        return len(snapshot[1]) + len(snapshot[2]) + len(snapshot[3])
+    
+    async def flush_async(self) -> int:
+        """
+        Seperti flush, tapi write SQLite dijalankan di executor supaya
+        event loop (handler Telegram) tidak ter-block selama commit
+        
+        Returns:
+            Jumlah item yang ditulis/dihapus
+        """
+        snapshot = self._take_pending()
+        if snapshot is None:
+            return 0
+        
+        self._inflight = snapshot
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._write_pending, snapshot)
+        except Exception as e:
+            logger.error(f"Error saving queue: {e}")
+            if self._inflight is snapshot:
+                self._requeue_pending(snapshot)
+            return 0
+        finally:
+            if self._inflight is snapshot:
+                self._inflight = None
+        
+        return len(snapshot[1]) + len(snapshot[2]) + len(snapshot[3])
+    
+    async def _flush_loop(self):
+        """Background writer: kumpulkan perubahan selama flush_interval lalu tulis"""
+        while self.processing:
+            try:
+                await self._flush_wakeup.wait()
+                await asyncio.sleep(self.flush_interval)
+                self._flush_wakeup.clear()
+                await self.flush_async()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in queue flusher: {e}")
+                await asyncio.sleep(5)
+    
+    def restore(self) -> int:
+        """
+        Muat ulang item pending/paused/downloading dari database
+        
+        Heap dibangun sekali dengan heapify (O(n)), bukan push satu per satu.
+        
+        Returns:
+            Jumlah item yang dipulihkan
+        """
+        if not self.db_manager:
+            return 0
+        
+        rows = self.db_manager.load_open_queue_items()
+        touched = set()
+        interrupted = 0
+        now = time.monotonic()
+        now_wall = datetime.now()
+        
+        for row in rows:
+            queue_id = row['queue_id']
+            if queue_id in self.items:
+                continue
+            
+            try:
+                priority = QueuePriority(row['priority'])
+            except ValueError:
+                priority = QueuePriority.NORMAL
+            
+            item = QueueItem(
+                queue_id=queue_id,
+                user_id=row['user_id'],
+                url=row['url'],
+                filename=row['filename'],
+                priority=priority,
+                status=QueueStatus.PAUSED if row['status'] == 'paused' else QueueStatus.PENDING,
+                download_id=row['download_id'],
+                added_time=from_epoch_ms(row['added_time_ms']) or datetime.now(),
+                error_message=row['error_message'],
+                file_size=row['file_size'] or 0,
+                downloaded_size=row['downloaded_size'] or 0,
+                progress=row['progress'] or 0.0,
+                sequence=next(self._sequence),
+                download_dir=row['download_dir'],
+                batch_id=row.get('batch_id')
+            )
+            # Lama menunggu sebelum restart ikut dihitung untuk aging
+            item.enqueued_at = now - max(0.0, (now_wall - item.added_time).total_seconds())
+            self._track(item)
+            
+            # Download yang terputus saat bot mati: antri ulang
+            if row['status'] == 'downloading':
+                item.download_id = None
+                interrupted += 1
+                self._mark_dirty(item)
+            
+            if item.status == QueueStatus.PENDING:
+                bucket = self._get_bucket(item)
+                push_no = next(self._push_counter)
+                entry = [item.sequence, push_no, queue_id]
+                bucket.levels[priority.value].append(entry)
+                
+                size_entry = None
+                if self.size_aware:
+                    size_entry = [self._size_key(item), item.sequence, push_no, queue_id]
+                    bucket.sizes[priority.value].append(size_entry)
+                    self._unprobed.append(queue_id)
+                
+                self._entries[queue_id] = [entry, size_entry]
+                bucket.size += 1
+                touched.add(bucket)
+        
+        for bucket in touched:
+            for heaps in (bucket.levels, bucket.sizes):
+                for heap in heaps.values():
+                    heapq.heapify(heap)
+        
+        if rows:
+            logger.info(f"♻️ Restored {len(rows)} queue items ({interrupted} interrupted)")
+        return len(rows)
+    
+    # ===== PUBLIC API =====
     
     async def add_to_queue(self, user_id: int, url: str, filename: str, 
-                          priority: QueuePriority = QueuePriority.NORMAL) -> str:
+                          priority: QueuePriority = QueuePriority.NORMAL,
+                          download_dir: Optional[str] = None,
+                          progress_callback: Optional[Callable] = None,
+                          batch_id: Optional[str] = None,
+                          expected_size: Optional[int] = None,
+                          accepts_ranges: Optional[bool] = None) -> str:
         """
         Tambah item ke queue
         
@@ -95,34 +891,59 @@ class QueueManager:
             url: URL to download
             filename: Filename
             priority: Queue priority
+            download_dir: Folder tujuan (default: download_dir manager)
+            progress_callback: Diteruskan dari callback DownloadManager
+                (signature sama) setelah item di-dispatch
+            batch_id: Batch pemilik item; status item batch di-update saat
+                item selesai/gagal (ikut dipersist, tetap jalan setelah restart)
+            expected_size: Ukuran dari validasi sebelumnya (mis. LinkValidator di
+                handler); jika diisi, item tidak di-probe ulang
+            accepts_ranges: Dukungan Range dari validasi yang sama
             
         Returns:
             Queue ID
         """
-        async with self.queue_lock:
-            # Generate queue ID
-            import uuid
+        # Generate queue ID
+        queue_id = str(uuid.uuid4())[:8]
+        while queue_id in self.items:
             queue_id = str(uuid.uuid4())[:8]
-            
-            # Create queue item
-            item = QueueItem(
-                queue_id=queue_id,
-                user_id=user_id,
-                url=url,
-                filename=filename,
-                priority=priority,
-                status=QueueStatus.PENDING
-            )
-            
-            # Add to queue
-            self.queue.append(item)
-            
-            # Sort by priority (highest first)
-            self.queue.sort(key=lambda x: x.priority.value, reverse=True)
-            
-            logger.info(f"➕ Added to queue: {filename} (priority: {priority.name})")
-            
-            return queue_id
+        
+        # Create queue item
+        item = QueueItem(
+            queue_id=queue_id,
+            user_id=user_id,
+            url=url,
+            filename=filename,
+            priority=priority,
+            status=QueueStatus.PENDING,
+            sequence=next(self._sequence),
+            download_dir=download_dir,
+            progress_callback=progress_callback,
+            batch_id=batch_id
+        )
+        
+        if expected_size:
+            # Sudah divalidasi pemanggil: pakai hasilnya, tanpa round-trip probe kedua
+            probe = {'size': expected_size, 'accepts_ranges': bool(accepts_ranges)}
+            item.expected_size = probe['size']
+            item.accepts_ranges = probe['accepts_ranges']
+            if self.size_aware:
+                self.probe_cache.set('probe', url, probe)
+        
+        self._track(item)
+        self._push(item)
+        if item.expected_size is None:
+            self._schedule_probe(item)
+        self._mark_dirty(item)
+        self._notify()
+        
+        logger.info(f"➕ Added to queue: {filename} (priority: {priority.name})")
+        
+        return queue_id
+    
+    def get_item(self, queue_id: str) -> Optional[QueueItem]:
+        """Lookup item berdasarkan queue_id (O(1)), termasuk item yang baru selesai"""
+        return self.items.get(queue_id) or self._finished_index.get(queue_id)
     
     async def remove_from_queue(self, queue_id: str) -> bool:
         """
@@ -134,18 +955,23 @@ class QueueManager:
         Returns:
             True jika berhasil
         """
-        async with self.queue_lock:
-            for i, item in enumerate(self.queue):
-                if item.queue_id == queue_id:
-                    if item.status == QueueStatus.DOWNLOADING:
-                        logger.warning(f"Cannot remove active download: {queue_id}")
-                        return False
-                    
-                    self.queue.pop(i)
-                    logger.info(f"🗑️ Removed from queue: {item.filename}")
-                    return True
-            
+        item = self.items.get(queue_id)
+        if not item:
+            return False
+        
+        if item.status == QueueStatus.DOWNLOADING:
+            logger.warning(f"Cannot remove active download: {queue_id}")
             return False
+        
+        self._invalidate(queue_id)
+        self._count(item, -1)
+        self._untrack(item)
+        self._mark_removed(queue_id)
+        self._discard_partial(item)
+        item.error_message = 'Removed from queue'
+        self._settle_batch(item)
+        logger.info(f"🗑️ Removed from queue: {item.filename}")
+        return True
     
     async def pause_item(self, queue_id: str) -> bool:
         """
@@ -157,18 +983,29 @@ class QueueManager:
         Returns:
             True jika berhasil
         """
-        async with self.queue_lock:
-            for item in self.queue:
-                if item.queue_id == queue_id:
-                    if item.status == QueueStatus.DOWNLOADING:
-                        item.status = QueueStatus.PAUSED
-                        logger.info(f"⏸️ Paused: {item.filename}")
-                        return True
-                    elif item.status == QueueStatus.PENDING:
-                        item.status = QueueStatus.PAUSED
-                        return True
-            
+        item = self.items.get(queue_id)
+        if not item:
             return False
+        
+        if item.status == QueueStatus.DOWNLOADING:
+            self._set_status(item, QueueStatus.PAUSED)
+            self.active_downloads.pop(queue_id, None)
+            
+            # Hentikan download yang sedang berjalan; resume akan mengantri ulang
+            if self.download_manager and item.download_id:
+                self.download_manager.cancel_download(item.download_id)
+            
+            self._mark_dirty(item)
+            self._notify()
+            logger.info(f"⏸️ Paused: {item.filename}")
+            return True
+        elif item.status == QueueStatus.PENDING:
+            self._set_status(item, QueueStatus.PAUSED)
+            self._invalidate(queue_id)
+            self._mark_dirty(item)
+            return True
+        
+        return False
     
     async def resume_item(self, queue_id: str) -> bool:
         """
@@ -180,19 +1017,26 @@ class QueueManager:
         Returns:
             True jika berhasil
         """
-        async with self.queue_lock:
-            for item in self.queue:
-                if item.queue_id == queue_id and item.status == QueueStatus.PAUSED:
-                    item.status = QueueStatus.PENDING
-                    logger.info(f"▶️ Resumed: {item.filename}")
-                    return True
-            
-            return False
+        item = self.items.get(queue_id)
+        if item and item.status == QueueStatus.PAUSED:
+            self._set_status(item, QueueStatus.PENDING)
+            self._push(item)
+            if item.expected_size is None:
+                self._schedule_probe(item)
+            self._mark_dirty(item)
+            self._notify()
+            logger.info(f"▶️ Resumed: {item.filename}")
+            return True
+        
+        return False
     
     async def change_priority(self, queue_id: str, new_priority: QueuePriority) -> bool:
         """
         Ubah priority item dalam queue
         
+        Item tetap memakai sequence dan waktu tunggu awalnya, jadi posisinya
+        di priority baru sesuai urutan kapan item itu ditambahkan.
+        
         Args:
             queue_id: Queue ID
             new_priority: New priority level
@@ -200,60 +1044,136 @@ class QueueManager:
         Returns:
             True jika berhasil
         """
-        async with self.queue_lock:
-            for item in self.queue:
-                if item.queue_id == queue_id:
-                    old_priority = item.priority
-                    item.priority = new_priority
-                    
-                    # Re-sort queue
-                    self.queue.sort(key=lambda x: x.priority.value, reverse=True)
-                    
-                    logger.info(f"🔄 Priority changed: {item.filename} ({old_priority.name} → {new_priority.name})")
-                    return True
-            
+        item = self.items.get(queue_id)
+        if not item:
             return False
+        
+        old_priority = item.priority
+        item.priority = new_priority
+        self._touch_listing(item)
+        self._mark_dirty(item)
+        
+        # Re-push entry pending dengan key baru (entry lama jadi stale)
+        if item.status == QueueStatus.PENDING and old_priority != new_priority:
+            self._push(item, reset_wait=False)
+            self._notify()
+        
+        logger.info(f"🔄 Priority changed: {item.filename} ({old_priority.name} → {new_priority.name})")
+        return True
     
-    async def get_queue_status(self, user_id: Optional[int] = None) -> Dict:
+    async def get_queue_status(self, user_id: Optional[int] = None, offset: int = 0,
+                               limit: int = 10) -> Dict:
         """
         Get queue status
         
+        Counter diambil langsung (O(1)) dan hanya satu halaman item yang
+        diserialisasi. Listing terurut (priority, lalu urutan masuk) di-cache
+        dan hanya di-sort ulang setelah isi queue atau priority berubah.
+        
         Args:
             user_id: Filter by user ID (optional)
-            
+            offset: Posisi awal halaman item live
+            limit: Jumlah item per halaman (juga batas item 'recent')
+        
         Returns:
-            Queue status dictionary
+            Queue status dictionary (items = halaman item live, recent = item
+            selesai terbaru, next_offset = None jika tidak ada halaman lagi)
         """
-        async with self.queue_lock:
-            queue_items = self.queue
-            if user_id:
-                queue_items = [item for item in queue_items if item.user_id == user_id]
-            
-            return {
-                'total': len(queue_items),
-                'pending': sum(1 for item in queue_items if item.status == QueueStatus.PENDING),
-                'downloading': sum(1 for item in queue_items if item.status == QueueStatus.DOWNLOADING),
-                'paused': sum(1 for item in queue_items if item.status == QueueStatus.PAUSED),
-                'completed': sum(1 for item in queue_items if item.status == QueueStatus.COMPLETED),
-                'failed': sum(1 for item in queue_items if item.status == QueueStatus.FAILED),
-                'active_slots': len(self.active_downloads),
-                'max_concurrent': self.max_concurrent,
-                'items': [item.to_dict() for item in queue_items]
+        if user_id:
+            counts = self.user_status_counts.get(user_id, Counter())
+        else:
+            counts = self.status_counts
+        
+        offset = max(0, offset)
+        listing = self._listing(user_id or None)
+        page = listing[offset:offset + limit]
+        has_more = len(listing) > offset + limit
+        
+        recent = []
+        for item in reversed(self.finished):
+            if len(recent) >= limit:
+                break
+            if not user_id or item.user_id == user_id:
+                recent.append(item.to_dict())
+        
+        pending = counts[QueueStatus.PENDING]
+        downloading = counts[QueueStatus.DOWNLOADING]
+        paused = counts[QueueStatus.PAUSED]
+        
+        return {
+            'total': pending + downloading + paused,
+            'pending': pending,
+            'downloading': downloading,
+            'paused': paused,
+            'completed': counts[QueueStatus.COMPLETED],
+            'failed': counts[QueueStatus.FAILED],
+            'cancelled': counts[QueueStatus.CANCELLED],
+            'active_slots': len(self.active_downloads),
+            'max_concurrent': self.max_concurrent,
+            'wait': self.get_wait_metrics(user_id) if user_id else None,
+            'items': [item.to_dict() for item in page],
+            'next_offset': offset + limit if has_more else None,
+            'recent': recent
+        }
+
+    def get_wait_metrics(self, user_id: Optional[int] = None) -> Dict:
+        """
+        Wait-time metrics per user (detik)
+        
+        Args:
+            user_id: Filter by user ID (optional)
+        
+        Returns:
+            Dict metrics satu user, atau dict {user_id: metrics} untuk semua user.
+            Metrics: dispatched, avg_wait, max_wait, last_wait, pending, oldest_wait
+        """
+        now = time.monotonic()
+        pending: Dict[int, List[float]] = {}
+        
+        if user_id is not None and self.fair_share:
+            # Item tertua user ada di salah satu head heap level bucket-nya
+            bucket = self._buckets.get(user_id)
+            oldest = 0.0
+            if bucket is not None:
+                for heap in bucket.levels.values():
+                    self._clean(heap, bucket)
+                    if heap:
+                        oldest = max(oldest, now - self.items[heap[0][-1]].enqueued_at)
+            counts = self.user_status_counts.get(user_id, Counter())
+            pending[user_id] = [counts[QueueStatus.PENDING], oldest]
+        else:
+            live = self._user_items.get(user_id, {}).values() if user_id is not None else self.items.values()
+            for item in live:
+                if item.status == QueueStatus.PENDING:
+                    waiting = pending.setdefault(item.user_id, [0, 0.0])
+                    waiting[0] += 1
+                    waiting[1] = max(waiting[1], now - item.enqueued_at)
+        
+        user_ids = [user_id] if user_id is not None else set(self.wait_stats) | set(pending)
+        metrics = {}
+        for uid in user_ids:
+            stats = self.wait_stats.get(uid, {})
+            dispatched = stats.get('dispatched', 0)
+            count, oldest = pending.get(uid, (0, 0.0))
+            metrics[uid] = {
+                'dispatched': dispatched,
+                'avg_wait': stats['total_wait'] / dispatched if dispatched else 0.0,
+                'max_wait': stats.get('max_wait', 0.0),
+                'last_wait': stats.get('last_wait', 0.0),
+                'pending': count,
+                'oldest_wait': oldest
             }
+        
+        return metrics[user_id] if user_id is not None else metrics
     
     async def get_next_item(self) -> Optional[QueueItem]:
         """
-        Get next item untuk diproses (berdasarkan priority)
+        Get next item untuk diproses (round-robin antar user, berdasarkan priority)
         
         Returns:
             Next queue item atau None
         """
-        async with self.queue_lock:
-            for item in self.queue:
-                if item.status == QueueStatus.PENDING:
-                    return item
-            
-            return None
+        return self._peek()
     
     async def update_progress(self, queue_id: str, downloaded_size: int, 
                              total_size: int, progress: float):
@@ -266,81 +1186,316 @@ class QueueManager:
             total_size: Total file size
             progress: Progress percentage
         """
-        async with self.queue_lock:
-            for item in self.queue:
-                if item.queue_id == queue_id:
-                    item.downloaded_size = downloaded_size
-                    item.file_size = total_size
-                    item.progress = progress
-                    break
+        item = self.items.get(queue_id)
+        if item:
+            item.downloaded_size = downloaded_size
+            item.file_size = total_size
+            item.progress = progress
+            self._mark_dirty(item)
     
     async def mark_completed(self, queue_id: str, download_id: str):
         """Mark item as completed"""
-        async with self.queue_lock:
-            for item in self.queue:
-                if item.queue_id == queue_id:
-                    item.status = QueueStatus.COMPLETED
-                    item.download_id = download_id
-                    item.completed_time = datetime.now()
-                    
-                    # Remove from active
-                    if queue_id in self.active_downloads:
-                        del self.active_downloads[queue_id]
-                    
-                    logger.info(f"✅ Completed: {item.filename}")
-                    break
+        item = self.items.get(queue_id)
+        if not item:
+            return
+        
+        item.download_id = download_id
+        self._finish(item, QueueStatus.COMPLETED)
+        
+        logger.info(f"✅ Completed: {item.filename}")
     
     async def mark_failed(self, queue_id: str, error_message: str):
         """Mark item as failed"""
-        async with self.queue_lock:
-            for item in self.queue:
-                if item.queue_id == queue_id:
-                    item.status = QueueStatus.FAILED
-                    item.error_message = error_message
-                    item.completed_time = datetime.now()
-                    
-                    # Remove from active
-                    if queue_id in self.active_downloads:
-                        del self.active_downloads[queue_id]
-                    
-                    logger.error(f"❌ Failed: {item.filename} - {error_message}")
-                    break
+        item = self.items.get(queue_id)
+        if not item:
+            return
+        
+        self._finish(item, QueueStatus.FAILED, error_message)
+        
+        logger.error(f"❌ Failed: {item.filename} - {error_message}")
     
     def start_processing(self):
-        """Start queue processor"""
+        """Start queue processor (restore dari database pada start pertama)"""
         if not self.processing:
+            if not self._restored:
+                self.restore()
+                self._restored = True
+            
             self.processing = True
+            self._wakeup = asyncio.Event()
+            self._flush_wakeup = asyncio.Event()
             self.processor_task = asyncio.create_task(self._process_queue())
+            
+            if self.db_manager:
+                self.flush_task = asyncio.create_task(self._flush_loop())
+                if self._dirty or self._removed:
+                    self._flush_wakeup.set()
+            
+            if self.size_aware:
+                self._probe_queue = asyncio.Queue()
+                for queue_id in self._unprobed:
+                    self._probe_queue.put_nowait(queue_id)
+                self._unprobed = []
+                self.probe_tasks = [
+                    asyncio.create_task(self._probe_worker())
+                    for _ in range(self.probe_concurrency)
+                ]
+            
             logger.info("🚀 Queue processor started")
     
     def stop_processing(self):
-        """Stop queue processor"""
+        """Stop queue processor dan tulis perubahan yang tersisa"""
         self.processing = False
-        if self.processor_task:
-            self.processor_task.cancel()
-            logger.info("🛑 Queue processor stopped")
+        for task in (self.processor_task, self.flush_task, *self.probe_tasks):
+            if task:
+                task.cancel()
+        self.processor_task = None
+        self.flush_task = None
+        self.probe_tasks = []
+        
+        # Probe yang belum jalan diantrikan lagi saat start berikutnya
+        if self._probe_queue is not None:
+            while not self._probe_queue.empty():
+                self._unprobed.append(self._probe_queue.get_nowait())
+            self._probe_queue = None
+        
+        self.flush()
+        logger.info("🛑 Queue processor stopped")
     
     async def _process_queue(self):
-        """Background queue processor"""
+        """Background queue processor (event-driven, tanpa polling)"""
         while self.processing:
             try:
-                # Check if ada slot available
-                if len(self.active_downloads) < self.max_concurrent:
-                    # Get next item
-                    next_item = await self.get_next_item()
-                    
-                    if next_item:
-                        # Mark as downloading
-                        async with self.queue_lock:
-                            next_item.status = QueueStatus.DOWNLOADING
-                            next_item.started_time = datetime.now()
-                            self.active_downloads[next_item.queue_id] = next_item
-                        
-                        logger.info(f"🔄 Processing: {next_item.filename}")
+                # Clear sebelum dispatch: notify yang terjadi selama dispatch
+                # (termasuk saat await start_download) tidak akan hilang
+                self._wakeup.clear()
+                
+                # Isi semua slot yang kosong
+                while len(self.active_downloads) < self.max_concurrent:
+                    next_item = self._pop()
+                    if not next_item:
+                        break
+                    await self._dispatch(next_item)
                 
-                # Wait sebelum check lagi
-                await asyncio.sleep(1)
+                # Slot penuh: item priority tinggi boleh menggeser download priority rendah
+                retry_in = await self._preempt() if self.preemption else None
                 
+                if retry_in is None:
+                    await self._wakeup.wait()
+                else:
+                    # Victim belum cukup lama berjalan: coba lagi setelah retry_in detik
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), retry_in)
+                    except asyncio.TimeoutError:
+                        pass
+                
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in queue processor: {e}")
                 await asyncio.sleep(5)
+    
+    async def _dispatch(self, item: QueueItem):
+        """Tandai item sebagai downloading, pakai satu slot, dan mulai download"""
+        self._set_status(item, QueueStatus.DOWNLOADING)
+        item.started_time = datetime.now()
+        self.active_downloads[item.queue_id] = item
+        self._mark_dirty(item)
+        
+        logger.info(f"🔄 Processing: {item.filename}")
+        await self._start_download(item)
+    
+    # ===== PREEMPTION =====
+    
+    def _preempt_candidate(self) -> Optional[QueueItem]:
+        """
+        Item pending dengan priority dasar tertinggi (>= preempt_priority)
+        
+        Aging sengaja tidak dihitung: hanya priority yang diminta user yang
+        boleh men-suspend download lain.
+        """
+        best = None
+        best_key = None
+        threshold = self.preempt_priority.value
+        
+        for bucket in self._buckets.values():
+            for level in range(QueuePriority.URGENT.value, threshold - 1, -1):
+                heap = bucket.levels[level]
+                self._clean(heap, bucket)
+                if heap:
+                    key = (level, -heap[0][0])
+                    if best_key is None or key > best_key:
+                        best_key = key
+                        best = heap[0][-1]
+                    break
+        
+        return self.items[best] if best is not None else None
+    
+    def _preempt_victim(self, priority: QueuePriority):
+        """
+        Download aktif yang boleh di-suspend untuk item dengan priority ini
+        
+        Returns:
+            (victim atau None, detik sampai victim berikutnya boleh di-suspend
+            atau None jika tidak ada yang sedang ditahan min runtime)
+        """
+        now = datetime.now()
+        victim = None
+        victim_key = None
+        retry_in = None
+        
+        for item in self.active_downloads.values():
+            if (item.priority.value >= priority.value
+                    or item.preempt_count >= self.preempt_max_count
+                    or not item.download_id
+                    or item.accepts_ranges is False
+                    or item.progress >= self.PREEMPT_SKIP_PROGRESS):
+                continue
+            
+            ran = (now - item.started_time).total_seconds() if item.started_time else 0.0
+            if ran < self.preempt_min_runtime:
+                remaining = self.preempt_min_runtime - ran
+                retry_in = remaining if retry_in is None else min(retry_in, remaining)
+                continue
+            
+            # Priority terendah dulu, lalu yang paling baru (re)start
+            key = (item.priority.value, ran)
+            if victim_key is None or key < victim_key:
+                victim_key = key
+                victim = item
+        
+        return victim, retry_in
+    
+    async def _preempt(self) -> Optional[float]:
+        """
+        Suspend download priority rendah untuk item pending priority tinggi
+        
+        Returns:
+            Detik sampai preemption bisa dicoba lagi, atau None jika tidak ada
+            yang menunggu
+        """
+        if not self.download_manager:
+            return None
+        
+        while len(self.active_downloads) >= self.max_concurrent:
+            item = self._preempt_candidate()
+            if item is None:
+                return None
+            
+            victim, retry_in = self._preempt_victim(item.priority)
+            if victim is None:
+                return retry_in
+            
+            # Klaim item dulu supaya tidak diambil dispatch lain selama await
+            self._invalidate(item.queue_id)
+            self._record_wait(item, time.monotonic())
+            
+            logger.info(f"⏫ Preempting {victim.filename} ({victim.priority.name}) "
+                        f"for {item.filename} ({item.priority.name})")
+            await self._suspend(victim)
+            
+            # Item bisa dihapus/di-pause selama await: jangan dispatch, slot
+            # victim yang sudah kosong diisi dispatcher dengan item lain
+            if self.items.get(item.queue_id) is not item or item.status != QueueStatus.PENDING:
+                self._notify()
+                continue
+            
+            # resume_item/change_priority selama await bisa push item lagi ke heap
+            self._invalidate(item.queue_id)
+            await self._dispatch(item)
+        
+        return None
+    
+    async def _suspend(self, item: QueueItem):
+        """Hentikan download aktif dengan file parsial disimpan, lalu antri ulang"""
+        self.active_downloads.pop(item.queue_id, None)
+        self._set_status(item, QueueStatus.PENDING)
+        item.preempt_count += 1
+        
+        resume_state = await self.download_manager.suspend_download(item.download_id)
+        if resume_state:
+            item.resume_state = resume_state
+            item.downloaded_size = resume_state['downloaded_size']
+        
+        # Item bisa dihapus/di-pause selama await
+        if self.items.get(item.queue_id) is not item:
+            self._discard_partial(item)
+            return
+        if item.status == QueueStatus.PENDING:
+            self._push(item)
+        self._mark_dirty(item)
+    
+    def _discard_partial(self, item: QueueItem):
+        """Hapus file parsial item yang di-suspend tapi tidak akan dilanjutkan"""
+        if item.resume_state and self.download_manager:
+            self.download_manager.discard_suspended(item.resume_state['download_id'])
+        item.resume_state = None
+    
+    async def _start_download(self, item: QueueItem):
+        """Jalankan item lewat DownloadManager dan sambungkan callback-nya"""
+        if not self.download_manager:
+            return
+        
+        queue_id = item.queue_id
+        
+        async def progress_callback(download_id, progress, downloaded, total, speed,
+                                    completed=False, failed=False, error=None):
+            if self.items.get(queue_id) is not item or item.download_id != download_id:
+                return
+            if failed:
+                await self.mark_failed(queue_id, error or 'Download failed')
+            else:
+                await self.update_progress(queue_id, downloaded, total, progress)
+                if completed:
+                    await self.mark_completed(queue_id, download_id)
+            
+            await self._forward_progress(item, download_id, progress, downloaded, total, speed,
+                                         completed=completed, failed=failed, error=error)
+        
+        try:
+            download_id = await self.download_manager.start_download(
+                item.url,
+                item.download_dir or self.download_dir,
+                item.user_id,
+                progress_callback=progress_callback,
+                resume_from=item.resume_state
+            )
+        except Exception as e:
+            logger.error(f"Failed to start {item.filename}: {e}")
+            self._finish(item, QueueStatus.FAILED, str(e))
+            await self._forward_progress(item, queue_id, 0, 0, 0, 0, failed=True, error=str(e))
+            return
+        
+        item.resume_state = None
+        item.download_id = download_id
+        self._mark_dirty(item)
+        
+        # Fallback: task selesai tanpa callback (cancel, error di luar retry loop)
+        task = self.download_manager.download_tasks.get(download_id)
+        if task:
+            task.add_done_callback(lambda t: self._on_download_done(item, download_id, t))
+    
+    async def _forward_progress(self, item: QueueItem, download_id: str, *args, **kwargs):
+        """Teruskan event progress ke callback pemilik item (handler Telegram, batch)"""
+        if not item.progress_callback:
+            return
+        try:
+            await item.progress_callback(download_id, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Progress callback error for {item.queue_id}: {e}")
+    
+    def _on_download_done(self, item: QueueItem, download_id: str, task: asyncio.Task):
+        """Pastikan slot dibebaskan saat task download berakhir"""
+        if item.status != QueueStatus.DOWNLOADING or item.download_id != download_id:
+            return
+        # download_id dipakai lagi saat item yang di-suspend dilanjutkan
+        if self.download_manager.download_tasks.get(download_id, task) is not task:
+            return
+        
+        if task.cancelled():
+            self._finish(item, QueueStatus.CANCELLED)
+        elif download_id in self.download_manager.completed_downloads:
+            self._finish(item, QueueStatus.COMPLETED)
+        else:
+            error = task.exception()
+            self._finish(item, QueueStatus.FAILED, str(error) if error else 'Download ended unexpectedly')
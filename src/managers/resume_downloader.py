@@ -3,9 +3,12 @@ Resume Download Manager
 Handle interrupted downloads dengan Range requests
 """
 import os
+import re
 import json
+import time
+import asyncio
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 import aiofiles
 import aiohttp
@@ -14,24 +17,59 @@ logger = logging.getLogger(__name__)
 
 
 class DownloadState:
-    """Track download state untuk resume capability"""
+    """
+    Track download state untuk resume capability
     
-    def __init__(self, state_dir: str = "downloads/.state"):
+    State disimpan di tabel resume_journal (Database), satu row per download:
+    URL, filepath, segment map (byte range [start, end) yang sudah tersimpan)
+    dan validator (ETag/Last-Modified). save_state hanya meng-update state di
+    memory; state yang berubah ditulis sekaligus dalam satu transaction paling
+    sering setiap flush_interval detik, jadi biaya checkpoint tetap datar
+    berapapun jumlah download yang berjalan. clear_state dan checkpoint saat
+    error langsung di-flush.
+    
+    File JSON per-download dari versi lama (state_dir) diimpor ke journal
+    sekali saat init lalu dihapus.
+    """
+    
+    def __init__(self, db_manager, state_dir: Optional[str] = None,
+                 flush_interval: float = 1.0):
         """
         Initialize download state manager
         
         Args:
-            state_dir: Directory untuk simpan state files
+            db_manager: Database tempat resume_journal
+            state_dir: Directory state file JSON lama untuk diimpor (optional)
+            flush_interval: Jeda minimal (detik) antar batch write checkpoint
         """
-        self.state_dir = state_dir
-        os.makedirs(state_dir, exist_ok=True)
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self._states: Dict[str, Dict] = {}     # Download sesi ini, dibuang saat clear_state
+        self._dirty: Dict[str, None] = {}
+        self._removed: Dict[str, None] = {}
+        self._last_flush = time.monotonic()
+        
+        if state_dir:
+            self._import_legacy(state_dir)
     
-    def get_state_path(self, download_id: str) -> str:
-        """Get path ke state file"""
-        return os.path.join(self.state_dir, f"{download_id}.json")
+    @staticmethod
+    def merge_segments(segments: List[List[int]]) -> List[List[int]]:
+        """Gabungkan byte range yang overlap/bersambung, urut dari offset terkecil"""
+        merged: List[List[int]] = []
+        for start, end in sorted(segments):
+            if end <= start:
+                continue
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
     
     def save_state(self, download_id: str, url: str, filepath: str, 
-                   downloaded_bytes: int, total_bytes: int):
+                   downloaded_bytes: int, total_bytes: int,
+                   segments: Optional[List[List[int]]] = None,
+                   etag: Optional[str] = None, last_modified: Optional[str] = None,
+                   flush: bool = False):
         """
         Save download state
         
@@ -41,27 +79,92 @@ class DownloadState:
             filepath: Target filepath
             downloaded_bytes: Bytes already downloaded
             total_bytes: Total file size
+            segments: Byte range yang sudah tersimpan (default [0, downloaded_bytes])
+            etag: ETag dari server (default: nilai sebelumnya)
+            last_modified: Last-Modified dari server (default: nilai sebelumnya)
+            flush: Tulis ke journal sekarang (tanpa menunggu flush_interval)
         """
-        state = {
+        if segments is None:
+            segments = [[0, downloaded_bytes]] if downloaded_bytes > 0 else []
+        else:
+            segments = self.merge_segments(segments)
+            downloaded_bytes = sum(end - start for start, end in segments)
+        
+        # Checkpoint pertama setelah restart: validator lama ada di journal
+        previous = self._states.get(download_id) or self._get(download_id) or {}
+        self._states[download_id] = {
             'download_id': download_id,
             'url': url,
             'filepath': filepath,
             'downloaded_bytes': downloaded_bytes,
             'total_bytes': total_bytes,
-            'timestamp': datetime.now().isoformat(),
-            'resume_supported': True
+            'segments': segments,
+            'etag': etag if etag is not None else previous.get('etag'),
+            'last_modified': last_modified if last_modified is not None else previous.get('last_modified'),
+            'resume_supported': True,
+            'updated_time': datetime.now().isoformat()
         }
+        self._dirty[download_id] = None
+        self._removed.pop(download_id, None)
         
-        state_path = self.get_state_path(download_id)
+        if flush or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self) -> int:
+        """
+        Tulis semua checkpoint yang berubah dalam satu transaction
         
-        try:
-            with open(state_path, 'w') as f:
-                json.dump(state, f, indent=2)
-            
-            logger.info(f"Download state saved: {download_id} ({downloaded_bytes}/{total_bytes} bytes)")
+        Returns:
+            Jumlah state yang ditulis/dihapus
+        """
+        self._last_flush = time.monotonic()
+        if not (self._dirty or self._removed):
+            return 0
+        
+        dirty, removed = self._dirty, self._removed
+        self._dirty, self._removed = {}, {}
         
+        try:
+            self.db_manager.save_resume_states(
+                [self._states[download_id] for download_id in dirty if download_id in self._states],
+                list(removed)
+            )
         except Exception as e:
             logger.error(f"Error saving download state: {e}")
+            for download_id in dirty:
+                if download_id not in self._removed:
+                    self._dirty[download_id] = None
+            for download_id in removed:
+                if download_id not in self._dirty:
+                    self._removed[download_id] = None
+            return 0
+        
+        return len(dirty) + len(removed)
+    
+    def _get(self, download_id: str) -> Optional[Dict]:
+        """State terbaru: versi di memory (download sesi ini) atau dari journal"""
+        if download_id in self._removed:
+            return None
+        state = self._states.get(download_id)
+        if state is not None:
+            return dict(state)
+        return self.db_manager.get_resume_state(download_id)
+    
+    @staticmethod
+    def _verify(state: Dict) -> Optional[Dict]:
+        """Tambahkan actual_file_size, atau None jika file parsial sudah hilang"""
+        filepath = state.get('filepath')
+        try:
+            state['actual_file_size'] = os.stat(filepath).st_size if filepath else None
+        except OSError:
+            state['actual_file_size'] = None
+        
+        if state['actual_file_size'] is None:
+            logger.warning(f"Resume state exists but download file missing: {filepath}")
+            return None
+        
+        state['timestamp'] = state.get('updated_time')
+        return state
     
     def load_state(self, download_id: str) -> Optional[Dict]:
         """
@@ -73,26 +176,15 @@ class DownloadState:
         Returns:
             State dictionary atau None
         """
-        state_path = self.get_state_path(download_id)
-        
-        if not os.path.exists(state_path):
-            return None
-        
         try:
-            with open(state_path, 'r') as f:
-                state = json.load(f)
-            
-            # Verify partial file exists
-            filepath = state.get('filepath')
-            if filepath and os.path.exists(filepath):
-                actual_size = os.path.getsize(filepath)
-                state['actual_file_size'] = actual_size
-                
-                logger.info(f"Download state loaded: {download_id} ({actual_size} bytes on disk)")
-                return state
-            else:
-                logger.warning(f"State file exists but download file missing: {filepath}")
+            state = self._get(download_id)
+            if not state:
                 return None
+            
+            state = self._verify(state)
+            if state:
+                logger.info(f"Download state loaded: {download_id} ({state['actual_file_size']} bytes on disk)")
+            return state
         
         except Exception as e:
             logger.error(f"Error loading download state: {e}")
@@ -100,45 +192,73 @@ class DownloadState:
     
     def clear_state(self, download_id: str):
         """Clear download state after completion"""
-        state_path = self.get_state_path(download_id)
-        
-        try:
-            if os.path.exists(state_path):
-                os.remove(state_path)
-                logger.info(f"Download state cleared: {download_id}")
-        except Exception as e:
-            logger.error(f"Error clearing download state: {e}")
+        self._states.pop(download_id, None)
+        self._dirty.pop(download_id, None)
+        self._removed[download_id] = None
+        self.flush()
+        logger.info(f"Download state cleared: {download_id}")
     
     def get_all_incomplete_downloads(self) -> list:
-        """Get all incomplete downloads yang bisa di-resume"""
+        """Get all incomplete downloads yang bisa di-resume (satu query ke journal)"""
         incomplete = []
         
         try:
-            for filename in os.listdir(self.state_dir):
-                if filename.endswith('.json'):
-                    download_id = filename[:-5]  # Remove .json
-                    state = self.load_state(download_id)
-                    
-                    if state:
-                        incomplete.append(state)
+            self.flush()
+            for state in self.db_manager.get_resume_states():
+                state = self._verify(state)
+                if state:
+                    incomplete.append(state)
         
         except Exception as e:
             logger.error(f"Error getting incomplete downloads: {e}")
         
         return incomplete
+    
+    def _import_legacy(self, state_dir: str):
+        """Impor state file JSON versi lama ke journal (sekali), lalu hapus file-nya"""
+        if not os.path.isdir(state_dir):
+            return
+        
+        imported = []
+        for filename in os.listdir(state_dir):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(state_dir, filename)
+            try:
+                with open(path, 'r') as f:
+                    state = json.load(f)
+                self.save_state(state['download_id'], state['url'], state['filepath'],
+                                state.get('downloaded_bytes', 0), state.get('total_bytes', 0))
+                imported.append(path)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable state file {filename}: {e}")
+        
+        if imported and self.flush():
+            for path in imported:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            logger.info(f"♻️ Imported {len(imported)} legacy resume state files")
 
 
 class ResumableDownloader:
     """Downloader dengan resume capability menggunakan Range requests"""
     
-    def __init__(self, state_manager: DownloadState):
+    def __init__(self, state_manager: DownloadState, save_interval: int = 1048576,
+                 verify_overlap: int = 16384):
         """
         Initialize resumable downloader
         
         Args:
             state_manager: DownloadState instance
+            save_interval: Checkpoint state setiap sekian bytes
+            verify_overlap: Bytes ekor file yang di-download ulang dan dibandingkan
+                sebelum append saat resume (0 = hanya If-Range/Content-Range)
         """
         self.state = state_manager
+        self.save_interval = save_interval
+        self.verify_overlap = max(0, verify_overlap)
     
     async def download_with_resume(self, download_id: str, url: str, filepath: str,
                                    progress_callback=None) -> bool:
@@ -198,13 +318,23 @@ class ResumableDownloader:
         filepath = state['filepath']
         start_byte = state['actual_file_size']  # Use actual file size on disk
         total_size = state['total_bytes']
+        validator = self._if_range_validator(state.get('etag'), state.get('last_modified'))
+        
+        # Tanpa validator dan tanpa cek overlap, tidak ada cara memastikan file
+        # di server masih sama: lebih aman mulai ulang
+        if total_size and start_byte > total_size:
+            logger.warning(f"Partial file larger than remote size ({start_byte} > {total_size}), restarting")
+            start_byte = 0
+        elif start_byte > 0 and not validator and not self.verify_overlap:
+            logger.warning("No ETag/Last-Modified to validate resume, restarting")
+            start_byte = 0
         
         logger.info(f"📥 Resuming from byte {start_byte}/{total_size}")
         
         try:
             return await self._download_chunks(
                 download_id, url, filepath, start_byte, total_size,
-                True, progress_callback
+                True, progress_callback, validator=validator
             )
         
         except Exception as e:
@@ -213,68 +343,74 @@ class ResumableDownloader:
     
     async def _download_chunks(self, download_id: str, url: str, filepath: str,
                               start_byte: int, total_size: int, 
-                              supports_resume: bool, progress_callback=None) -> bool:
-        """Download file in chunks dengan periodic state saving"""
+                              supports_resume: bool, progress_callback=None,
+                              validator: Optional[str] = None) -> bool:
+        """
+        Download file in chunks dengan periodic state saving
+        
+        Resume (start_byte > 0) mengirim Range + If-Range dan hanya append jika
+        server membalas 206 dengan Content-Range yang mulai di offset yang
+        diminta, total yang sama, dan (verify_overlap) byte overlap yang sama
+        dengan ekor file lokal. Balasan 200 berarti file berubah atau Range
+        diabaikan: body itu langsung ditulis ulang dari byte 0 (truncate).
+        Mismatch lain memicu satu request baru tanpa Range.
+        """
         try:
-            headers = self._get_headers(url)
-            
-            # Add Range header jika resume dari middle
-            if start_byte > 0:
-                headers['Range'] = f'bytes={start_byte}-'
-                logger.info(f"📍 Range request: bytes={start_byte}-")
-            
             async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, 
-                                      timeout=aiohttp.ClientTimeout(total=None)) as response:
-                    # Check response status
-                    if start_byte > 0:
-                        if response.status != 206:  # Partial Content
-                            logger.warning(f"Server returned {response.status} instead of 206, starting fresh")
-                            start_byte = 0
-                            # Start fresh download
-                            return await self._start_download(download_id, url, filepath, progress_callback)
-                    elif response.status != 200:
-                        raise Exception(f"HTTP {response.status}")
-                    
-                    # Open file untuk append jika resume, write jika new
-                    mode = 'ab' if start_byte > 0 else 'wb'
+                for _ in range(2):
+                    headers = self._get_headers(url)
+                    range_start = start_byte - min(self.verify_overlap, start_byte)
                     
-                    downloaded_bytes = start_byte
-                    chunk_size = 65536  # 64KB
-                    save_state_interval = 1048576  # Save state every 1MB
-                    last_state_save = downloaded_bytes
+                    # Add Range header jika resume dari middle
+                    if start_byte > 0:
+                        headers['Range'] = f'bytes={range_start}-'
+                        if validator:
+                            headers['If-Range'] = validator
+                        logger.info(f"📍 Range request: bytes={range_start}- (If-Range: {validator})")
                     
-                    async with aiofiles.open(filepath, mode) as f:
-                        async for chunk in response.content.iter_chunked(chunk_size):
-                            # Write chunk
-                            await f.write(chunk)
-                            downloaded_bytes += len(chunk)
+                    async with session.get(url, headers=headers, 
+                                          timeout=aiohttp.ClientTimeout(total=None)) as response:
+                        if start_byte > 0 and response.status == 206:
+                            if not await self._verify_resume(response, filepath, range_start,
+                                                             start_byte, total_size):
+                                start_byte, validator = 0, None
+                                continue
                             
-                            # Call progress callback
-                            if progress_callback:
-                                progress = (downloaded_bytes / total_size * 100) if total_size > 0 else 0
-                                await progress_callback(downloaded_bytes, total_size, progress)
+                            content_range = self._parse_content_range(response.headers.get('Content-Range', ''))
+                            total_size = total_size or content_range[2] or 0
+                            return await self._write_body(
+                                download_id, url, filepath, response, start_byte,
+                                total_size, supports_resume, progress_callback
+                            )
+                        
+                        if response.status == 200:
+                            if start_byte > 0:
+                                logger.warning("Server sent the full file (changed or Range ignored), restarting from byte 0")
                             
-                            # Save state periodically jika resume supported
-                            if supports_resume and (downloaded_bytes - last_state_save) >= save_state_interval:
-                                self.state.save_state(download_id, url, filepath, 
-                                                     downloaded_bytes, total_size)
-                                last_state_save = downloaded_bytes
-                    
-                    # Download complete
-                    logger.info(f"✅ Download completed: {filepath} ({downloaded_bytes} bytes)")
-                    
-                    # Clear state
-                    self.state.clear_state(download_id)
-                    
-                    return True
+                            total_size = int(response.headers.get('Content-Length', 0)) or total_size
+                            supports_resume = supports_resume or response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                            return await self._write_body(
+                                download_id, url, filepath, response, 0,
+                                total_size, supports_resume, progress_callback,
+                                etag=response.headers.get('ETag'),
+                                last_modified=response.headers.get('Last-Modified')
+                            )
+                        
+                        if start_byte > 0:
+                            logger.warning(f"Resume rejected (HTTP {response.status}), restarting from byte 0")
+                            start_byte, validator = 0, None
+                            continue
+                        
+                        raise Exception(f"HTTP {response.status}")
+                
+                raise Exception("Resume validation failed")
         
         except asyncio.TimeoutError:
             logger.error("Download timeout")
             # Save state untuk resume
             if supports_resume:
                 current_size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
-                self.state.save_state(download_id, url, filepath, current_size, total_size)
+                self.state.save_state(download_id, url, filepath, current_size, total_size, flush=True)
             return False
         
         except aiohttp.ClientError as e:
@@ -282,7 +418,7 @@ class ResumableDownloader:
             # Save state untuk resume
             if supports_resume:
                 current_size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
-                self.state.save_state(download_id, url, filepath, current_size, total_size)
+                self.state.save_state(download_id, url, filepath, current_size, total_size, flush=True)
             return False
         
         except Exception as e:
@@ -291,11 +427,111 @@ class ResumableDownloader:
             if supports_resume:
                 try:
                     current_size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
-                    self.state.save_state(download_id, url, filepath, current_size, total_size)
+                    self.state.save_state(download_id, url, filepath, current_size, total_size, flush=True)
                 except:
                     pass
             return False
     
+    async def _verify_resume(self, response, filepath: str, range_start: int,
+                             start_byte: int, total_size: int) -> bool:
+        """
+        Cek balasan 206 sebelum append
+        
+        Content-Range harus mulai di range_start dan total-nya sama dengan
+        total saat download dimulai. Byte overlap (range_start..start_byte)
+        dibaca dari response dan dibandingkan dengan ekor file lokal.
+        """
+        content_range = self._parse_content_range(response.headers.get('Content-Range', ''))
+        if content_range is None or content_range[0] != range_start:
+            logger.warning(f"Unexpected Content-Range {response.headers.get('Content-Range')!r}, restarting")
+            return False
+        
+        remote_total = content_range[2]
+        if total_size and remote_total is not None and remote_total != total_size:
+            logger.warning(f"Remote size changed ({total_size} -> {remote_total}), restarting")
+            return False
+        
+        overlap = start_byte - range_start
+        if overlap:
+            try:
+                remote_tail = await response.content.readexactly(overlap)
+            except asyncio.IncompleteReadError:
+                logger.warning("Short read on resume overlap, restarting")
+                return False
+            
+            async with aiofiles.open(filepath, 'rb') as f:
+                await f.seek(range_start)
+                local_tail = await f.read(overlap)
+            
+            if remote_tail != local_tail:
+                logger.warning(f"Resume overlap mismatch ({overlap} bytes), restarting")
+                return False
+        
+        return True
+    
+    async def _write_body(self, download_id: str, url: str, filepath: str, response,
+                          offset: int, total_size: int, supports_resume: bool,
+                          progress_callback=None, etag: Optional[str] = None,
+                          last_modified: Optional[str] = None) -> bool:
+        """Tulis body response mulai dari offset (0 = truncate file)"""
+        # Validator dicatat sejak awal supaya resume berikutnya bisa pakai If-Range
+        # ('' menimpa validator lama jika server tidak mengirimnya)
+        if supports_resume and offset == 0:
+            self.state.save_state(download_id, url, filepath, 0, total_size,
+                                  etag=etag or '', last_modified=last_modified or '', flush=True)
+        
+        # Open file untuk append jika resume, write jika new
+        mode = 'ab' if offset > 0 else 'wb'
+        
+        downloaded_bytes = offset
+        chunk_size = 65536  # 64KB
+        save_state_interval = self.save_interval
+        last_state_save = downloaded_bytes
+        
+        async with aiofiles.open(filepath, mode) as f:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                # Write chunk
+                await f.write(chunk)
+                downloaded_bytes += len(chunk)
+                
+                # Call progress callback
+                if progress_callback:
+                    progress = (downloaded_bytes / total_size * 100) if total_size > 0 else 0
+                    await progress_callback(downloaded_bytes, total_size, progress)
+                
+                # Save state periodically jika resume supported
+                if supports_resume and (downloaded_bytes - last_state_save) >= save_state_interval:
+                    self.state.save_state(download_id, url, filepath, 
+                                         downloaded_bytes, total_size)
+                    last_state_save = downloaded_bytes
+        
+        if total_size and downloaded_bytes != total_size:
+            raise Exception(f"Incomplete download: {downloaded_bytes}/{total_size} bytes")
+        
+        # Download complete
+        logger.info(f"✅ Download completed: {filepath} ({downloaded_bytes} bytes)")
+        
+        # Clear state
+        self.state.clear_state(download_id)
+        
+        return True
+    
+    @staticmethod
+    def _parse_content_range(value: str) -> Optional[Tuple[int, int, Optional[int]]]:
+        """Parse 'bytes start-end/total' -> (start, end, total atau None jika '*')"""
+        match = re.match(r'\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*$', value or '')
+        if not match:
+            return None
+        total = match.group(3)
+        return int(match.group(1)), int(match.group(2)), None if total == '*' else int(total)
+    
+    @staticmethod
+    def _if_range_validator(etag: Optional[str], last_modified: Optional[str]) -> Optional[str]:
+        """Validator untuk If-Range: strong ETag, atau Last-Modified (weak ETag tidak boleh)"""
+        if etag and not etag.startswith('W/'):
+            return etag
+        return last_modified or None
+    
     def _get_headers(self, url: str) -> Dict[str, str]:
         """Get HTTP headers untuk request"""
         headers = {
@@ -0,0 +1,309 @@
+"""
+Retention Manager
+Archive row lama dari tabel yang terus bertambah, lalu incremental vacuum
+"""
+import asyncio
+import os
+import sqlite3
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from src.database.timestamps import to_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """Policy retention untuk satu tabel"""
+    table: str
+    time_column: str            # Kolom/ekspresi waktu dalam epoch ms
+    max_age_days: int = 0       # 0 = tanpa batas umur
+    max_rows: int = 0           # 0 = tanpa batas jumlah row
+    # Kondisi tambahan: hanya row dengan state final yang boleh di-archive
+    terminal_condition: str = "1=1"
+
+
+# Default policies untuk tabel yang tumbuh tanpa batas
+DEFAULT_POLICIES: Dict[str, RetentionPolicy] = {
+    'download_history': RetentionPolicy(
+        table='download_history',
+        time_column='start_time_ms',
+        max_age_days=180,
+        terminal_condition="status IN ('completed', 'failed', 'cancelled')"
+    ),
+    'virus_scan_results': RetentionPolicy(
+        table='virus_scan_results',
+        time_column='scan_time_ms',
+        max_age_days=90
+    ),
+    'download_queue': RetentionPolicy(
+        table='download_queue',
+        time_column='completed_time_ms',
+        max_age_days=30,
+        terminal_condition="status IN ('completed', 'failed', 'cancelled')"
+    ),
+    'batch_download_items': RetentionPolicy(
+        table='batch_download_items',
+        time_column='(SELECT completed_time_ms FROM batch_downloads b '
+                    'WHERE b.batch_id = batch_download_items.batch_id)',
+        max_age_days=30,
+        terminal_condition="status IN ('completed', 'failed')"
+    ),
+}
+
+
+class RetentionManager:
+    """Pindahkan row lama ke archive tables dalam slice kecil"""
+
+    def __init__(self, db_manager, policies: Optional[Dict[str, RetentionPolicy]] = None,
+                 archive_path: Optional[str] = None, slice_size: int = 500,
+                 slice_pause: float = 0.2, interval_hours: float = 24,
+                 vacuum_pages: int = 256):
+        """
+        Initialize retention manager
+
+        Args:
+            db_manager: Database instance
+            policies: Policy per tabel (default: DEFAULT_POLICIES)
+            archive_path: File database archive terpisah (None = archive tables di bot.db)
+            slice_size: Jumlah row maksimal per transaction
+            slice_pause: Jeda antar slice (detik) agar write lock tidak ditahan lama
+            interval_hours: Interval maintenance otomatis
+            vacuum_pages: Jumlah page yang di-release per incremental_vacuum
+        """
+        self.db = db_manager
+        self.policies = policies if policies is not None else dict(DEFAULT_POLICIES)
+        self.archive_path = archive_path
+        self.slice_size = slice_size
+        self.slice_pause = slice_pause
+        self.interval_hours = interval_hours
+        self.vacuum_pages = vacuum_pages
+        self.running = False
+        self.maintenance_task: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict] = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Connection ke bot.db dengan archive database ter-attach (jika ada)"""
+        conn = self.db._get_connection()
+        if self.archive_path:
+            archive_dir = os.path.dirname(self.archive_path)
+            if archive_dir:
+                os.makedirs(archive_dir, exist_ok=True)
+            conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+        return conn
+
+    @property
+    def _archive_schema(self) -> str:
+        return 'archive' if self.archive_path else 'main'
+
+    def _ensure_archive_table(self, conn: sqlite3.Connection, table: str) -> List[str]:
+        """
+        Buat archive table (tanpa index/constraint agar compact) dan
+        tambahkan kolom baru jika tabel sumber berubah
+
+        Returns:
+            Daftar kolom tabel sumber
+        """
+        columns = [(row[1], row[2]) for row in conn.execute(f'PRAGMA main.table_info({table})')]
+        schema = self._archive_schema
+        archive_table = f'{table}_archive'
+
+        column_defs = ', '.join(f'{name} {col_type}' for name, col_type in columns)
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {schema}.{archive_table} '
+            f'({column_defs}, archived_time TEXT)'
+        )
+
+        existing = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({archive_table})')}
+        for name, col_type in columns:
+            if name not in existing:
+                conn.execute(f'ALTER TABLE {schema}.{archive_table} ADD COLUMN {name} {col_type}')
+
+        return [name for name, _ in columns]
+
+    def _select_expired_ids(self, conn: sqlite3.Connection, policy: RetentionPolicy) -> List[int]:
+        """Ambil satu slice id yang melewati policy umur atau jumlah row"""
+        conditions = []
+        params: list = []
+
+        if policy.max_age_days > 0:
+            cutoff = to_epoch_ms(datetime.now() - timedelta(days=policy.max_age_days))
+            conditions.append(f'{policy.time_column} < ?')
+            params.append(cutoff)
+
+        if policy.max_rows > 0:
+            # id adalah AUTOINCREMENT, jadi row terbaru punya id terbesar
+            conditions.append(
+                f'id <= (SELECT id FROM {policy.table} ORDER BY id DESC LIMIT 1 OFFSET ?)'
+            )
+            params.append(policy.max_rows)
+
+        if not conditions:
+            return []
+
+        cursor = conn.execute(f'''
+            SELECT id FROM {policy.table}
+            WHERE ({' OR '.join(conditions)}) AND ({policy.terminal_condition})
+            ORDER BY id ASC
+            LIMIT ?
+        ''', (*params, self.slice_size))
+
+        return [row[0] for row in cursor.fetchall()]
+
+    def archive_slice(self, policy: RetentionPolicy) -> int:
+        """
+        Archive satu slice row untuk policy (satu transaction pendek)
+
+        Returns:
+            Jumlah row yang dipindahkan
+        """
+        conn = self._get_connection()
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            columns = self._ensure_archive_table(conn, policy.table)
+            ids = self._select_expired_ids(conn, policy)
+
+            if not ids:
+                conn.rollback()
+                return 0
+
+            column_list = ', '.join(columns)
+            placeholders = ', '.join('?' * len(ids))
+            now = datetime.now().isoformat()
+
+            conn.execute(f'''
+                INSERT INTO {self._archive_schema}.{policy.table}_archive ({column_list}, archived_time)
+                SELECT {column_list}, ? FROM main.{policy.table}
+                WHERE id IN ({placeholders})
+            ''', (now, *ids))
+
+            conn.execute(f'DELETE FROM main.{policy.table} WHERE id IN ({placeholders})', ids)
+
+            conn.commit()
+            return len(ids)
+
+        except Exception:
+            conn.rollback()
+            raise
+
+        finally:
+            conn.close()
+
+    def incremental_vacuum(self) -> int:
+        """
+        Release free pages ke filesystem sedikit demi sedikit
+
+        Returns:
+            Jumlah free page yang tersisa
+        """
+        conn = self.db._get_connection()
+
+        try:
+            mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            if mode != 2:  # 2 = INCREMENTAL
+                return 0
+
+            conn.execute(f'PRAGMA incremental_vacuum({self.vacuum_pages})').fetchall()
+            return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+        finally:
+            conn.close()
+
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        Ubah database lama ke auto_vacuum=INCREMENTAL
+
+        Database yang dibuat sebelum PRAGMA ini di-set butuh satu kali VACUUM
+        penuh (lock seluruh database), jadi hanya dijalankan jika diminta.
+
+        Returns:
+            True jika VACUUM dijalankan
+        """
+        conn = self.db._get_connection()
+
+        try:
+            mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            if mode == 2:
+                return False
+
+            logger.info("🧹 Converting database to incremental auto-vacuum (one-time VACUUM)...")
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            return True
+
+        finally:
+            conn.close()
+
+    async def run_maintenance(self) -> Dict[str, int]:
+        """
+        Jalankan semua policy dalam slice kecil, diselingi incremental vacuum
+
+        Returns:
+            Jumlah row yang di-archive per tabel
+        """
+        loop = asyncio.get_event_loop()
+        archived: Dict[str, int] = {}
+
+        for name, policy in self.policies.items():
+            archived[name] = 0
+
+            while True:
+                try:
+                    moved = await loop.run_in_executor(None, self.archive_slice, policy)
+                except sqlite3.OperationalError as e:
+                    # Database sedang sibuk, coba lagi di run berikutnya
+                    logger.warning(f"Retention slice skipped for {name}: {e}")
+                    break
+
+                archived[name] += moved
+
+                if moved:
+                    await loop.run_in_executor(None, self.incremental_vacuum)
+
+                if moved < self.slice_size:
+                    break
+
+                await asyncio.sleep(self.slice_pause)
+
+        # Release sisa free pages sedikit demi sedikit
+        while await loop.run_in_executor(None, self.incremental_vacuum) > 0:
+            await asyncio.sleep(self.slice_pause)
+
+        self.last_run = {
+            'time': datetime.now().isoformat(),
+            'archived': archived
+        }
+
+        total = sum(archived.values())
+        if total:
+            logger.info(f"🗄️ Retention: archived {total} rows {archived}")
+
+        return archived
+
+    def start(self):
+        """Mulai maintenance task periodik"""
+        if not self.running:
+            self.running = True
+            self.maintenance_task = asyncio.create_task(self._maintenance_loop())
+            logger.info("Retention maintenance started")
+
+    def stop(self):
+        """Stop maintenance task"""
+        self.running = False
+        if self.maintenance_task:
+            self.maintenance_task.cancel()
+            logger.info("Retention maintenance stopped")
+
+    async def _maintenance_loop(self):
+        """Loop maintenance periodik"""
+        while self.running:
+            try:
+                await self.run_maintenance()
+            except Exception as e:
+                logger.error(f"Retention maintenance error: {e}")
+
+            await asyncio.sleep(self.interval_hours * 3600)
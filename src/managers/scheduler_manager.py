@@ -5,6 +5,8 @@ import uuid
 import re
 import logging
 
+from src.database.timestamps import from_epoch_ms
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,10 +30,15 @@ class SchedulerManager:
         try:
             pending = self.db_manager.get_pending_schedules()
             for schedule in pending:
+                # Pakai kolom epoch ms; row lama tanpa nilai ms di-parse dari ISO text
+                scheduled_time = from_epoch_ms(schedule['scheduled_time_ms'])
+                if scheduled_time is None:
+                    scheduled_time = datetime.fromisoformat(schedule['scheduled_time'])
+                
                 self.schedules[schedule['schedule_id']] = {
                     'url': schedule['url'],
                     'user_id': schedule['user_id'],
-                    'scheduled_time': datetime.fromisoformat(schedule['scheduled_time']),
+                    'scheduled_time': scheduled_time,
                     'download_path': schedule['download_path'],
                     'status': 'pending'
                 }
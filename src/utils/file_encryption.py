@@ -3,24 +3,178 @@ File Encryption
 AES-256 encryption untuk files
 """
 import os
+import hashlib
+import hmac
 import logging
-from typing import Optional, Tuple
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, Optional, Tuple
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC as PBKDF2
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.exceptions import InvalidTag
 import secrets
 
 logger = logging.getLogger(__name__)
 
 
+class KeyCache:
+    """
+    Cache master key hasil PBKDF2 di memory dengan TTL
+    
+    Key disimpan terenkripsi (AES-GCM dengan key acak per proses) dan di-index
+    dengan HMAC dari password + salt, jadi password tidak pernah disimpan.
+    """
+    
+    def __init__(self, ttl: float = 900, max_entries: int = 64):
+        """
+        Initialize key cache
+        
+        Args:
+            ttl: Umur maksimal key di cache (detik, dihitung dari saat derive)
+            max_entries: Jumlah key maksimal (LRU)
+        """
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._mac_key = secrets.token_bytes(32)
+        self._wrap = AESGCM(AESGCM.generate_key(bit_length=256))
+        self._entries: OrderedDict = OrderedDict()  # lookup -> (expires, nonce, wrapped key)
+        self._salts: Dict[bytes, Tuple[float, bytes]] = {}  # HMAC(password) -> (expires, salt)
+        self._lock = threading.Lock()
+    
+    def _lookup(self, password: str, salt: bytes = b'') -> bytes:
+        # Salt selalu 16 bytes, b'' = index salt terakhir untuk password
+        return hmac.new(self._mac_key, salt + b'\x00' + password.encode(), hashlib.sha256).digest()
+    
+    def _purge(self, now: float):
+        for lookup in [lookup for lookup, entry in self._entries.items() if entry[0] <= now]:
+            del self._entries[lookup]
+        for lookup in [lookup for lookup, entry in self._salts.items() if entry[0] <= now]:
+            del self._salts[lookup]
+    
+    def get(self, password: str, salt: bytes) -> Optional[bytes]:
+        """Master key untuk password + salt, atau None jika tidak ada / expired"""
+        lookup = self._lookup(password, salt)
+        with self._lock:
+            self._purge(time.monotonic())
+            entry = self._entries.get(lookup)
+            if entry is None:
+                return None
+            self._entries.move_to_end(lookup)
+        return self._wrap.decrypt(entry[1], entry[2], lookup)
+    
+    def put(self, password: str, salt: bytes, key: bytes):
+        """Simpan master key (juga dicatat sebagai salt terbaru untuk password ini)"""
+        lookup = self._lookup(password, salt)
+        nonce = secrets.token_bytes(12)
+        wrapped = self._wrap.encrypt(nonce, key, lookup)
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[lookup] = (expires, nonce, wrapped)
+            self._entries.move_to_end(lookup)
+            self._salts[self._lookup(password)] = (expires, salt)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def salt_for(self, password: str) -> Optional[bytes]:
+        """Salt yang master key-nya masih di cache untuk password ini (untuk encrypt)"""
+        with self._lock:
+            self._purge(time.monotonic())
+            entry = self._salts.get(self._lookup(password))
+            if entry is None or self._lookup(password, entry[1]) not in self._entries:
+                return None
+            return entry[1]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._salts.clear()
+
+
 class FileEncryption:
-    """Encrypt dan decrypt files menggunakan AES-256"""
+    """
+    Encrypt dan decrypt files menggunakan AES-256
+    
+    Format v3 (default untuk encrypt_file) terdiri dari segment AES-256-GCM
+    yang masing-masing ter-autentikasi sendiri:
+    
+        header: magic "DLENC" | version | segment_size | plaintext_size | salt (16) | file salt (16)
+        segment i: ciphertext (segment_size, segment terakhir lebih pendek) + tag (16)
+    
+    Master key = PBKDF2(password, salt), di-cache (KeyCache) sehingga batch
+    encrypt dan decrypt berulang hanya menjalankan PBKDF2 sekali. Key dan file
+    nonce setiap file diturunkan dengan HKDF(master key, file salt), jadi setiap
+    file tetap punya key sendiri walaupun salt PBKDF2 sama.
+    
+    Nonce segment = file nonce + counter i (big-endian 32-bit), header menjadi
+    associated data setiap segment, sehingga segment tidak bisa ditukar, dipotong
+    atau dipindah ke file lain. Segment diproses paralel di thread pool dan
+    rentang byte bisa di-decrypt tanpa membaca seluruh file (decrypt_range).
+    
+    Format v4 (EncryptedStreamWriter) sama dengan v3 untuk data yang ukurannya
+    baru diketahui di akhir: plaintext_size tidak masuk associated data dan
+    segment terakhir ditandai flag 'last' supaya file terpotong tetap terdeteksi.
+    
+    Format v2 (file nonce di header, key langsung dari PBKDF2) dan format lama
+    (salt + IV + satu stream GCM + tag) tetap bisa di-decrypt.
+    """
+    
+    SALT_SIZE = 16
+    IV_SIZE = 12
+    TAG_SIZE = 16
+    CHUNK_SIZE = 1024 * 1024  # Buffer decrypt, memory tetap konstan berapapun ukuran file
+    
+    FORMAT_MAGIC = b'DLENC'
+    FORMAT_VERSION = 3
+    HEADER_PREFIX = struct.Struct('>5sBIQ')  # magic, version, segment_size, plaintext_size
+    HEADERS = {
+        2: struct.Struct('>5sBIQ16s8s'),    # ... salt, file nonce
+        3: struct.Struct('>5sBIQ16s16s'),   # ... salt, file salt (HKDF)
+        4: struct.Struct('>5sBIQ16s16s'),   # v3, streaming (ukuran di-patch di akhir)
+    }
+    STREAM_VERSION = 4
+    SIZE_OFFSET = 10  # Posisi plaintext_size di header
+    HKDF_INFO = b'DLENC v3 file key'
+    SEGMENT_SIZE = 1024 * 1024
+    MAX_SEGMENTS = 2 ** 32  # Counter nonce 32-bit
     
-    def __init__(self):
-        """Initialize encryption"""
+    def __init__(self, segment_size: int = SEGMENT_SIZE, max_workers: int = 4,
+                 key_cache_ttl: float = 900):
+        """
+        Initialize encryption
+        
+        Args:
+            segment_size: Ukuran plaintext per segment (bytes)
+            max_workers: Jumlah segment yang di-encrypt/decrypt bersamaan
+            key_cache_ttl: Umur master key di KeyCache (detik, 0 = tanpa cache)
+        """
         self.backend = default_backend()
         self.key_iterations = 100000  # PBKDF2 iterations
+        self.segment_size = max(4096, segment_size)
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.key_cache = KeyCache(key_cache_ttl) if key_cache_ttl > 0 else None
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool untuk segment, dibuat saat pertama dipakai"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='crypto')
+        return self._executor
+    
+    def shutdown(self):
+        """Hentikan thread pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
     
     def generate_password(self, length: int = 16) -> str:
         """
@@ -58,10 +212,246 @@ class FileEncryption:
         key = kdf.derive(password.encode())
         return key
     
+    def master_key(self, password: str, salt: bytes) -> bytes:
+        """derive_key() dengan KeyCache: PBKDF2 hanya sekali per password + salt"""
+        if self.key_cache is None:
+            return self.derive_key(password, salt)
+        
+        key = self.key_cache.get(password, salt)
+        if key is None:
+            key = self.derive_key(password, salt)
+            self.key_cache.put(password, salt, key)
+        return key
+    
+    def _file_key(self, master: bytes, file_salt: bytes) -> Tuple[bytes, bytes]:
+        """Key AES-256 (32) + file nonce (8) per file dari HKDF-SHA256"""
+        okm = HKDF(
+            algorithm=hashes.SHA256(),
+            length=40,
+            salt=file_salt,
+            info=self.HKDF_INFO,
+            backend=self.backend
+        ).derive(master)
+        return okm[:32], okm[32:]
+    
+    # ===== SEGMENTED FORMAT =====
+    
+    @staticmethod
+    def _segment_count(plaintext_size: int, segment_size: int) -> int:
+        # File kosong tetap punya satu segment (tag-nya mengautentikasi header)
+        return max(1, -(-plaintext_size // segment_size))
+    
+    @staticmethod
+    def _segment_nonce(file_nonce: bytes, index: int) -> bytes:
+        return file_nonce + index.to_bytes(4, 'big')
+    
+    @staticmethod
+    def _seal(key: bytes, nonce: bytes, data: bytes, header: bytes) -> bytes:
+        return AESGCM(key).encrypt(nonce, data, header)
+    
+    @staticmethod
+    def _open(key: bytes, nonce: bytes, data: bytes, header: bytes) -> bytes:
+        return AESGCM(key).decrypt(nonce, data, header)
+    
+    def _pipelined(self, jobs: Iterable[tuple]) -> Iterator[bytes]:
+        """
+        Jalankan job (fn, *args) di thread pool, hasil dikembalikan berurutan
+        
+        Maksimal 2x max_workers job in-flight, jadi memory tetap terbatas.
+        """
+        pending = deque()
+        try:
+            for fn, *args in jobs:
+                pending.append(self.executor.submit(fn, *args))
+                if len(pending) >= self.max_workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def _read_header(self, f) -> Optional[dict]:
+        """
+        Baca header format segmented (v2 / v3)
+        
+        Returns:
+            Dict header atau None jika file bukan format segmented (format lama)
+        """
+        f.seek(0)
+        raw = f.read(self.HEADER_PREFIX.size)
+        if len(raw) != self.HEADER_PREFIX.size:
+            return None
+        
+        magic, version, segment_size, plaintext_size = self.HEADER_PREFIX.unpack(raw)
+        layout = self.HEADERS.get(version)
+        if magic != self.FORMAT_MAGIC or layout is None or segment_size == 0:
+            return None
+        
+        raw += f.read(layout.size - len(raw))
+        if len(raw) != layout.size:
+            return None
+        
+        count = self._segment_count(plaintext_size, segment_size)
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size != layout.size + plaintext_size + count * self.TAG_SIZE:
+            return None
+        
+        salt, extra = layout.unpack(raw)[4:]
+        return {
+            'raw': raw,
+            'size': layout.size,
+            'version': version,
+            'segment_size': segment_size,
+            'plaintext_size': plaintext_size,
+            'segments': count,
+            'salt': salt,
+            'file_nonce': extra if version == 2 else None,
+            'file_salt': extra if version >= 3 else None
+        }
+    
+    def _stream_aad(self, raw: bytes, last: bool) -> bytes:
+        """Associated data format v4: header tanpa plaintext_size + flag segment terakhir"""
+        return (raw[:self.SIZE_OFFSET] + bytes(8) + raw[self.SIZE_OFFSET + 8:]
+                + (b'\x01' if last else b'\x00'))
+    
+    def _segment_aad(self, header: dict, index: int) -> bytes:
+        if header['version'] == self.STREAM_VERSION:
+            return self._stream_aad(header['raw'], index == header['segments'] - 1)
+        return header['raw']
+    
+    def _header_key(self, header: dict, password: str) -> Tuple[bytes, bytes]:
+        """Key + file nonce untuk file segmented"""
+        master = self.master_key(password, header['salt'])
+        if header['version'] == 2:
+            return master, header['file_nonce']
+        return self._file_key(master, header['file_salt'])
+    
+    def _iter_segments(self, f, header: dict, key: bytes, file_nonce: bytes,
+                       first: int, last: int) -> Iterator[bytes]:
+        """Decrypt segment first..last (inklusif), plaintext berurutan"""
+        segment_size = header['segment_size']
+        stride = segment_size + self.TAG_SIZE
+        
+        def jobs():
+            f.seek(header['size'] + first * stride)
+            for index in range(first, last + 1):
+                length = min(segment_size, header['plaintext_size'] - index * segment_size)
+                data = f.read(length + self.TAG_SIZE)
+                if len(data) != length + self.TAG_SIZE:
+                    raise ValueError("Encrypted file truncated")
+                yield (self._open, key, self._segment_nonce(file_nonce, index),
+                       data, self._segment_aad(header, index))
+        
+        return self._pipelined(jobs())
+    
+    def _decrypt_legacy(self, f_in, password: str, f_out):
+        """Decrypt format lama: salt (16) + iv (12) + ciphertext + tag (16), streaming"""
+        f_in.seek(0)
+        file_size = os.fstat(f_in.fileno()).st_size
+        salt = f_in.read(self.SALT_SIZE)
+        iv = f_in.read(self.IV_SIZE)
+        
+        if len(salt) != self.SALT_SIZE or len(iv) != self.IV_SIZE:
+            raise ValueError("Invalid encrypted file format")
+        
+        remaining = file_size - self.SALT_SIZE - self.IV_SIZE - self.TAG_SIZE
+        if remaining < 0:
+            raise ValueError("Invalid encrypted file (too short)")
+        
+        # GCM tag dibaca langsung dari akhir file
+        f_in.seek(-self.TAG_SIZE, os.SEEK_END)
+        tag = f_in.read(self.TAG_SIZE)
+        f_in.seek(self.SALT_SIZE + self.IV_SIZE)
+        
+        key = self.master_key(password, salt)
+        cipher = Cipher(
+            algorithms.AES(key),
+            modes.GCM(iv, tag),
+            backend=self.backend
+        )
+        decryptor = cipher.decryptor()
+        
+        buffer = bytearray(min(self.CHUNK_SIZE, remaining) or 1)
+        view = memoryview(buffer)
+        while remaining > 0:
+            n = f_in.readinto(view[:min(len(buffer), remaining)])
+            if not n:
+                raise ValueError("Encrypted file truncated")
+            f_out.write(decryptor.update(view[:n]))
+            remaining -= n
+        
+        # Finalize (verifies GCM tag)
+        f_out.write(decryptor.finalize())
+    
+    @staticmethod
+    def _temp_output(output_path: str) -> Tuple[int, str]:
+        """File sementara di folder output (untuk os.replace atomic)"""
+        return tempfile.mkstemp(
+            prefix=f".{os.path.basename(output_path)}.",
+            suffix='.tmp',
+            dir=os.path.dirname(os.path.abspath(output_path))
+        )
+    
+    def _encrypt(self, input_path: str, output_path: str, master: bytes, salt: bytes) -> int:
+        """
+        Encrypt satu file ke format v3 dengan master key yang sudah di-derive
+        
+        Returns:
+            Jumlah segment
+        """
+        file_salt = secrets.token_bytes(self.SALT_SIZE)
+        key, file_nonce = self._file_key(master, file_salt)
+        
+        plaintext_size = os.path.getsize(input_path)
+        segment_size = self.segment_size
+        count = self._segment_count(plaintext_size, segment_size)
+        if count > self.MAX_SEGMENTS:
+            raise ValueError("File too large for segment size")
+        
+        header = self.HEADERS[self.FORMAT_VERSION].pack(
+            self.FORMAT_MAGIC, self.FORMAT_VERSION, segment_size, plaintext_size, salt, file_salt
+        )
+        
+        temp_path = None
+        try:
+            fd, temp_path = self._temp_output(output_path)
+            with open(input_path, 'rb') as f_in, os.fdopen(fd, 'wb') as f_out:
+                f_out.write(header)
+                
+                def jobs():
+                    for index in range(count):
+                        length = min(segment_size, plaintext_size - index * segment_size)
+                        data = f_in.read(length)
+                        if len(data) != length:
+                            raise ValueError("Input file changed during encryption")
+                        yield self._seal, key, self._segment_nonce(file_nonce, index), data, header
+                    if f_in.read(1):
+                        raise ValueError("Input file changed during encryption")
+                
+                for sealed in self._pipelined(jobs()):
+                    f_out.write(sealed)
+            
+            os.replace(temp_path, output_path)
+            temp_path = None
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+        
+        return count
+    
+    # ===== PUBLIC API =====
+    
     def encrypt_file(self, input_path: str, output_path: Optional[str] = None,
                     password: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
         """
-        Encrypt file menggunakan AES-256-GCM
+        Encrypt file menggunakan AES-256-GCM (format segmented v3)
+        
+        Jika master key untuk password ini masih di KeyCache, salt-nya dipakai
+        ulang sehingga PBKDF2 tidak dijalankan lagi (key per file tetap unik).
         
         Args:
             input_path: Path ke file yang akan diencrypt
@@ -80,46 +470,15 @@ class FileEncryption:
                 password = self.generate_password()
                 logger.info("Auto-generated password for encryption")
             
-            # Generate salt dan IV
-            salt = secrets.token_bytes(16)  # 128 bits
-            iv = secrets.token_bytes(12)    # 96 bits untuk GCM
-            
-            # Derive key dari password
-            key = self.derive_key(password, salt)
-            
-            # Setup cipher (AES-256-GCM)
-            cipher = Cipher(
-                algorithms.AES(key),
-                modes.GCM(iv),
-                backend=self.backend
-            )
-            encryptor = cipher.encryptor()
-            
             # Determine output path
             if not output_path:
                 output_path = input_path + '.enc'
             
-            # Encrypt file
-            with open(input_path, 'rb') as f_in:
-                with open(output_path, 'wb') as f_out:
-                    # Write header: salt (16) + iv (12) = 28 bytes
-                    f_out.write(salt)
-                    f_out.write(iv)
-                    
-                    # Encrypt data in chunks
-                    while True:
-                        chunk = f_in.read(64 * 1024)  # 64KB chunks
-                        if not chunk:
-                            break
-                        encrypted_chunk = encryptor.update(chunk)
-                        f_out.write(encrypted_chunk)
-                    
-                    # Finalize dan write GCM tag
-                    f_out.write(encryptor.finalize())
-                    f_out.write(encryptor.tag)  # 16 bytes GCM tag
+            salt = (self.key_cache and self.key_cache.salt_for(password)) or secrets.token_bytes(self.SALT_SIZE)
+            count = self._encrypt(input_path, output_path, self.master_key(password, salt), salt)
             
             file_size = os.path.getsize(output_path)
-            logger.info(f"File encrypted: {input_path} -> {output_path} ({file_size} bytes)")
+            logger.info(f"File encrypted: {input_path} -> {output_path} ({file_size} bytes, {count} segments)")
             
             return True, f"File encrypted successfully: {os.path.basename(output_path)}", password
         
@@ -127,10 +486,56 @@ class FileEncryption:
             logger.error(f"Encryption error: {e}")
             return False, f"Encryption failed: {str(e)}", None
     
+    def encrypt_files(self, input_paths: Iterable[str], password: Optional[str] = None,
+                      output_dir: Optional[str] = None) -> Dict:
+        """
+        Encrypt banyak file dengan satu password (PBKDF2 hanya sekali)
+        
+        Semua file memakai salt PBKDF2 yang sama; key dan nonce setiap file
+        diturunkan dari file salt acak masing-masing lewat HKDF.
+        
+        Args:
+            input_paths: File yang akan diencrypt
+            password: Password (auto-generate jika None)
+            output_dir: Folder output (default: di samping file asli, + .enc)
+        
+        Returns:
+            Dict: password, encrypted (list (input, output)), failed
+            (list (input, pesan error)), bytes (total plaintext)
+        """
+        if not password:
+            password = self.generate_password()
+            logger.info("Auto-generated password for batch encryption")
+        
+        salt = secrets.token_bytes(self.SALT_SIZE)
+        master = self.master_key(password, salt)
+        result = {'password': password, 'encrypted': [], 'failed': [], 'bytes': 0}
+        
+        for input_path in input_paths:
+            output_path = (os.path.join(output_dir, os.path.basename(input_path)) if output_dir
+                           else input_path) + '.enc'
+            try:
+                size = os.path.getsize(input_path)
+                self._encrypt(input_path, output_path, master, salt)
+            except Exception as e:
+                logger.error(f"Encryption error ({input_path}): {e}")
+                result['failed'].append((input_path, str(e)))
+                continue
+            result['encrypted'].append((input_path, output_path))
+            result['bytes'] += size
+        
+        logger.info(f"Batch encrypted: {len(result['encrypted'])} files, "
+                    f"{len(result['failed'])} failed ({result['bytes']} bytes)")
+        return result
+    
     def decrypt_file(self, input_path: str, password: str,
                     output_path: Optional[str] = None) -> Tuple[bool, str]:
         """
-        Decrypt file yang diencrypt dengan AES-256-GCM
+        Decrypt file yang diencrypt dengan AES-256-GCM (format v3, v2 atau format lama)
+        
+        Ciphertext di-stream (format lama: tag dibaca dari akhir file, format
+        segmented: segment paralel), jadi memory tidak bergantung ukuran file. Output baru
+        muncul (rename atomic) setelah semua tag terverifikasi.
         
         Args:
             input_path: Path ke encrypted file
@@ -143,6 +548,7 @@ class FileEncryption:
         if not os.path.exists(input_path):
             return False, "Input file not found"
         
+        temp_path = None
         try:
             # Determine output path
             if not output_path:
@@ -152,45 +558,22 @@ class FileEncryption:
                     output_path = input_path + '.dec'
             
             with open(input_path, 'rb') as f_in:
-                # Read header
-                salt = f_in.read(16)
-                iv = f_in.read(12)
-                
-                if len(salt) != 16 or len(iv) != 12:
-                    return False, "Invalid encrypted file format"
-                
-                # Derive key
-                key = self.derive_key(password, salt)
+                header = self._read_header(f_in)
                 
-                # Read encrypted data dan tag
-                encrypted_data = f_in.read()
-                
-                if len(encrypted_data) < 16:
-                    return False, "Invalid encrypted file (too short)"
-                
-                # Split data dan GCM tag
-                tag = encrypted_data[-16:]
-                encrypted_data = encrypted_data[:-16]
-                
-                # Setup cipher
-                cipher = Cipher(
-                    algorithms.AES(key),
-                    modes.GCM(iv, tag),
-                    backend=self.backend
-                )
-                decryptor = cipher.decryptor()
-                
-                # Decrypt
-                with open(output_path, 'wb') as f_out:
-                    # Decrypt in chunks
-                    chunk_size = 64 * 1024
-                    for i in range(0, len(encrypted_data), chunk_size):
-                        chunk = encrypted_data[i:i + chunk_size]
-                        decrypted_chunk = decryptor.update(chunk)
-                        f_out.write(decrypted_chunk)
-                    
-                    # Finalize (verifies GCM tag)
-                    f_out.write(decryptor.finalize())
+                # Plaintext ditulis ke file sementara di folder yang sama,
+                # output_path baru dibuat setelah tag terverifikasi
+                fd, temp_path = self._temp_output(output_path)
+                with os.fdopen(fd, 'wb') as f_out:
+                    if header is None:
+                        self._decrypt_legacy(f_in, password, f_out)
+                    else:
+                        key, file_nonce = self._header_key(header, password)
+                        segments = self._iter_segments(f_in, header, key, file_nonce, 0, header['segments'] - 1)
+                        for plaintext in segments:
+                            f_out.write(plaintext)
+            
+            os.replace(temp_path, output_path)
+            temp_path = None
             
             file_size = os.path.getsize(output_path)
             logger.info(f"File decrypted: {input_path} -> {output_path} ({file_size} bytes)")
@@ -200,19 +583,59 @@ class FileEncryption:
         except Exception as e:
             logger.error(f"Decryption error: {e}")
             
-            # Remove incomplete output file
-            if output_path and os.path.exists(output_path):
+            # Remove incomplete output file (output_path sendiri tidak pernah disentuh)
+            if temp_path and os.path.exists(temp_path):
                 try:
-                    os.remove(output_path)
-                except:
+                    os.remove(temp_path)
+                except OSError:
                     pass
             
             error_msg = str(e)
-            if 'tag' in error_msg.lower() or 'authentication' in error_msg.lower():
+            if isinstance(e, InvalidTag) or 'tag' in error_msg.lower() or 'authentication' in error_msg.lower():
                 return False, "Decryption failed: Invalid password or corrupted file"
             else:
                 return False, f"Decryption failed: {error_msg}"
     
+    def decrypt_range(self, input_path: str, password: str, offset: int,
+                      length: Optional[int] = None) -> bytes:
+        """
+        Decrypt sebagian plaintext (mis. untuk preview / streaming)
+        
+        Hanya segment yang mencakup rentang yang dibaca dan diverifikasi.
+        
+        Args:
+            input_path: Path ke encrypted file (format v2/v3)
+            password: Password untuk decryption
+            offset: Offset plaintext (bytes)
+            length: Jumlah bytes (None = sampai akhir file)
+            
+        Returns:
+            Plaintext bytes (lebih pendek jika melewati akhir file)
+        
+        Raises:
+            ValueError: File bukan format segmented / offset tidak valid
+            InvalidTag: Password salah atau segment rusak
+        """
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("Invalid range")
+        
+        with open(input_path, 'rb') as f_in:
+            header = self._read_header(f_in)
+            if header is None:
+                raise ValueError("Range decryption requires the segmented (v2/v3) format")
+            
+            end = header['plaintext_size'] if length is None else min(offset + length, header['plaintext_size'])
+            if offset >= end:
+                return b''
+            
+            segment_size = header['segment_size']
+            first, last = offset // segment_size, (end - 1) // segment_size
+            key, file_nonce = self._header_key(header, password)
+            data = b''.join(self._iter_segments(f_in, header, key, file_nonce, first, last))
+        
+        start = offset - first * segment_size
+        return data[start:start + end - offset]
+    
     def get_file_info(self, filepath: str) -> dict:
         """
         Get info tentang encrypted file
@@ -241,8 +664,12 @@ class FileEncryption:
             if size > 28:  # Must have at least salt + iv
                 try:
                     with open(filepath, 'rb') as f:
-                        f.read(28)  # salt + iv
+                        header = self._read_header(f)
                         info['has_encryption_header'] = True
+                        info['format_version'] = header['version'] if header else 1
+                        if header:
+                            info['plaintext_size'] = header['plaintext_size']
+                            info['segments'] = header['segments']
                 except:
                     info['has_encryption_header'] = False
         
@@ -257,6 +684,205 @@ class FileEncryption:
         return f"{size_bytes:.2f} TB"
 
 
+class EncryptedStreamWriter:
+    """
+    Encrypt data yang datang bertahap (mis. download) langsung ke file format v4
+    
+    Plaintext di-buffer sampai satu segment penuh, lalu di-hash, di-encrypt dan
+    ditulis, jadi hanya ciphertext yang menyentuh disk. Header ditulis dengan
+    plaintext_size 0 dan di-patch oleh close().
+    
+    Hanya segment lengkap yang ada di disk dan hash selalu sejajar dengan
+    segment itu, jadi download bisa dilanjutkan dari `offset`: reopen() untuk
+    writer yang sama, resume() untuk file di disk (segment di-decrypt ulang
+    untuk verifikasi dan hash).
+    """
+    
+    HASH_ALGORITHMS = ('md5', 'sha256')
+    
+    def __init__(self, encryption: FileEncryption, filepath: str, password: str):
+        """
+        Buat file terenkripsi baru (file lama dengan path yang sama ditimpa)
+        
+        Args:
+            encryption: FileEncryption (segment size, key cache)
+            filepath: Path file .enc
+            password: Password untuk encryption
+        """
+        cache = encryption.key_cache
+        salt = (cache and cache.salt_for(password)) or secrets.token_bytes(encryption.SALT_SIZE)
+        file_salt = secrets.token_bytes(encryption.SALT_SIZE)
+        header = encryption.HEADERS[encryption.STREAM_VERSION].pack(
+            encryption.FORMAT_MAGIC, encryption.STREAM_VERSION, encryption.segment_size, 0, salt, file_salt
+        )
+        self._setup(encryption, filepath, header, encryption.master_key(password, salt), file_salt)
+        
+        self._file = open(filepath, 'wb')
+        self._file.write(header)
+    
+    def _setup(self, encryption: FileEncryption, filepath: str, header: bytes,
+               master: bytes, file_salt: bytes):
+        self.encryption = encryption
+        self.filepath = filepath
+        self.segment_size = encryption.HEADER_PREFIX.unpack(header[:encryption.HEADER_PREFIX.size])[2]
+        self.segments = 0
+        self._header = header
+        self._key, self._file_nonce = encryption._file_key(master, file_salt)
+        self._hashers = {name: hashlib.new(name) for name in self.HASH_ALGORITHMS}
+        self._buffer = bytearray()
+        self._file = None
+        self._broken = False
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def resume(cls, encryption: FileEncryption, filepath: str, password: str) -> 'EncryptedStreamWriter':
+        """
+        Lanjutkan file v4 yang belum selesai (segment lengkap di-decrypt untuk hash)
+        
+        Raises:
+            ValueError: File bukan file v4 yang belum selesai
+            InvalidTag: Password salah atau segment rusak
+        """
+        layout = encryption.HEADERS[encryption.STREAM_VERSION]
+        writer = cls.__new__(cls)
+        
+        with open(filepath, 'rb') as f:
+            raw = f.read(layout.size)
+            if len(raw) != layout.size:
+                raise ValueError("Encrypted download header truncated")
+            magic, version, segment_size, _, salt, file_salt = layout.unpack(raw)
+            if magic != encryption.FORMAT_MAGIC or version != encryption.STREAM_VERSION or not segment_size:
+                raise ValueError("Not a resumable encrypted download")
+            
+            writer._setup(encryption, filepath, raw, encryption.master_key(password, salt), file_salt)
+            stride = segment_size + encryption.TAG_SIZE
+            count = (os.fstat(f.fileno()).st_size - layout.size) // stride
+            aad = writer._aad(False)
+            
+            for index in range(count):
+                plaintext = encryption._open(writer._key, encryption._segment_nonce(writer._file_nonce, index),
+                                             f.read(stride), aad)
+                for hasher in writer._hashers.values():
+                    hasher.update(plaintext)
+            writer.segments = count
+        
+        writer._open_append()
+        return writer
+    
+    @property
+    def offset(self) -> int:
+        """Jumlah plaintext yang sudah tersimpan di disk (batas segment)"""
+        return self.segments * self.segment_size
+    
+    @property
+    def size(self) -> int:
+        """Jumlah plaintext yang sudah diterima (termasuk buffer)"""
+        return self.offset + len(self._buffer)
+    
+    def _aad(self, last: bool) -> bytes:
+        return self.encryption._stream_aad(self._header, last)
+    
+    def _open_append(self):
+        committed = len(self._header) + self.segments * (self.segment_size + self.encryption.TAG_SIZE)
+        self._file = open(self.filepath, 'r+b')
+        self._file.truncate(committed)  # Buang segment yang tertulis sebagian
+        self._file.seek(committed)
+    
+    def _seal(self, plaintext: bytes, last: bool):
+        for hasher in self._hashers.values():
+            hasher.update(plaintext)
+        nonce = self.encryption._segment_nonce(self._file_nonce, self.segments)
+        try:
+            self._file.write(self.encryption._seal(self._key, nonce, plaintext, self._aad(last)))
+        except BaseException:
+            self._broken = True  # Hash sudah maju, state tidak lagi sejajar dengan disk
+            raise
+        self.segments += 1
+    
+    def will_seal(self, length: int) -> bool:
+        """True jika write(length bytes) akan meng-encrypt segment (untuk offload ke thread)"""
+        return len(self._buffer) + length > self.segment_size
+    
+    def write(self, data: bytes):
+        """Tambah plaintext; setiap segment penuh di-hash, di-encrypt dan ditulis"""
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Encrypted writer is not open")
+            self._buffer += data
+            
+            # Segment penuh terakhir ditahan, karena bisa jadi segment 'last'
+            full = (len(self._buffer) - 1) // self.segment_size
+            for index in range(full):
+                start = index * self.segment_size
+                self._seal(bytes(self._buffer[start:start + self.segment_size]), last=False)
+            if full:
+                del self._buffer[:full * self.segment_size]
+    
+    def suspend(self):
+        """Tutup file, plaintext di buffer dibuang (dilanjutkan dari offset)"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._buffer.clear()
+    
+    def reopen(self) -> bool:
+        """
+        Buka lagi writer yang di-suspend
+        
+        Returns:
+            False jika state tidak lagi cocok dengan file (pakai resume())
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._buffer.clear()
+            
+            committed = len(self._header) + self.segments * (self.segment_size + self.encryption.TAG_SIZE)
+            try:
+                if self._broken or os.path.getsize(self.filepath) < committed:
+                    return False
+                self._open_append()
+            except OSError:
+                return False
+            return True
+    
+    def close(self) -> Dict:
+        """
+        Encrypt segment terakhir dan patch ukuran plaintext di header
+        
+        Returns:
+            Dict: size (plaintext), md5, sha256 (dari plaintext)
+        """
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Encrypted writer is not open")
+            self._seal(bytes(self._buffer), last=True)
+            size = (self.segments - 1) * self.segment_size + len(self._buffer)
+            self._buffer.clear()
+            
+            self._file.seek(self.encryption.SIZE_OFFSET)
+            self._file.write(struct.pack('>Q', size))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+        
+        result = {'size': size}
+        result.update({name: hasher.hexdigest() for name, hasher in self._hashers.items()})
+        return result
+    
+    def abort(self):
+        """Tutup file tanpa menyelesaikan (file tidak dihapus)"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._buffer.clear()
+            self._broken = True
+
+
 class PasswordManager:
     """Manage encryption passwords"""
     
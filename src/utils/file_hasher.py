@@ -2,26 +2,101 @@
 File hashing utility untuk duplicate detection
 Mendukung MD5 dan SHA256 hashing dengan chunk processing
 """
+import asyncio
+import errno
 import hashlib
+import mmap
 import os
-from typing import Optional, Literal
+import stat
+import threading
+import uuid
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Literal, Sequence
 import logging
 
+try:
+    import fcntl
+except ImportError:  # Windows: reflink tidak tersedia
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 HashAlgorithm = Literal['md5', 'sha256']
+LinkMode = Literal['auto', 'reflink', 'hardlink']
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024            # 1MB per read
+DEFAULT_MMAP_THRESHOLD = 64 * 1024 * 1024   # File >= 64MB dibaca lewat mmap
+FICLONE = 0x40049409                        # ioctl copy-on-write clone (btrfs, XFS, ...)
+
+
+def hash_file(filepath: str, algorithms: Sequence[str] = ('md5', 'sha256'),
+              chunk_size: int = DEFAULT_CHUNK_SIZE,
+              mmap_threshold: Optional[int] = DEFAULT_MMAP_THRESHOLD) -> Dict[str, str]:
+    """
+    Hitung beberapa digest sekaligus dalam satu kali baca file
+    
+    File kecil dibaca dengan readinto ke satu buffer yang dipakai ulang
+    (tanpa alokasi per chunk); file >= mmap_threshold di-mmap dan setiap
+    digest di-update dari memoryview (zero-copy). hashlib melepas GIL untuk
+    update besar, jadi beberapa file bisa di-hash paralel di thread pool.
+    
+    Args:
+        filepath: Path ke file
+        algorithms: Nama algoritma hashlib (mis. 'md5', 'sha256')
+        chunk_size: Ukuran blok per update
+        mmap_threshold: Ukuran minimal file untuk mmap (None = tidak pernah)
+    
+    Returns:
+        Dict {algoritma: hexdigest}
+    
+    Raises:
+        OSError jika file tidak bisa dibaca
+    """
+    hashers = [(name, hashlib.new(name)) for name in algorithms]
+    updates = [hasher.update for _, hasher in hashers]
+    
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        
+        if mmap_threshold is not None and size >= mmap_threshold and size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, size, chunk_size):
+                        block = view[offset:offset + chunk_size]
+                        for update in updates:
+                            update(block)
+                        block.release()
+                finally:
+                    view.release()
+        else:
+            buffer = bytearray(chunk_size)
+            view = memoryview(buffer)
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                block = view[:read]
+                for update in updates:
+                    update(block)
+    
+    return {name: hasher.hexdigest() for name, hasher in hashers}
 
 
 class FileHasher:
     """Calculate file hash untuk duplicate detection"""
     
-    def __init__(self, algorithm: HashAlgorithm = 'md5', chunk_size: int = 8192):
+    def __init__(self, algorithm: HashAlgorithm = 'md5', chunk_size: int = DEFAULT_CHUNK_SIZE):
         """
         Initialize hasher
         
         Args:
             algorithm: 'md5' atau 'sha256'
-            chunk_size: Size untuk chunk reading (default 8KB)
+            chunk_size: Size untuk chunk reading (default 1MB)
         """
         self.algorithm = algorithm
         self.chunk_size = chunk_size
@@ -40,25 +115,32 @@ class FileHasher:
             logger.error(f"File tidak ditemukan: {filepath}")
             return None
         
-        try:
-            # Pilih hash algorithm
-            if self.algorithm == 'md5':
-                hasher = hashlib.md5()
-            else:
-                hasher = hashlib.sha256()
-            
-            # Read file in chunks untuk efficiency
-            with open(filepath, 'rb') as f:
-                while True:
-                    chunk = f.read(self.chunk_size)
-                    if not chunk:
-                        break
-                    hasher.update(chunk)
-            
-            hash_value = hasher.hexdigest()
-            logger.debug(f"{self.algorithm.upper()} hash untuk {os.path.basename(filepath)}: {hash_value}")
-            return hash_value
+        hashes = self.calculate_hashes(filepath, (self.algorithm,))
+        if hashes is None:
+            return None
+        
+        hash_value = hashes[self.algorithm]
+        logger.debug(f"{self.algorithm.upper()} hash untuk {os.path.basename(filepath)}: {hash_value}")
+        return hash_value
+    
+    def calculate_hashes(self, filepath: str,
+                         algorithms: Sequence[str] = ('md5', 'sha256')) -> Optional[Dict[str, str]]:
+        """
+        Calculate beberapa hash sekaligus dalam satu kali baca
+        
+        Args:
+            filepath: Path ke file
+            algorithms: Algoritma yang dihitung
             
+        Returns:
+            Dict {algoritma: hash} atau None jika error
+        """
+        if not os.path.exists(filepath):
+            logger.error(f"File tidak ditemukan: {filepath}")
+            return None
+        
+        try:
+            return hash_file(filepath, algorithms, self.chunk_size)
         except Exception as e:
             logger.error(f"Error menghitung hash untuk {filepath}: {e}")
             return None
@@ -94,27 +176,707 @@ class FileHasher:
             return None
 
 
+class HashEngine:
+    """
+    Hash banyak file secara paralel, beberapa digest per file dalam satu pass
+    
+    File di-hash di ThreadPoolExecutor (hashlib melepas GIL saat update blok
+    besar), jadi throughput dibatasi disk, bukan loop Python. max_workers
+    sebaiknya kecil untuk HDD (seek) dan bisa lebih besar untuk SSD/NVMe.
+    """
+    
+    def __init__(self, algorithms: Sequence[str] = ('md5', 'sha256'),
+                 max_workers: int = 4, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 mmap_threshold: Optional[int] = DEFAULT_MMAP_THRESHOLD):
+        """
+        Initialize hash engine
+        
+        Args:
+            algorithms: Digest yang dihitung untuk setiap file
+            max_workers: Jumlah file yang di-hash bersamaan
+            chunk_size: Ukuran blok per read/update
+            mmap_threshold: Ukuran minimal file untuk dibaca lewat mmap (None = off)
+        """
+        for name in algorithms:
+            hashlib.new(name)  # ValueError jika algoritma tidak dikenal
+        
+        self.algorithms = tuple(algorithms)
+        self.max_workers = max(1, max_workers)
+        self.chunk_size = chunk_size
+        self.mmap_threshold = mmap_threshold
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool, dibuat saat pertama dipakai"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='hash')
+        return self._executor
+    
+    def hash_file(self, filepath: str, algorithms: Optional[Sequence[str]] = None) -> Optional[Dict[str, str]]:
+        """
+        Hash satu file (blocking)
+        
+        Returns:
+            Dict {algoritma: hexdigest} atau None jika file tidak bisa dibaca
+        """
+        try:
+            return hash_file(filepath, algorithms or self.algorithms,
+                             self.chunk_size, self.mmap_threshold)
+        except OSError as e:
+            logger.error(f"Error menghitung hash untuk {filepath}: {e}")
+            return None
+    
+    def hash_files(self, filepaths: Iterable[str],
+                   algorithms: Optional[Sequence[str]] = None) -> Dict[str, Optional[Dict[str, str]]]:
+        """
+        Hash banyak file paralel di thread pool (blocking)
+        
+        Returns:
+            Dict {filepath: digests atau None}
+        """
+        filepaths = list(filepaths)
+        results = self.executor.map(lambda path: self.hash_file(path, algorithms), filepaths)
+        return dict(zip(filepaths, results))
+    
+    async def hash_file_async(self, filepath: str,
+                              algorithms: Optional[Sequence[str]] = None) -> Optional[Dict[str, str]]:
+        """Hash satu file tanpa memblokir event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.hash_file, filepath, algorithms)
+    
+    async def hash_files_async(self, filepaths: Iterable[str],
+                               algorithms: Optional[Sequence[str]] = None) -> Dict[str, Optional[Dict[str, str]]]:
+        """Hash banyak file paralel tanpa memblokir event loop"""
+        filepaths: List[str] = list(filepaths)
+        results = await asyncio.gather(*(self.hash_file_async(path, algorithms) for path in filepaths))
+        return dict(zip(filepaths, results))
+    
+    def shutdown(self):
+        """Hentikan thread pool (hash yang sedang berjalan diselesaikan)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class DuplicateIndex:
+    """
+    Duplicate index rekursif untuk seluruh library download
+    
+    Kandidat dipersempit bertahap, setiap tahap hanya untuk file yang masih
+    bertabrakan di tahap sebelumnya:
+    1. Ukuran file (dari stat saat walk, tanpa membaca isi)
+    2. Partial hash: blok head, middle dan tail (file kecil langsung tahap 3)
+    3. Full hash MD5 + SHA256 dalam satu pass lewat HashEngine
+    
+    Hasil partial/full hash di-cache di file_hashes bersama (size, mtime_ns,
+    inode). File yang stat-nya tidak berubah sejak scan sebelumnya tidak
+    pernah dibaca ulang. Tanpa db_manager, cache hanya di memory.
+    
+    reclaim() mengganti duplicate dengan reflink (clone copy-on-write) atau
+    hardlink ke satu salinan, sehingga ruang disk hanya terpakai sekali.
+    """
+    
+    PARTIAL_BLOCK = 64 * 1024
+    
+    def __init__(self, db_manager=None, hash_engine: Optional[HashEngine] = None,
+                 roots: Sequence[str] = (), partial_block: int = PARTIAL_BLOCK,
+                 min_size: int = 1, link_mode: LinkMode = 'auto'):
+        """
+        Initialize duplicate index
+        
+        Args:
+            db_manager: Database untuk cache di file_hashes (optional)
+            hash_engine: HashEngine untuk full hash (default: HashEngine())
+            roots: Folder default yang di-scan
+            partial_block: Ukuran setiap blok partial hash (bytes)
+            min_size: File lebih kecil dari ini diabaikan
+            link_mode: Default reclaim(): 'auto', 'reflink' atau 'hardlink'
+        """
+        self.db_manager = db_manager
+        self.hash_engine = hash_engine or HashEngine()
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.partial_block = partial_block
+        self.min_size = max(1, min_size)
+        self.link_mode = link_mode
+        
+        self._entries: Dict[str, Dict] = {}         # File yang sudah di-stat: filepath -> entry
+        self._by_size: Dict[int, Dict[str, None]] = {}
+        self._cache: Optional[Dict[str, Dict]] = None   # Row database yang belum diverifikasi
+        self._stored: set = set()                   # filepath yang punya row di database
+        self._dirty: Dict[str, None] = {}
+        self._removed: Dict[str, None] = {}
+        self.last_scan: Optional[float] = None
+        self._reflink_probe: Dict[int, bool] = {}   # st_dev -> FICLONE didukung
+        self._lock = threading.RLock()
+    
+    # ===== CACHE =====
+    
+    def _load_cache(self):
+        """Muat row file_hashes sekali (validasi dilakukan per file saat stat)"""
+        if self._cache is not None:
+            return
+        self._cache = self.db_manager.load_file_hash_cache() if self.db_manager else {}
+        self._stored = set(self._cache)
+    
+    def _flush(self):
+        """Tulis entry yang berubah ke file_hashes dalam satu transaction"""
+        if not self.db_manager or not (self._dirty or self._removed):
+            self._dirty.clear()
+            self._removed.clear()
+            return
+        
+        entries, removed = [], list(self._removed)
+        for path in self._dirty:
+            entry = self._entries.get(path)
+            if entry is None:
+                continue
+            if entry['partial_hash'] or entry['sha256_hash']:
+                entries.append(entry)
+            elif path in self._stored:
+                removed.append(path)
+        
+        try:
+            self.db_manager.save_file_hash_cache(entries, removed)
+        except Exception as e:
+            logger.error(f"Error saving duplicate index: {e}")
+            return
+        
+        self._stored.update(entry['filepath'] for entry in entries)
+        self._stored.difference_update(removed)
+        self._dirty.clear()
+        self._removed.clear()
+    
+    # ===== ENTRIES =====
+    
+    def _add(self, path: str, st: os.stat_result) -> Dict:
+        """Entry untuk file yang baru di-stat, pakai hash cache jika stat cocok"""
+        key = (st.st_size, st.st_mtime_ns, st.st_ino)
+        entry = self._entries.get(path)
+        if entry is None and self._cache:
+            entry = self._cache.pop(path, None)
+        
+        if entry is not None and (entry['file_size'], entry['mtime_ns'], entry['inode']) == key:
+            if path not in self._entries:
+                self._entries[path] = entry
+                self._by_size.setdefault(entry['file_size'], {})[path] = None
+            return entry
+        
+        if path in self._entries:
+            self._discard(path, keep_row=True)
+        
+        entry = {
+            'filepath': path,
+            'filename': os.path.basename(path),
+            'user_id': entry.get('user_id') if entry else None,
+            'file_size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'inode': st.st_ino,
+            'partial_hash': None,
+            'md5_hash': None,
+            'sha256_hash': None
+        }
+        self._entries[path] = entry
+        self._by_size.setdefault(st.st_size, {})[path] = None
+        self._dirty[path] = None
+        return entry
+    
+    def _discard(self, path: str, keep_row: bool = False):
+        """Keluarkan file dari index (dan dari database kecuali keep_row)"""
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            paths = self._by_size.get(entry['file_size'])
+            if paths is not None:
+                paths.pop(path, None)
+                if not paths:
+                    del self._by_size[entry['file_size']]
+        self._dirty.pop(path, None)
+        if not keep_row and path in self._stored:
+            self._removed[path] = None
+    
+    def _walk(self, root: str):
+        """Semua file reguler di bawah root (rekursif, tanpa symlink & folder tersembunyi)"""
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if not entry.name.startswith('.'):
+                                    stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                st = entry.stat(follow_symlinks=False)
+                                if st.st_size >= self.min_size:
+                                    yield entry.path, st
+                        except OSError:
+                            continue
+            except OSError as e:
+                logger.warning(f"Cannot scan {directory}: {e}")
+    
+    @staticmethod
+    def _under(path: str, roots: Sequence[str]) -> bool:
+        return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in roots)
+    
+    # ===== HASHING =====
+    
+    def _partial_hash(self, path: str, size: int) -> Optional[str]:
+        """Hash blok head, middle dan tail (plus ukuran file)"""
+        block = self.partial_block
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(size.to_bytes(8, 'little'))
+        try:
+            with open(path, 'rb') as f:
+                for offset in (0, (size - block) // 2, size - block):
+                    f.seek(offset)
+                    hasher.update(f.read(block))
+        except OSError as e:
+            logger.debug(f"Partial hash failed for {path}: {e}")
+            return None
+        return hasher.hexdigest()
+    
+    def _needs_partial(self, entry: Dict) -> bool:
+        return entry['file_size'] > 3 * self.partial_block
+    
+    def _fill_partial(self, entries: List[Dict]) -> int:
+        """Hitung partial hash yang belum ada (paralel di pool HashEngine)"""
+        todo = [entry for entry in entries if entry['partial_hash'] is None and self._needs_partial(entry)]
+        results = self.hash_engine.executor.map(
+            lambda entry: self._partial_hash(entry['filepath'], entry['file_size']), todo
+        )
+        for entry, partial in zip(todo, results):
+            if partial is None:
+                self._discard(entry['filepath'])
+                continue
+            entry['partial_hash'] = partial
+            self._dirty[entry['filepath']] = None
+        return len(todo)
+    
+    def _fill_full(self, entries: List[Dict]) -> int:
+        """Hitung MD5 + SHA256 yang belum ada (satu pass per file, paralel)"""
+        todo = [entry for entry in entries if not (entry['md5_hash'] and entry['sha256_hash'])]
+        results = self.hash_engine.hash_files([entry['filepath'] for entry in todo], ('md5', 'sha256'))
+        for entry in todo:
+            digests = results.get(entry['filepath'])
+            if digests is None:
+                self._discard(entry['filepath'])
+                continue
+            entry['md5_hash'] = digests['md5']
+            entry['sha256_hash'] = digests['sha256']
+            self._dirty[entry['filepath']] = None
+        return len(todo)
+    
+    @staticmethod
+    def _collisions(entries: List[Dict], key) -> List[List[Dict]]:
+        """Kelompokkan entry berdasarkan key, hanya kelompok dengan >= 2 anggota"""
+        groups: Dict[tuple, List[Dict]] = {}
+        for entry in entries:
+            groups.setdefault(key(entry), []).append(entry)
+        return [group for group in groups.values() if len(group) > 1]
+    
+    @staticmethod
+    def _wasted(group: List[Dict]) -> int:
+        """Bytes yang terpakai lebih dari sekali (path yang sudah hardlink tidak dihitung)"""
+        return group[0]['file_size'] * (len({entry['inode'] for entry in group}) - 1)
+    
+    def _narrow(self, candidates: List[List[Dict]], stats: Counter) -> List[List[Dict]]:
+        """Size bucket -> partial hash -> full hash; hasilnya kelompok duplicate"""
+        flat = [entry for group in candidates for entry in group]
+        stats['partial_hashed'] += self._fill_partial(flat)
+        
+        flat = [entry for entry in flat if entry['filepath'] in self._entries]
+        survivors = self._collisions(flat, lambda e: (e['file_size'], e['partial_hash']))
+        
+        flat = [entry for group in survivors for entry in group]
+        stats['full_hashed'] += self._fill_full(flat)
+        
+        flat = [entry for entry in flat if entry['filepath'] in self._entries]
+        return self._collisions(flat, lambda e: (e['file_size'], e['sha256_hash']))
+    
+    # ===== PUBLIC API =====
+    
+    def scan(self, roots: Optional[Sequence[str]] = None) -> Dict:
+        """
+        Scan ulang folder dan cari semua kelompok duplicate
+        
+        Args:
+            roots: Folder yang di-scan (default: self.roots)
+        
+        Returns:
+            Dict statistik (files, bytes, size_collisions, partial_hashed,
+            full_hashed, reclaimable_bytes) dan groups: list kelompok duplicate,
+            setiap kelompok list entry (filepath, file_size, md5_hash, ...)
+        """
+        roots = [os.path.abspath(root) for root in (roots or self.roots)]
+        stats = Counter()
+        
+        with self._lock:
+            self._load_cache()
+            seen = set()
+            
+            for root in roots:
+                for path, st in self._walk(root):
+                    seen.add(path)
+                    self._add(path, st)
+                    stats['files'] += 1
+                    stats['bytes'] += st.st_size
+            
+            # File yang hilang dari folder yang di-scan
+            for path in [path for path in self._entries if path not in seen and self._under(path, roots)]:
+                self._discard(path)
+            for path in [path for path in (self._cache or {}) if self._under(path, roots)]:
+                del self._cache[path]
+                self._removed[path] = None
+            
+            candidates = [
+                [self._entries[path] for path in paths if path in seen]
+                for paths in self._by_size.values() if len(paths) > 1
+            ]
+            candidates = [group for group in candidates if len(group) > 1]
+            stats['size_collisions'] = sum(len(group) for group in candidates)
+            
+            groups = self._narrow(candidates, stats)
+            self._flush()
+            self.last_scan = time.monotonic()
+        
+        groups = [sorted((dict(entry) for entry in group), key=lambda e: e['filepath']) for group in groups]
+        groups.sort(key=lambda group: -self._wasted(group))
+        
+        result = dict(stats)
+        result['reclaimable_bytes'] = sum(self._wasted(group) for group in groups)
+        result['groups'] = groups
+        logger.info(f"🔍 Duplicate scan: {stats['files']} files, {len(groups)} groups, "
+                    f"{stats['partial_hashed']} partial / {stats['full_hashed']} full hashed")
+        return result
+    
+    async def scan_async(self, roots: Optional[Sequence[str]] = None) -> Dict:
+        """scan() di thread terpisah supaya event loop tidak terblokir"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.scan, roots)
+    
+    def refresh(self, max_age: float = 60):
+        """Scan ulang self.roots jika scan terakhir lebih tua dari max_age detik"""
+        if self.last_scan is None or time.monotonic() - self.last_scan > max_age:
+            self.scan()
+    
+    def paths_with_size(self, size: int, roots: Optional[Sequence[str]] = None) -> List[str]:
+        """File di index dengan ukuran tertentu (optional: hanya di bawah roots)"""
+        with self._lock:
+            paths = list(self._by_size.get(size, ()))
+        if roots:
+            roots = [os.path.abspath(root) for root in roots]
+            paths = [path for path in paths if self._under(path, roots)]
+        return paths
+    
+    def full_hash(self, path: str) -> Optional[Dict]:
+        """
+        Entry dengan MD5 + SHA256 untuk satu file (dari cache jika stat tidak berubah)
+        
+        Returns:
+            Entry (copy) atau None jika file tidak bisa dibaca
+        """
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._discard(path)
+                self._flush()
+            return None
+        
+        with self._lock:
+            self._load_cache()
+            entry = self._add(path, st)
+            self._fill_full([entry])
+            self._flush()
+            return dict(entry) if path in self._entries else None
+    
+    def find_duplicates_of(self, path: str) -> List[str]:
+        """
+        File lain di index yang isinya sama dengan path
+        
+        Ukuran dicocokkan dari index, lalu partial hash, lalu full hash; hanya
+        kandidat yang stat-nya masih sama dengan cache yang dipercaya.
+        """
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return []
+        
+        with self._lock:
+            self._load_cache()
+            target = self._add(path, st)
+            
+            candidates = []
+            for other in list(self._by_size.get(st.st_size, ())):
+                if other == path:
+                    continue
+                try:
+                    other_st = os.stat(other)
+                except OSError:
+                    self._discard(other)
+                    continue
+                candidates.append(self._add(other, other_st))
+            
+            if not candidates:
+                self._flush()
+                return []
+            
+            groups = self._narrow([[target] + candidates], Counter())
+            self._flush()
+        
+        for group in groups:
+            paths = [entry['filepath'] for entry in group]
+            if path in paths:
+                return [other for other in paths if other != path]
+        return []
+    
+    # ===== RECLAIM =====
+    
+    def _reflink_supported(self, directory: str, device: int) -> bool:
+        """Probe sekali per filesystem: clone file kosong dengan FICLONE"""
+        if fcntl is None:
+            return False
+        if device in self._reflink_probe:
+            return self._reflink_probe[device]
+        
+        probe = os.path.join(directory, f".dedup-probe-{uuid.uuid4().hex[:8]}")
+        try:
+            with open(probe, 'w+b') as src, open(probe + '.clone', 'wb') as dst:
+                try:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                    supported = True
+                except OSError:
+                    supported = False
+        except OSError as e:
+            logger.debug(f"Reflink probe failed in {directory}: {e}")
+            return False
+        finally:
+            for path in (probe, probe + '.clone'):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        
+        self._reflink_probe[device] = supported
+        return supported
+    
+    def _link_method(self, keeper_st: os.stat_result, path: str, st: os.stat_result,
+                     mode: LinkMode) -> tuple:
+        """Metode untuk mengganti path: ('reflink'|'hardlink', None) atau (None, alasan skip)"""
+        if st.st_dev != keeper_st.st_dev:
+            return None, 'cross_device'
+        if mode != 'hardlink' and self._reflink_supported(os.path.dirname(path), st.st_dev):
+            return 'reflink', None
+        if mode == 'reflink':
+            return None, 'no_reflink'
+        # Hardlink berbagi inode: mode & owner harus sudah sama supaya permission tidak berubah
+        if (stat.S_IMODE(st.st_mode), st.st_uid, st.st_gid) != \
+                (stat.S_IMODE(keeper_st.st_mode), keeper_st.st_uid, keeper_st.st_gid):
+            return None, 'permissions'
+        return 'hardlink', None
+    
+    @staticmethod
+    def _unchanged(path: str, st: os.stat_result) -> bool:
+        try:
+            current = os.lstat(path)
+        except OSError:
+            return False
+        return (current.st_size, current.st_mtime_ns, current.st_ino) == \
+            (st.st_size, st.st_mtime_ns, st.st_ino)
+    
+    def _replace(self, keeper: str, keeper_st: os.stat_result, path: str,
+                 st: os.stat_result, method: str):
+        """
+        Ganti path dengan link ke keeper secara atomic
+        
+        Link dibuat di file sementara di folder yang sama lalu os.replace(),
+        jadi path selalu menunjuk ke file lama atau file baru yang lengkap.
+        """
+        tmp = os.path.join(os.path.dirname(path),
+                           f".{os.path.basename(path)}.dedup-{uuid.uuid4().hex[:8]}")
+        try:
+            if method == 'reflink':
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                try:
+                    with open(keeper, 'rb') as src:
+                        fcntl.ioctl(fd, FICLONE, src.fileno())
+                    # Inode baru: salin owner (sebelum chmod, chown menghapus setuid) & mode
+                    if (st.st_uid, st.st_gid) != (os.geteuid(), os.getegid()):
+                        os.fchown(fd, st.st_uid, st.st_gid)
+                    os.fchmod(fd, stat.S_IMODE(st.st_mode))
+                finally:
+                    os.close(fd)
+                os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            else:
+                os.link(keeper, tmp)
+            
+            # Tidak boleh ada yang berubah sejak hash diverifikasi
+            if not (self._unchanged(keeper, keeper_st) and self._unchanged(path, st)):
+                raise OSError(errno.EAGAIN, "File changed during reclaim", path)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    
+    def _reclaim_group(self, group: List[Dict], mode: LinkMode, dry_run: bool, result: Dict):
+        """Link semua inode di satu kelompok duplicate ke satu inode (keeper)"""
+        inodes: Dict[tuple, List[tuple]] = {}
+        for entry in group:
+            path = entry['filepath']
+            try:
+                st = os.lstat(path)
+            except OSError:
+                result['skipped']['missing'] += 1
+                continue
+            # Hanya file yang stat-nya sama dengan saat full hash dihitung
+            if not stat.S_ISREG(st.st_mode) or \
+                    (st.st_size, st.st_mtime_ns, st.st_ino) != \
+                    (entry['file_size'], entry['mtime_ns'], entry['inode']):
+                result['skipped']['changed'] += 1
+                continue
+            inodes.setdefault((st.st_dev, st.st_ino), []).append((entry, st))
+        
+        if not inodes:
+            return
+        
+        # Keeper: inode dengan path/link terbanyak, lalu yang paling lama
+        keeper_key = max(inodes, key=lambda key: (len(inodes[key]), inodes[key][0][1].st_nlink,
+                                                   -inodes[key][0][1].st_mtime_ns))
+        keeper, keeper_st = inodes[keeper_key][0]
+        result['already_linked'] += len(inodes[keeper_key]) - 1
+        digests = (keeper['md5_hash'], keeper['sha256_hash'])
+        
+        saved = 0
+        for key, links in inodes.items():
+            if key == keeper_key:
+                continue
+            replaced = 0
+            for entry, st in links:
+                if not digests[1] or (entry['md5_hash'], entry['sha256_hash']) != digests:
+                    result['skipped']['hash_mismatch'] += 1
+                    continue
+                
+                method, reason = self._link_method(keeper_st, entry['filepath'], st, mode)
+                if method is None:
+                    result['skipped'][reason] += 1
+                    continue
+                
+                if not dry_run:
+                    try:
+                        self._replace(keeper['filepath'], keeper_st, entry['filepath'], st, method)
+                        new_st = os.lstat(entry['filepath'])
+                    except OSError as e:
+                        logger.warning(f"Reclaim failed for {entry['filepath']}: {e}")
+                        result['skipped']['error'] += 1
+                        continue
+                    
+                    cached = self._entries.get(entry['filepath'])
+                    if cached is not None:
+                        cached['mtime_ns'] = new_st.st_mtime_ns
+                        cached['inode'] = new_st.st_ino
+                        self._dirty[entry['filepath']] = None
+                
+                replaced += 1
+                result['files'] += 1
+                result['methods'][method] += 1
+            
+            # Data lama hanya benar-benar bebas jika semua link ke inode itu diganti
+            if replaced and replaced >= links[0][1].st_nlink:
+                saved += links[0][1].st_size
+        
+        if saved:
+            result['groups'] += 1
+            result['bytes_saved'] += saved
+    
+    def reclaim(self, roots: Optional[Sequence[str]] = None, mode: Optional[LinkMode] = None,
+                dry_run: bool = True) -> Dict:
+        """
+        Ganti file duplicate dengan reflink/hardlink ke satu salinan
+        
+        Folder di-scan ulang dulu. Di setiap kelompok, file hanya diganti jika
+        stat-nya masih sama dengan saat MD5 + SHA256 dihitung dan kedua digest
+        sama dengan keeper. Reflink membuat inode baru dengan mode, owner dan
+        mtime file lama; hardlink hanya dipakai jika mode & owner sudah sama.
+        file_hashes di-update dengan inode/mtime baru.
+        
+        Args:
+            roots: Folder yang di-scan (default: self.roots)
+            mode: 'auto' (reflink, fallback hardlink), 'reflink' atau 'hardlink'
+            dry_run: Hanya hitung bytes yang dihemat, tanpa mengubah file
+        
+        Returns:
+            Dict: dry_run, mode, groups, files, bytes_saved, already_linked,
+            methods (jumlah per metode), skipped (jumlah per alasan)
+        """
+        mode = mode or self.link_mode
+        if mode not in ('auto', 'reflink', 'hardlink'):
+            raise ValueError(f"Unknown link mode: {mode}")
+        
+        report = self.scan(roots)
+        result = {
+            'dry_run': dry_run,
+            'mode': mode,
+            'groups': 0,
+            'files': 0,
+            'bytes_saved': 0,
+            'already_linked': 0,
+            'methods': Counter(),
+            'skipped': Counter()
+        }
+        
+        with self._lock:
+            for group in report['groups']:
+                self._reclaim_group(group, mode, dry_run, result)
+            self._flush()
+        
+        logger.info(f"🧹 Duplicate reclaim{' (dry-run)' if dry_run else ''}: {result['files']} files, "
+                    f"{result['bytes_saved']} bytes, methods={dict(result['methods'])}, "
+                    f"skipped={dict(result['skipped'])}")
+        return result
+    
+    async def reclaim_async(self, roots: Optional[Sequence[str]] = None,
+                            mode: Optional[LinkMode] = None, dry_run: bool = True) -> Dict:
+        """reclaim() di thread terpisah supaya event loop tidak terblokir"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.reclaim, roots, mode, dry_run)
+
+
 class DuplicateDetector:
     """Deteksi file duplicate dengan multiple methods"""
     
-    def __init__(self, download_dir: str):
+    def __init__(self, download_dir: str, index: Optional[DuplicateIndex] = None,
+                 max_age: float = 60):
         """
         Initialize detector
         
         Args:
-            download_dir: Directory untuk check duplicates
+            download_dir: Directory untuk check duplicates (rekursif)
+            index: DuplicateIndex bersama (default: index in-memory untuk download_dir)
+            max_age: Index di-scan ulang jika scan terakhir lebih tua dari ini (detik)
         """
         self.download_dir = download_dir
         self.hasher = FileHasher('md5')
+        self.index = index or DuplicateIndex(roots=[download_dir])
+        self.max_age = max_age
     
     def find_duplicate(self, filename: str, file_size: int, file_hash: Optional[str] = None) -> Optional[str]:
         """
         Cari duplicate file di download directory
         
+        Kandidat diambil dari size bucket index (rekursif), dan hash kandidat
+        dibaca dari cache index, jadi file yang tidak berubah tidak di-hash ulang.
+        
         Args:
             filename: Nama file yang dicari
             file_size: Size file dalam bytes
-            file_hash: Hash file (optional, akan dihitung jika None)
+            file_hash: MD5 file (optional, tanpa hash hanya nama+size yang dicek)
             
         Returns:
             Path ke duplicate file atau None jika tidak ada
@@ -123,41 +885,30 @@ class DuplicateDetector:
             return None
         
         try:
+            self.index.refresh(self.max_age)
+            candidates = self.index.paths_with_size(file_size, [self.download_dir])
+            
             # Check 1: Filename dan size sama
-            for existing_file in os.listdir(self.download_dir):
-                existing_path = os.path.join(self.download_dir, existing_file)
-                
-                # Skip jika bukan file
-                if not os.path.isfile(existing_path):
+            for existing_path in candidates:
+                if os.path.basename(existing_path) != filename:
                     continue
                 
-                # Check filename dan size
-                if existing_file == filename and os.path.getsize(existing_path) == file_size:
-                    # Check 2: Verify dengan hash jika tersedia
-                    if file_hash:
-                        existing_hash = self.hasher.calculate_hash(existing_path)
-                        if existing_hash == file_hash:
-                            logger.info(f"🔍 Duplicate ditemukan (exact match): {filename}")
-                            return existing_path
-                    else:
-                        logger.info(f"🔍 Duplicate ditemukan (name+size match): {filename}")
+                # Check 2: Verify dengan hash jika tersedia
+                if file_hash:
+                    entry = self.index.full_hash(existing_path)
+                    if entry and entry['md5_hash'] == file_hash:
+                        logger.info(f"🔍 Duplicate ditemukan (exact match): {filename}")
                         return existing_path
+                else:
+                    logger.info(f"🔍 Duplicate ditemukan (name+size match): {filename}")
+                    return existing_path
             
             # Check 3: Hash-based detection untuk files dengan nama berbeda
             if file_hash:
-                for existing_file in os.listdir(self.download_dir):
-                    existing_path = os.path.join(self.download_dir, existing_file)
-                    
-                    if not os.path.isfile(existing_path):
-                        continue
-                    
-                    # Skip jika size berbeda (optimization)
-                    if os.path.getsize(existing_path) != file_size:
-                        continue
-                    
-                    existing_hash = self.hasher.calculate_hash(existing_path)
-                    if existing_hash == file_hash:
-                        logger.info(f"🔍 Duplicate ditemukan (hash match): {existing_file} = {filename}")
+                for existing_path in candidates:
+                    entry = self.index.full_hash(existing_path)
+                    if entry and entry['md5_hash'] == file_hash:
+                        logger.info(f"🔍 Duplicate ditemukan (hash match): {os.path.basename(existing_path)} = {filename}")
                         return existing_path
             
             return None
@@ -29,7 +29,8 @@ class LinkValidator:
         Validate single link
         
         Returns:
-            Dict with keys: valid, status_code, file_size, content_type, error
+            Dict with keys: valid, status_code, file_size, content_type,
+            accepts_ranges, error
         """
         result = {
             'url': url,
@@ -37,6 +38,7 @@ class LinkValidator:
             'status_code': None,
             'file_size': None,
             'content_type': None,
+            'accepts_ranges': False,
             'filename': None,
             'error': None,
             'response_time': None
@@ -61,6 +63,7 @@ class LinkValidator:
                             result['valid'] = True
                             result['file_size'] = int(response.headers.get('content-length', 0))
                             result['content_type'] = response.headers.get('content-type', 'unknown')
+                            result['accepts_ranges'] = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
                             
                             # Try to get filename from Content-Disposition
                             content_disp = response.headers.get('Content-Disposition', '')
@@ -95,6 +98,7 @@ class LinkValidator:
                         
                         if response.status in [200, 206]:  # OK or Partial Content
                             result['valid'] = True
+                            result['accepts_ranges'] = response.status == 206
                             
                             # Get file size from Content-Range or Content-Length
                             content_range = response.headers.get('Content-Range', '')
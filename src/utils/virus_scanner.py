@@ -1,44 +1,331 @@
 """
 Virus Scanner
-Support ClamAV dan VirusTotal API
+Support ClamAV (clamd daemon / clamscan) dan VirusTotal API
 """
 import os
+import shutil
+import struct
+import time
 import hashlib
 import logging
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+import aiofiles
 import aiohttp
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Lokasi socket clamd yang umum (Debian/Ubuntu, Fedora/RHEL, Arch)
+DEFAULT_CLAMD_SOCKETS = (
+    '/var/run/clamav/clamd.ctl',
+    '/run/clamav/clamd.ctl',
+    '/run/clamd.scan/clamd.sock',
+    '/var/run/clamd.scan/clamd.sock',
+    '/run/clamav/clamd.sock',
+)
+
+
+class ClamdError(Exception):
+    """Error dari clamd (koneksi putus, reply tidak valid, size limit)"""
+
+
+class ClamdUnavailableError(ClamdError):
+    """clamd tidak bisa dihubungi (connect gagal)"""
+
+
+class ClamdStreamLimitError(ClamdError):
+    """File melebihi StreamMaxLength clamd"""
+
+
+class _ClamdSession:
+    """Satu koneksi clamd dalam mode IDSESSION (banyak command per koneksi)"""
+    
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 1
+        self.last_used = time.monotonic()
+        self.payload_bytes = 0  # bytes INSTREAM yang sudah dikirim di command terakhir
+    
+    async def command(self, name: str, timeout: float, payload=None) -> str:
+        """
+        Kirim satu command dan tunggu reply-nya
+        
+        Args:
+            name: Nama command (PING, VERSION, INSTREAM)
+            timeout: Timeout baca reply (detik)
+            payload: Async iterator chunk untuk INSTREAM
+        """
+        request_id = self.next_id
+        self.next_id += 1
+        self.payload_bytes = 0
+        self.writer.write(f'z{name}\0'.encode())
+        
+        try:
+            if payload is not None:
+                async for chunk in payload:
+                    self.writer.write(struct.pack('>I', len(chunk)))
+                    self.writer.write(chunk)
+                    await self.writer.drain()
+                    self.payload_bytes += len(chunk)
+                self.writer.write(struct.pack('>I', 0))
+            await self.writer.drain()
+            
+            raw = await asyncio.wait_for(self.reader.readuntil(b'\0'), timeout=timeout)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            # clamd memutus stream yang melebihi StreamMaxLength
+            if self.payload_bytes:
+                raise ClamdStreamLimitError(
+                    f'clamd menutup koneksi setelah {self.payload_bytes} bytes (StreamMaxLength?)'
+                ) from e
+            raise ClamdError('clamd menutup koneksi') from e
+        
+        # Reply session diawali "<id>: "
+        reply_id, sep, reply = raw[:-1].decode('utf-8', errors='replace').partition(': ')
+        if not sep or reply_id != str(request_id):
+            raise ClamdError(f'Reply clamd tidak valid: {raw[:100]!r}')
+        
+        self.last_used = time.monotonic()
+        return reply
+    
+    async def close(self):
+        """Akhiri session dan tutup koneksi"""
+        try:
+            self.writer.write(b'zEND\0')
+            await self.writer.drain()
+        except Exception:
+            pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+
+
+class ClamdClient:
+    """
+    Client clamd lewat Unix socket atau TCP
+    
+    Signature database sudah dimuat di daemon, jadi scan tidak perlu reload
+    seperti clamscan. Koneksi dibuka dalam mode IDSESSION dan disimpan di pool
+    kecil; isi file dikirim bertahap lewat INSTREAM (file tidak perlu bisa
+    dibaca oleh user clamd).
+    """
+    
+    def __init__(self, socket_path: Optional[str] = None, host: Optional[str] = None,
+                 port: int = 3310, pool_size: int = 2, timeout: float = 60.0,
+                 chunk_size: int = 64 * 1024, idle_timeout: float = 20.0,
+                 stream_max_length: Optional[int] = 25 * 1024 * 1024):
+        """
+        Initialize clamd client
+        
+        Args:
+            socket_path: Path Unix socket clamd
+            host: Host TCP clamd (dipakai jika socket_path kosong)
+            port: Port TCP clamd
+            pool_size: Maksimal koneksi (= scan bersamaan)
+            timeout: Timeout connect dan reply (detik)
+            chunk_size: Ukuran chunk INSTREAM (bytes)
+            idle_timeout: Koneksi idle lebih lama dari ini ditutup, harus di bawah
+                IdleTimeout clamd (default 30 detik)
+            stream_max_length: StreamMaxLength clamd; file lebih besar tidak
+                dikirim (None/0 = tidak dicek)
+        """
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.idle_timeout = idle_timeout
+        self.stream_max_length = stream_max_length
+        
+        self._idle: List[_ClamdSession] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+    
+    @classmethod
+    def detect(cls, socket_path: Optional[str] = None, host: Optional[str] = None,
+               **kwargs) -> Optional['ClamdClient']:
+        """
+        Buat client dari konfigurasi, atau cari socket clamd di lokasi default
+        
+        Returns:
+            ClamdClient, atau None jika clamd tidak dikonfigurasi/ditemukan
+        """
+        if socket_path or host:
+            return cls(socket_path=socket_path, host=host, **kwargs)
+        
+        for path in DEFAULT_CLAMD_SOCKETS:
+            if os.path.exists(path):
+                return cls(socket_path=path, **kwargs)
+        
+        return None
+    
+    @property
+    def address(self) -> str:
+        """Alamat clamd untuk log"""
+        return self.socket_path or f"{self.host}:{self.port}"
+    
+    async def _connect(self) -> _ClamdSession:
+        """Buka koneksi baru dan mulai IDSESSION"""
+        if self.socket_path:
+            opening = asyncio.open_unix_connection(self.socket_path)
+        else:
+            opening = asyncio.open_connection(self.host, self.port)
+        
+        try:
+            reader, writer = await asyncio.wait_for(opening, timeout=self.timeout)
+            writer.write(b'zIDSESSION\0')
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ClamdUnavailableError(f'clamd {self.address} tidak bisa dihubungi: {e!r}') from e
+        return _ClamdSession(reader, writer)
+    
+    async def _command(self, name: str, payload_factory=None) -> str:
+        """
+        Jalankan command di koneksi dari pool
+        
+        Koneksi idle bisa sudah ditutup clamd; jika command gagal di koneksi
+        lama sebelum payload terkirim, dicoba sekali lagi di koneksi baru.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        
+        async with self._slots:
+            now = time.monotonic()
+            session = None
+            while self._idle:
+                candidate = self._idle.pop()
+                if now - candidate.last_used < self.idle_timeout and not candidate.reader.at_eof():
+                    session = candidate
+                    break
+                await candidate.close()
+            
+            for reused in (session is not None, False):
+                if not reused:
+                    session = await self._connect()
+                
+                payload = payload_factory() if payload_factory else None
+                try:
+                    reply = await session.command(name, self.timeout, payload)
+                except (ClamdError, ConnectionError) as e:
+                    await session.close()
+                    if reused and not isinstance(e, ClamdStreamLimitError):
+                        logger.debug(f"clamd session stale, reconnect: {e}")
+                        continue
+                    raise
+                except BaseException:
+                    # Timeout / cancel: state protokol tidak diketahui
+                    await session.close()
+                    raise
+                
+                self._idle.append(session)
+                return reply
+    
+    async def ping(self) -> bool:
+        """Cek clamd hidup (PING -> PONG)"""
+        try:
+            return await self._command('PING') == 'PONG'
+        except (OSError, ClamdError, asyncio.TimeoutError) as e:
+            logger.debug(f"clamd PING {self.address} gagal: {e}")
+            return False
+    
+    async def version(self) -> str:
+        """Versi engine dan signature, contoh 'ClamAV 1.0.3/27050/Mon Oct ...'"""
+        return await self._command('VERSION')
+    
+    async def _read_chunks(self, filepath: str):
+        """Baca file per chunk untuk INSTREAM"""
+        async with aiofiles.open(filepath, 'rb') as f:
+            while True:
+                chunk = await f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    
+    async def scan_file(self, filepath: str) -> Dict:
+        """
+        Scan file lewat INSTREAM
+        
+        Returns:
+            Dict dengan infected, threats, raw_output
+            
+        Raises:
+            ClamdStreamLimitError: File melebihi StreamMaxLength
+            ClamdUnavailableError: clamd tidak bisa dihubungi
+            ClamdError: clamd mengembalikan ERROR / koneksi putus
+        """
+        if self.stream_max_length and os.path.getsize(filepath) > self.stream_max_length:
+            raise ClamdStreamLimitError(f'File melebihi StreamMaxLength ({self.stream_max_length} bytes)')
+        
+        reply = await self._command('INSTREAM', lambda: self._read_chunks(filepath))
+        
+        if reply.endswith('ERROR'):
+            if 'size limit' in reply:
+                raise ClamdStreamLimitError(reply)
+            raise ClamdError(reply)
+        
+        # "stream: OK" atau "stream: Eicar-Signature FOUND"
+        verdict = reply.partition(': ')[2] or reply
+        threats = []
+        if verdict.endswith(' FOUND'):
+            threats.append(verdict[:-len(' FOUND')].strip())
+        
+        return {
+            'infected': bool(threats),
+            'threats': threats,
+            'raw_output': reply
+        }
+    
+    async def close(self):
+        """Tutup semua koneksi di pool"""
+        idle, self._idle = self._idle, []
+        for session in idle:
+            await session.close()
+
 
 class VirusScanner:
     """Scan files untuk virus menggunakan ClamAV dan VirusTotal"""
     
-    def __init__(self, virustotal_api_key: Optional[str] = None):
+    CLAMD_RETRY_INTERVAL = 60  # detik sebelum clamd yang gagal dicoba lagi
+    VERSION_CHECK_INTERVAL = 60  # detik versi signature ClamAV di-cache
+    VT_ENGINE_VERSION = 'api-v3'  # VirusTotal tidak punya versi signature, pakai umur cache
+    
+    def __init__(self, virustotal_api_key: Optional[str] = None,
+                 clamd: Optional[ClamdClient] = None,
+                 clamscan_path: Optional[str] = None,
+                 db_manager=None, hash_engine=None,
+                 vt_cache_ttl: float = 86400):
         """
         Initialize virus scanner
         
         Args:
             virustotal_api_key: VirusTotal API key (optional)
+            clamd: ClamdClient (default: auto-detect socket clamd)
+            clamscan_path: Path clamscan untuk fallback (default: cari di PATH)
+            db_manager: Database untuk cache verdict per SHA-256 (optional)
+            hash_engine: HashEngine untuk SHA-256 di thread pool (optional)
+            vt_cache_ttl: Umur maksimal verdict VirusTotal di cache (detik, 0 = tidak di-cache)
         """
         self.vt_api_key = virustotal_api_key
         self.vt_api_url = "https://www.virustotal.com/api/v3"
-        self.clamav_available = self._check_clamav()
-    
-    def _check_clamav(self) -> bool:
-        """Check if ClamAV is installed"""
-        try:
-            import subprocess
-            result = subprocess.run(['clamscan', '--version'], 
-                                  capture_output=True, timeout=5)
-            if result.returncode == 0:
-                logger.info("ClamAV detected and available")
-                return True
-        except (FileNotFoundError, subprocess.TimeoutExpired):
-            logger.warning("ClamAV not found or not responding")
-        
-        return False
+        self.clamd = clamd if clamd is not None else ClamdClient.detect()
+        self.clamscan_path = shutil.which(clamscan_path or 'clamscan')
+        self.clamav_available = bool(self.clamd or self.clamscan_path)
+        self._clamd_down_until = 0.0
+        
+        self.db_manager = db_manager
+        self.hash_engine = hash_engine
+        self.vt_cache_ttl = vt_cache_ttl
+        self._clamav_version: Optional[Tuple[str, float]] = None
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        
+        if self.clamd:
+            logger.info(f"ClamAV: clamd di {self.clamd.address}")
+        elif self.clamscan_path:
+            logger.info(f"ClamAV: clamd tidak ditemukan, fallback ke {self.clamscan_path}")
+        else:
+            logger.warning("ClamAV not found")
     
     async def scan_file(self, filepath: str, use_virustotal: bool = True) -> Dict:
         """
@@ -62,17 +349,28 @@ class VirusScanner:
             'filepath': filepath,
             'filename': os.path.basename(filepath),
             'file_size': os.path.getsize(filepath),
+            'sha256': await self._file_sha256(filepath),
             'scanned': False,
             'infected': False,
             'threats': [],
-            'scanners': []
+            'scanners': [],
+            'cached_scanners': []
         }
+        sha256 = result['sha256']
         
         # Try ClamAV first (local, fast)
         if self.clamav_available:
-            clamav_result = await self._scan_with_clamav(filepath)
-            result['scanners'].append('clamav')
-            result['scanned'] = True
+            clamav_result = await self._cached_scan(
+                sha256, 'clamav', await self._get_clamav_version(),
+                lambda: self._scan_with_clamav(filepath)
+            )
+            if clamav_result.get('cached'):
+                result['cached_scanners'].append('clamav')
+            if 'error' not in clamav_result:
+                result['scanners'].append('clamav')
+                result['scanned'] = True
+            else:
+                result['clamav_error'] = clamav_result['error']
             
             if clamav_result['infected']:
                 result['infected'] = True
@@ -83,7 +381,13 @@ class VirusScanner:
         if use_virustotal and self.vt_api_key:
             # Only scan if file is not too large (< 32MB for VT free)
             if result['file_size'] < 32 * 1024 * 1024:
-                vt_result = await self._scan_with_virustotal(filepath)
+                vt_result = await self._cached_scan(
+                    sha256, 'virustotal', self.VT_ENGINE_VERSION if self.vt_cache_ttl else None,
+                    lambda: self._scan_with_virustotal(filepath, sha256),
+                    max_age=self.vt_cache_ttl
+                )
+                if vt_result.get('cached'):
+                    result['cached_scanners'].append('virustotal')
                 result['scanners'].append('virustotal')
                 result['scanned'] = True
                 
@@ -100,18 +404,155 @@ class VirusScanner:
             result['message'] = f"Scanned with {', '.join(result['scanners'])}"
         else:
             result['status'] = 'not_scanned'
-            result['message'] = 'No scanner available'
+            if result.get('clamav_error') == 'too_large':
+                result['message'] = 'File terlalu besar untuk clamd (StreamMaxLength)'
+            elif result.get('clamav_error'):
+                result['message'] = f"ClamAV scan gagal: {result['clamav_error']}"
+            else:
+                result['message'] = 'No scanner available'
         
+        result['cached'] = bool(result['scanners']) and \
+            set(result['scanners']) <= set(result['cached_scanners'])
+        return result
+    
+    async def _file_sha256(self, filepath: str) -> Optional[str]:
+        """SHA-256 isi file, dihitung di thread pool (tidak memblokir event loop)"""
+        if self.hash_engine:
+            digests = await self.hash_engine.hash_file_async(filepath, ('sha256',))
+            return digests['sha256'] if digests else None
+        
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self._calculate_sha256, filepath)
+        except OSError as e:
+            logger.error(f"Error menghitung SHA256 untuk {filepath}: {e}")
+            return None
+    
+    async def _get_clamav_version(self) -> Optional[str]:
+        """
+        Versi engine + signature ClamAV (mis. 'ClamAV 1.0.3/27050/Mon Oct ...')
+        
+        Dipakai sebagai bagian key cache: setelah freshclam memuat signature
+        baru, versi berubah dan verdict lama tidak dipakai lagi.
+        """
+        now = time.monotonic()
+        if self._clamav_version and now - self._clamav_version[1] < self.VERSION_CHECK_INTERVAL:
+            return self._clamav_version[0]
+        
+        version = None
+        if self.clamd and now >= self._clamd_down_until:
+            try:
+                version = await self.clamd.version()
+            except (OSError, ClamdError, asyncio.TimeoutError) as e:
+                logger.debug(f"clamd VERSION gagal: {e}")
+        
+        if version is None and self.clamscan_path:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    self.clamscan_path, '--version',
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                stdout, _ = await asyncio.wait_for(process.communicate(), timeout=10)
+                version = stdout.decode('utf-8', errors='ignore').strip() or None
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.debug(f"clamscan --version gagal: {e}")
+        
+        if version:
+            self._clamav_version = (version, now)
+        return version
+    
+    async def _cached_scan(self, sha256: Optional[str], scanner: str,
+                           engine_version: Optional[str], scan,
+                           max_age: Optional[float] = None) -> Dict:
+        """
+        Jalankan scan, kecuali verdict untuk isi file ini sudah ada
+        
+        Verdict dipakai ulang jika SHA-256, scanner dan engine_version sama
+        (dan umurnya < max_age). Scan konten yang sama yang sedang berjalan
+        ditunggu, tidak dijalankan dua kali.
+        
+        Args:
+            sha256: Hash isi file (None = tanpa cache)
+            scanner: Nama scanner ('clamav', 'virustotal')
+            engine_version: Versi engine/signature (None = tanpa cache)
+            scan: Callable yang mengembalikan coroutine scan
+            max_age: Umur maksimal verdict tersimpan (detik)
+        """
+        if not sha256 or not engine_version:
+            return await scan()
+        
+        key = (sha256, scanner, engine_version)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return dict(await asyncio.shield(pending), cached=True)
+        
+        if self.db_manager:
+            entry = self.db_manager.get_cached_scan(sha256, scanner)
+            fresh = entry and (not max_age or
+                               time.time() * 1000 - (entry['scan_time_ms'] or 0) < max_age * 1000)
+            if fresh and entry['engine_version'] == engine_version:
+                return {
+                    'infected': entry['infected'],
+                    'threats': entry['threats'],
+                    'scanner': scanner,
+                    'engine_version': engine_version,
+                    'cached': True
+                }
+        
+        task = asyncio.ensure_future(scan())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        result = await asyncio.shield(task)
+        
+        # Error dan "tidak ada di database VT" bukan verdict
+        if self.db_manager and 'error' not in result and result.get('found', True):
+            self.db_manager.save_cached_scan(sha256, scanner, engine_version,
+                                             result['infected'], result['threats'])
+        result['engine_version'] = engine_version
         return result
     
     async def _scan_with_clamav(self, filepath: str) -> Dict:
-        """Scan dengan ClamAV"""
+        """Scan dengan ClamAV: clamd jika tersedia, clamscan sebagai fallback"""
+        if self.clamd and time.monotonic() >= self._clamd_down_until:
+            try:
+                result = await self.clamd.scan_file(filepath)
+                result['scanner'] = 'clamav'
+                result['engine'] = 'clamd'
+                return result
+            except ClamdStreamLimitError as e:
+                # Masalah file ini saja, clamd tetap dipakai untuk file lain
+                logger.warning(f"clamd: {os.path.basename(filepath)} terlalu besar: {e}")
+                if not self.clamscan_path:
+                    return {'infected': False, 'threats': [], 'error': 'too_large'}
+            except ClamdUnavailableError as e:
+                self._mark_clamd_down(e)
+            except (ClamdError, OSError, asyncio.TimeoutError) as e:
+                logger.error(f"clamd scan error: {e!r}")
+                # Hanya tandai down jika clamd memang tidak menjawab PING
+                if not await self.clamd.ping():
+                    self._mark_clamd_down(e)
+                if not self.clamscan_path:
+                    return {'infected': False, 'threats': [], 'error': str(e) or repr(e)}
+        
+        if not self.clamscan_path:
+            return {'infected': False, 'threats': [], 'error': 'clamd_unavailable'}
+        
+        return await self._scan_with_clamscan(filepath)
+    
+    def _mark_clamd_down(self, error: Exception):
+        """Pakai clamscan selama CLAMD_RETRY_INTERVAL sebelum clamd dicoba lagi"""
+        logger.warning(f"clamd {self.clamd.address} tidak merespon ({error}), "
+                       f"fallback ke clamscan selama {self.CLAMD_RETRY_INTERVAL}s")
+        self._clamd_down_until = time.monotonic() + self.CLAMD_RETRY_INTERVAL
+    
+    async def _scan_with_clamscan(self, filepath: str) -> Dict:
+        """Scan dengan clamscan (memuat signature database di setiap scan)"""
+        process = None
         try:
-            import subprocess
-            
             # Run clamscan
             process = await asyncio.create_subprocess_exec(
-                'clamscan',
+                self.clamscan_path,
                 '--no-summary',
                 '--infected',
                 filepath,
@@ -137,6 +578,7 @@ class VirusScanner:
                     'infected': True,
                     'threats': threats,
                     'scanner': 'clamav',
+                    'engine': 'clamscan',
                     'raw_output': output
                 }
             else:
@@ -144,24 +586,29 @@ class VirusScanner:
                     'infected': False,
                     'threats': [],
                     'scanner': 'clamav',
+                    'engine': 'clamscan',
                     'raw_output': output
                 }
         
         except asyncio.TimeoutError:
             logger.error("ClamAV scan timeout")
+            if process and process.returncode is None:
+                process.kill()
             return {'infected': False, 'threats': [], 'error': 'timeout'}
         except Exception as e:
             logger.error(f"ClamAV scan error: {e}")
             return {'infected': False, 'threats': [], 'error': str(e)}
     
-    async def _scan_with_virustotal(self, filepath: str) -> Dict:
+    async def _scan_with_virustotal(self, filepath: str, file_hash: Optional[str] = None) -> Dict:
         """Scan dengan VirusTotal API"""
         if not self.vt_api_key:
             return {'infected': False, 'threats': [], 'error': 'no_api_key'}
         
         try:
             # Calculate file hash
-            file_hash = self._calculate_sha256(filepath)
+            file_hash = file_hash or await self._file_sha256(filepath)
+            if not file_hash:
+                return {'infected': False, 'threats': [], 'error': 'hash_failed'}
             
             # Check if file already scanned (hash lookup)
             existing_result = await self._virustotal_hash_lookup(file_hash)
@@ -177,6 +624,7 @@ class VirusScanner:
                 'infected': False,
                 'threats': [],
                 'scanner': 'virustotal',
+                'found': False,
                 'message': 'File not in VT database (upload not implemented for free tier)'
             }
         
@@ -245,6 +693,11 @@ class VirusScanner:
         
         return sha256_hash.hexdigest()
     
+    async def close(self):
+        """Tutup koneksi clamd"""
+        if self.clamd:
+            await self.clamd.close()
+    
     def quarantine_file(self, filepath: str, quarantine_dir: str = "downloads/quarantine") -> bool:
         """
         Move infected file ke quarantine directory
@@ -290,11 +743,16 @@ class VirusScanner:
         if result['status'] == 'clean':
             text += "✅ **Status:** CLEAN\n"
             text += f"🔍 **Scanned by:** {', '.join(result['scanners'])}\n"
+            if result.get('cached_scanners'):
+                text += f"♻️ **Cached:** {', '.join(result['cached_scanners'])} (isi file sama sudah pernah di-scan)\n"
             text += "\nNo threats detected. File is safe to use."
         
         elif result['status'] == 'infected':
             text += "⚠️ **Status:** INFECTED\n"
-            text += f"🔍 **Scanned by:** {', '.join(result['scanners'])}\n\n"
+            text += f"🔍 **Scanned by:** {', '.join(result['scanners'])}\n"
+            if result.get('cached_scanners'):
+                text += f"♻️ **Cached:** {', '.join(result['cached_scanners'])} (isi file sama sudah pernah di-scan)\n"
+            text += "\n"
             
             if result['threats']:
                 text += "🦠 **Threats detected:**\n"
@@ -306,7 +764,10 @@ class VirusScanner:
         elif result['status'] == 'not_scanned':
             text += "❓ **Status:** NOT SCANNED\n"
             text += f"ℹ️ {result['message']}\n"
-            text += "\nNo virus scanner available. Use with caution."
+            if result.get('clamav_error'):
+                text += "\nFile could not be scanned. Use with caution."
+            else:
+                text += "\nNo virus scanner available. Use with caution."
         
         else:
             text += f"❌ **Status:** ERROR\n"
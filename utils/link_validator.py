@@ -19,7 +19,7 @@ class LinkValidator:
             Tuple (is_valid, error_message, file_info)
             - is_valid: True jika link valid dan bisa didownload
             - error_message: Pesan error jika ada
-            - file_info: Dict dengan info file (size, type, filename)
+            - file_info: Dict dengan info file (size, type, filename, accepts_ranges)
         """
         # Try aiohttp first
         try:
@@ -37,7 +37,8 @@ class LinkValidator:
                             file_info = {
                                 'size': int(response.headers.get('content-length', 0)),
                                 'type': response.headers.get('content-type', 'unknown'),
-                                'filename': LinkValidator._extract_filename_from_headers(response.headers, url)
+                                'filename': LinkValidator._extract_filename_from_headers(response.headers, url),
+                                'accepts_ranges': response.headers.get('Accept-Ranges', '').lower() == 'bytes'
                             }
                             return True, None, file_info
                         else:
@@ -51,10 +52,17 @@ class LinkValidator:
                     range_headers['Range'] = 'bytes=0-1023'
                     async with session.get(url, headers=range_headers, timeout=aiohttp.ClientTimeout(total=10), allow_redirects=True) as get_response:
                         if get_response.status in [200, 206]:
+                            # 206: Content-Length hanya panjang range, ukuran file ada di Content-Range
+                            size = int(get_response.headers.get('content-length', 0))
+                            content_range = get_response.headers.get('Content-Range', '')
+                            if get_response.status == 206:
+                                total = content_range.rsplit('/', 1)[-1]
+                                size = int(total) if total.isdigit() else 0
                             file_info = {
-                                'size': int(get_response.headers.get('content-length', 0)),
+                                'size': size,
                                 'type': get_response.headers.get('content-type', 'unknown'),
-                                'filename': LinkValidator._extract_filename_from_headers(get_response.headers, url)
+                                'filename': LinkValidator._extract_filename_from_headers(get_response.headers, url),
+                                'accepts_ranges': get_response.status == 206
                             }
                             return True, None, file_info
                         else: